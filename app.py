@@ -1,385 +1,683 @@
-from flask import Flask, render_template, request, jsonify
-import joblib
-import re
-import speech_recognition as sr
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, url_for
 import os
 from werkzeug.utils import secure_filename
+import time
+import json
+import hmac
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import partial
+from inference import InferenceEngine, ArtifactError, EngineWatcher, PickleWatcher, ENGINE_PATH
+from preprocessing import clean_text
+from segmentation import Segmenter
+from prediction_cache import PredictionCache
+from recognition import (make_recognizer, calculate_score, LanguagePrior, RecognitionScheduler,
+                         recognize_with_strategies, LANGUAGES)
+from audio_pipeline import PYDUB_AVAILABLE, AudioRejected, PCMBuffer, prepare_pcm, enhance_samples
+import audio_enhance
+from streaming import STREAM_SAMPLE_RATE, stream_results, segment_level_ok
+from debug_spool import spool_from_env
+from transcript_cache import TranscriptCache, transcript_cache_from_env
+from jobs import JobStore, AudioJobQueue, QueueFull, JOB_LONGPOLL_MAX
+from feedback import FeedbackLog, FeedbackLogFull, FeedbackUpdater, FEEDBACK_TOKEN, FEEDBACK_UPDATES
+import telemetry
+from telemetry import traced, current_trace
+
+# Optional: WebSocket transport for live recordings (/ws/stream)
 try:
-    from pydub import AudioSegment
-    PYDUB_AVAILABLE = True
-except:
-    PYDUB_AVAILABLE = False
-import io
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+    SOCK_AVAILABLE = True
+except ImportError:
+    SOCK_AVAILABLE = False
 
 app = Flask(__name__)
+log = telemetry.get_logger('app')
 
 # --- CONFIGURATION ---
-UPLOAD_FOLDER = 'static/uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Uploads are processed in memory; processed audio of failed requests is only
+# kept when AUDIO_DEBUG_SPOOL=1 (AUDIO_DEBUG_DIR, AUDIO_DEBUG_MAX_BYTES/FILES)
+debug_spool = spool_from_env()
+
+# Recognition results of uploads, keyed on the enhanced PCM and shared by all
+# workers (TRANSCRIPT_CACHE_DIR, TRANSCRIPT_CACHE_MAX_BYTES; 0 disables it)
+transcript_cache = transcript_cache_from_env()
 
 VECTORIZER_PATH = 'data/processed/tfidf_vectorizer.pkl'
 MODEL_PATH = 'data/processed/language_model.pkl'
 
+# Upper bound on the number of texts accepted by /api/predict/batch
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 1000))
+app.config['MAX_BATCH_SIZE'] = MAX_BATCH_SIZE
+
+# Upper bound on the length of a document sent to /api/segment (characters)
+MAX_SEGMENT_CHARS = int(os.environ.get('MAX_SEGMENT_CHARS', 200_000))
+app.config['MAX_SEGMENT_CHARS'] = MAX_SEGMENT_CHARS
+
+# Prediction cache (keyed on cleaned text); size 0 disables it, TTL 0 means no expiry
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 10000))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', 3600))
+
 # --- LOAD MODELS ---
+# The exported engine (python inference.py export) is memory-mapped, so workers
+# forked from a preloading gunicorn master (see gunicorn.conf.py) share one copy.
+# Without an export the engine is compiled from the pickles, which pulls in
+# scikit-learn. A missing or corrupt artifact stops startup here instead of
+# failing every request later.
+PICKLE_FALLBACK = not os.path.isdir(ENGINE_PATH)
+
+def load_engine():
+    if not PICKLE_FALLBACK:
+        return InferenceEngine.load(ENGINE_PATH)
+    log.warning('engine_fallback', message=f"{ENGINE_PATH} not found, compiling the engine from the pickled model")
+    return InferenceEngine.from_pickles(VECTORIZER_PATH, MODEL_PATH)
+
 try:
-    vectorizer = joblib.load(VECTORIZER_PATH)
-    model = joblib.load(MODEL_PATH)
-    print("✅ System Ready!")
-except:
-    print("❌ Error loading models.")
-    vectorizer = None
-    model = None
-
-# --- CLEANING ---
-def clean_text(text):
-    if not isinstance(text, str): return ""
-    text = text.lower() 
-    text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
-    text = re.sub(r'[^\w\s]', '', text) 
-    text = text.strip()
-    return text
+    engine = load_engine()
+    log.info('ready', classes=engine.classes, features=len(engine.vocabulary), version=engine.version)
+except ArtifactError as e:
+    log.error('model_load_failed', error=str(e))
+    raise
+
+# Everything derived from one engine version is swapped together: the
+# prediction cache starts empty for a new version and the segmenter scores
+# with its weights. Requests keep the Model they started with.
+Model = namedtuple('Model', 'engine version segmenter cache')
+
+def build_model(engine):
+    telemetry.MODEL_VERSION.set(engine.version)
+    return Model(
+        engine=engine,
+        version=engine.version,
+        # Sliding-window segmentation of mixed-language documents
+        # (SEGMENT_WINDOW_WORDS, SEGMENT_STRIDE_WORDS)
+        segmenter=Segmenter(engine),
+        cache=PredictionCache(capacity=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL)
+    )
+
+# Versions published to ENGINE_PATH (feedback updates, re-exports) are loaded
+# by the first request that sees them, without restarting the workers. In
+# fallback mode the engine is recompiled when the pickles change instead.
+if PICKLE_FALLBACK:
+    models = PickleWatcher(VECTORIZER_PATH, MODEL_PATH, engine, build=build_model)
+else:
+    models = EngineWatcher(ENGINE_PATH, engine, build=build_model)
+
+def current_model():
+    return models.current()
+
+# --- ONLINE UPDATES ---
+# Corrected labels from /api/feedback; every FEEDBACK_UPDATE_INTERVAL seconds
+# one worker folds them into a new engine version. That only runs with a
+# FEEDBACK_TOKEN (sent as X-Feedback-Token) or FEEDBACK_UPDATES=1, see feedback.py.
+# The log stops accepting entries at FEEDBACK_MAX_BYTES (507).
+MAX_FEEDBACK_CHARS = int(os.environ.get('MAX_FEEDBACK_CHARS', 5000))
+app.config['MAX_FEEDBACK_CHARS'] = MAX_FEEDBACK_CHARS
+
+feedback_log = FeedbackLog()
+feedback_updater = FeedbackUpdater(feedback_log, ENGINE_PATH)
+
+@app.before_request
+def start_feedback_updater():
+    # Started lazily so each forked gunicorn worker gets its own thread
+    if FEEDBACK_UPDATES:
+        feedback_updater.ensure_started()
+
+# --- SPEECH RECOGNIZER ---
+# SPEECH_RECOGNIZER=google (default) or fake (offline, FAKE_RECOGNIZER_LATENCY seconds per call)
+_recognizer = None
+
+def get_recognizer():
+    global _recognizer
+    if _recognizer is None:
+        _recognizer = make_recognizer()
+    return _recognizer
+
+# Recent traffic mix, used to order recognizer languages (per worker process)
+language_prior = LanguagePrior()
 
 # --- PREDICTION HELPER ---
-def get_prediction(text):
-    cleaned = clean_text(text)
-    vec = vectorizer.transform([cleaned])
-    pred = model.predict(vec)[0]
-    probs = model.predict_proba(vec)[0]
-    conf = round(max(probs) * 100, 2)
+def get_prediction(text, model=None):
+    model = model or current_model()
+    engine = model.engine
+
+    def predict_cleaned(cleaned):
+        pred, probs = engine.predict(cleaned)
+        probs.setflags(write=False)  # shared through the cache
+        return pred, probs
+
+    with telemetry.span('predict'):
+        cleaned = clean_text(text)
+        pred, probs = model.cache.get_or_compute(cleaned, predict_cleaned)
+    conf = round(float(max(probs)) * 100, 2)
     return pred, conf
 
+# --- BATCH PREDICTION HELPER ---
+def get_predictions(texts, model=None):
+    model = model or current_model()
+    engine, prediction_cache = model.engine, model.cache
+    cleaned = [clean_text(text) for text in texts]
+    classes = engine.classes
+
+    # Serve what we can from the cache, then one vectorization and one
+    # matrix product over the remaining (deduplicated) texts
+    rows = {}
+    for text in cleaned:
+        if text not in rows:
+            cached = prediction_cache.get(text)
+            if cached is not None:
+                rows[text] = cached[1]
+    missing = [text for text in dict.fromkeys(cleaned) if text not in rows]
+    if missing:
+        for text, row in zip(missing, engine.predict_proba(missing)):
+            row.setflags(write=False)
+            prediction_cache.put(text, (classes[int(row.argmax())], row))
+            rows[text] = row
+
+    results = []
+    for text in cleaned:
+        row = rows[text]
+        best = int(row.argmax())
+        results.append({
+            'prediction': classes[best],
+            'confidence': round(float(row[best]) * 100, 2),
+            'probabilities': {c: round(float(p) * 100, 2) for c, p in zip(classes, row)}
+        })
+    return results
+
 # --- ROUTE 1: HOME ---
 @app.route('/', methods=['GET', 'POST'])
+@traced('home')
 def home():
     prediction = None
     confidence = None
     user_text = ""
+    model = current_model()
 
     if request.method == 'POST':
         if 'text_input' in request.form:
             user_text = request.form['text_input']
             if user_text.strip():
-                prediction, confidence = get_prediction(user_text)
+                prediction, confidence = get_prediction(user_text, model)
+                current_trace().note(prediction=prediction, confidence=confidence, model_version=model.version)
 
     return render_template('index.html', 
                            prediction=prediction, 
                            confidence=confidence, 
-                           user_text=user_text)
+                           user_text=user_text,
+                           model_version=model.version)
+
+# --- ROUTE 1b: BATCH TEXT API ---
+@app.route('/api/predict/batch', methods=['POST'])
+@traced('predict_batch')
+def predict_batch():
+    payload = request.get_json(silent=True)
+    texts = payload.get('texts') if isinstance(payload, dict) else None
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return jsonify({'status': 'error', 'message': 'Expected JSON body {"texts": [<string>, ...]}'}), 400
+
+    max_batch = app.config['MAX_BATCH_SIZE']
+    if len(texts) > max_batch:
+        return jsonify({'status': 'error', 'message': f'Batch too large ({len(texts)} texts, max {max_batch})'}), 413
+
+    model = current_model()
+    start = time.perf_counter()
+    with telemetry.span('predict_batch'):
+        results = get_predictions(texts, model) if texts else []
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    current_trace().note(count=len(results), model_version=model.version)
+
+    return jsonify({
+        'status': 'success',
+        'model_version': model.version,
+        'count': len(results),
+        'elapsed_ms': round(elapsed_ms, 3),
+        'results': results
+    })
+
+# --- ROUTE 1c: CODE-SWITCHING SEGMENTATION API ---
+@app.route('/api/segment', methods=['POST'])
+@traced('segment')
+def segment_document():
+    payload = request.get_json(silent=True)
+    text = payload.get('text') if isinstance(payload, dict) else None
+    if not isinstance(text, str):
+        return jsonify({'status': 'error', 'message': 'Expected JSON body {"text": <string>}'}), 400
+
+    max_chars = app.config['MAX_SEGMENT_CHARS']
+    if len(text) > max_chars:
+        return jsonify({'status': 'error', 'message': f'Text too long ({len(text)} characters, max {max_chars})'}), 413
+
+    model = current_model()
+    start = time.perf_counter()
+    with telemetry.span('segment'):
+        spans = model.segmenter.segment(text)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    # Share of words per language; the document label is the largest one
+    words = {}
+    for span in spans:
+        words[span['prediction']] = words.get(span['prediction'], 0) + span['words']
+    total = sum(words.values())
+    languages = {label: round(count * 100 / total, 2) for label, count in words.items()}
+    prediction = max(words, key=words.get) if words else None
+    current_trace().note(prediction=prediction, spans=len(spans), chars=len(text), model_version=model.version)
+
+    return jsonify({
+        'status': 'success',
+        'model_version': model.version,
+        'prediction': prediction,
+        'languages': languages,
+        'count': len(spans),
+        'elapsed_ms': round(elapsed_ms, 3),
+        'spans': spans
+    })
+
+# --- ROUTE 1d: LABEL FEEDBACK ---
+@app.route('/api/feedback', methods=['POST'])
+@traced('feedback')
+def feedback():
+    # Body: {"text": <string>, "label": <class>, "prediction": <class, optional>}.
+    # Accepted labels are learned by the next online update, not right away.
+    if FEEDBACK_TOKEN and not hmac.compare_digest(request.headers.get('X-Feedback-Token', ''), FEEDBACK_TOKEN):
+        return jsonify({'status': 'error', 'message': 'Invalid feedback token'}), 403
+
+    payload = request.get_json(silent=True)
+    text = payload.get('text') if isinstance(payload, dict) else None
+    label = payload.get('label') if isinstance(payload, dict) else None
+    if not isinstance(text, str) or not isinstance(label, str):
+        return jsonify({'status': 'error', 'message': 'Expected JSON body {"text": <string>, "label": <string>}'}), 400
+
+    max_chars = app.config['MAX_FEEDBACK_CHARS']
+    if len(text) > max_chars:
+        return jsonify({'status': 'error', 'message': f'Text too long ({len(text)} characters, max {max_chars})'}), 413
+
+    model = current_model()
+    if label not in model.engine.classes:
+        return jsonify({'status': 'error', 'message': f'Unknown label {label!r}, expected one of {model.engine.classes}'}), 400
+    if not clean_text(text):
+        return jsonify({'status': 'error', 'message': 'Text has no words to learn from'}), 400
+
+    prediction = payload.get('prediction')
+    if prediction not in model.engine.classes:
+        prediction = None
+    try:
+        feedback_log.append(text, label, prediction=prediction, model_version=model.version)
+    except FeedbackLogFull:
+        current_trace().fail('log_full')
+        return jsonify({'status': 'error', 'message': 'Feedback is not being accepted at the moment'}), 507
+    telemetry.FEEDBACK.labels(label).inc()
+    current_trace().note(label=label, prediction=prediction, model_version=model.version)
+    return jsonify({'status': 'accepted', 'model_version': model.version}), 202
+
+# --- ROUTE 1e: PREDICTION CACHE STATS ---
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    model = current_model()
+    stats = {'status': 'success', 'model_version': model.version, 'prediction_cache': model.cache.stats()}
+    if transcript_cache is not None:
+        stats['transcript_cache'] = transcript_cache.stats()
+    return jsonify(stats)
+
+# --- ROUTE 1f: METRICS ---
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    body, content_type = telemetry.render_metrics()
+    return Response(body, content_type=content_type)
 
 # --- ROUTE 2: AUDIO UPLOAD (Handles both file upload and live recording) ---
+# /upload only validates and queues the clip; decoding and recognition run on
+# the audio job pool so request workers stay free for text predictions
+def recognize_cached(scheduler, pcm, model):
+    # A re-sent recording reuses the stored transcripts instead of calling the
+    # recognizer again; predictions are recomputed so a newer model applies
+    if transcript_cache is None:
+        return recognize_with_strategies(scheduler, pcm)
+    key = TranscriptCache.key(pcm.pcm, pcm.sample_rate, pcm.sample_width,
+                              scheduler.recognizer.name, scheduler.languages)
+    with telemetry.span('transcript_cache_get'):
+        entry = transcript_cache.get(key)
+    if entry is not None:
+        current_trace().note(transcript_cache='hit')
+        scheduler.calls_saved += entry['recognizer_calls']
+        results = []
+        for cached in entry['results']:
+            pred, conf = get_prediction(cached['text'], model)
+            results.append(dict(cached, prediction=pred, confidence=conf))
+        return results
+
+    current_trace().note(transcript_cache='miss')
+    start = time.perf_counter()
+    results = recognize_with_strategies(scheduler, pcm)
+    # Only complete runs are stored: results missing a language because of a
+    # recognizer error or deadline miss would be replayed on every hit
+    if results and not scheduler.failures:
+        with telemetry.span('transcript_cache_put'):
+            transcript_cache.put(key, results, len(pcm.pcm) * scheduler.calls, scheduler.calls,
+                                 time.perf_counter() - start)
+    return results
+
+def process_upload(data, filename, hint):
+    trace = current_trace()
+
+    # Decode and enhance in memory; one PCM buffer feeds every strategy
+    try:
+        pcm = prepare_pcm(data, filename)
+    except AudioRejected as e:
+        trace.fail('audio_rejected', message=str(e))
+        return {'status': 'error', 'message': str(e)}
+    except Exception as e:
+        trace.fail('decode_failed', error=f'{type(e).__name__}: {e}')
+        log.error('audio_processing_failed', filename=filename, exc_info=True)
+        return {'status': 'error', 'message': f'Audio processing failed: {str(e)}. Try uploading a WAV file instead.'}
+
+    # ✅ Try recognition with multiple strategies
+    # Languages are tried in order of the client hint (form field or
+    # Accept-Language) and recent traffic, stopping once a result is confident.
+    # Every transcript of the job is scored by the same model version.
+    model = current_model()
+    scheduler = RecognitionScheduler(get_recognizer(), LANGUAGES, partial(get_prediction, model=model),
+                                     prior=language_prior, hint=hint)
+    
+    results = recognize_cached(scheduler, pcm, model)
+    trace.note(recognizer_calls=scheduler.calls, recognizer_calls_saved=scheduler.calls_saved,
+               recognizer_failures=dict(scheduler.failures), model_version=model.version)
+    
+    # Return best result - prioritize by model prediction matching API language
+    if results:
+        # Sort by score
+        sorted_results = sorted(results, key=calculate_score, reverse=True)
+        best_result = sorted_results[0]
+        scheduler.observe(best_result)
+        
+        # USE MODEL PREDICTION as the final language (not the API detection)
+        # This fixes the issue where French is detected as Darija by Google's API
+        final_prediction = best_result['prediction']
+        final_confidence = best_result['confidence']
+        final_text = best_result['text']
+        trace.note(prediction=final_prediction, confidence=final_confidence,
+                   detected_lang=best_result['detected_lang'], candidates=len(sorted_results))
+        
+        # Return the MODEL prediction (not the API detection)
+        return {
+            'status': 'success',
+            'text': final_text,
+            'prediction': final_prediction,  # Use model prediction
+            'confidence': final_confidence,
+            'model_version': model.version,
+            'detected_lang': best_result['detected_lang'],  # Keep for debugging
+            'lang_name': best_result['lang_name'],  # Keep for debugging
+            'recognizer_calls': scheduler.calls,
+            'recognizer_calls_saved': scheduler.calls_saved
+        }
+    else:
+        trace.fail('no_speech')
+        response = {
+            'status': 'error', 
+            'message': 'Could not recognize speech. Check server console for details. Tips: Record for 2-3 seconds, speak clearly and loudly.',
+            'recognizer_calls': scheduler.calls,
+            'recognizer_calls_saved': scheduler.calls_saved
+        }
+        # Keep the processed audio only when the debug spool is enabled
+        if debug_spool is not None:
+            with telemetry.span('debug_spool_write'):
+                debug_path = debug_spool.save_wav(pcm.pcm, pcm.sample_rate, pcm.sample_width)
+            trace.note(debug_audio=debug_path)
+            response['debug_info'] = f'Audio saved as {os.path.basename(debug_path)} for debugging'
+        return response
+
+def run_upload_job(data, filename, hint):
+    # Runs on an audio job thread, with its own trace
+    trace = telemetry.RequestTrace('upload_job')
+    trace.note(filename=filename, bytes=len(data))
+    try:
+        with trace.activate():
+            return process_upload(data, filename, hint)
+    finally:
+        trace.finish()
+
+# AUDIO_WORKERS threads and AUDIO_QUEUE_SIZE queued jobs per process; job
+# state lives in AUDIO_JOBS_DIR so any worker can answer /jobs/<id>
+job_store = JobStore()
+audio_jobs = AudioJobQueue(run_upload_job, job_store)
+
+# --- LONG-HELD REQUESTS ---
+# Long-polls and live streams keep their worker thread busy for seconds. A
+# worker holds at most (threads - 1) of them, so one thread is always left for
+# short requests; a sync worker (one thread) never holds any: long-polls
+# answer at once and streams are refused with 503, after which the page falls
+# back to /upload. gunicorn.conf.py runs threaded workers and exports their
+# thread count as WEB_WORKER_THREADS.
+DEV_SERVER_THREADS = 4
+_held = None
+_held_lock = threading.Lock()
+
+def worker_threads():
+    threads = os.environ.get('WEB_WORKER_THREADS')
+    if threads:
+        return int(threads)
+    # Another WSGI server (e.g. the threaded development server)
+    return DEV_SERVER_THREADS if request.environ.get('wsgi.multithread') else 1
+
+def hold_thread():
+    """Return True if this request may keep its worker thread; release_thread() gives it back."""
+    global _held
+    with _held_lock:
+        if _held is None:
+            # Created by the first request, i.e. after gunicorn forked this worker
+            _held = threading.BoundedSemaphore(worker_threads() - 1)
+    return _held.acquire(blocking=False)
+
+def release_thread():
+    _held.release()
+
+@contextmanager
+def held_thread():
+    held = hold_thread()
+    try:
+        yield held
+    finally:
+        if held:
+            release_thread()
+
+def busy_response(message):
+    response = jsonify({'status': 'error', 'message': message, 'retry_after': 5})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
 @app.route('/upload', methods=['POST'])
+@traced('upload')
 def upload_file():
+    trace = current_trace()
     if 'audio_file' not in request.files:
+        trace.fail('no_file')
         return jsonify({'status': 'error', 'message': 'No audio file part'})
     
     file = request.files['audio_file']
     if file.filename == '':
+        trace.fail('no_file')
         return jsonify({'status': 'error', 'message': 'No selected file'})
 
     if file:
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        print(f"\n{'='*60}")
-        print(f"🎤 Received audio file: {filename}")
-        print(f"📁 File size: {os.path.getsize(filepath)} bytes")
-        print(f"📝 File extension: {os.path.splitext(filename)[1]}")
-        
-        # Convert to WAV with multiple strategies
-        wav_filepath = filepath
+        with telemetry.span('read_upload'):
+            data = file.read()
+        trace.note(filename=filename, bytes=len(data), extension=os.path.splitext(filename)[1])
         
         if not PYDUB_AVAILABLE:
-            print(f"❌ pydub not available - speech recognition will likely fail")
+            trace.fail('pydub_unavailable')
             return jsonify({'status': 'error', 'message': 'Audio processing library not available. Please install pydub and FFmpeg.'})
-        
+
+        hint = request.form.get('lang_hint') or request.headers.get('Accept-Language')
         try:
-            print(f"🔄 Loading audio with pydub...")
-            
-            # Try to load the audio file
-            try:
-                audio = AudioSegment.from_file(filepath)
-            except Exception as load_error:
-                print(f"❌ Failed to load audio file: {load_error}")
-                # Try forcing format based on extension
-                ext = os.path.splitext(filename)[1].lower().replace('.', '')
-                if ext in ['webm', 'ogg', 'mp4', 'wav', 'mp3']:
-                    print(f"🔄 Retrying with explicit format: {ext}")
-                    audio = AudioSegment.from_file(filepath, format=ext)
-                else:
-                    raise load_error
-            
-            # Get audio info
-            duration_sec = len(audio) / 1000.0
-            print(f"📊 Original audio:")
-            print(f"   - Duration: {duration_sec:.2f}s")
-            print(f"   - Channels: {audio.channels}")
-            print(f"   - Sample Rate: {audio.frame_rate}Hz")
-            print(f"   - Sample Width: {audio.sample_width} bytes")
-            print(f"   - dBFS (volume): {audio.dBFS:.1f}")
-            
-            # Check if audio is too short
-            if len(audio) < 300:  # Less than 0.3 seconds
-                return jsonify({'status': 'error', 'message': f'Audio too short ({duration_sec:.1f}s). Please record at least 1 second of clear speech.'})
-            
-            # Check if audio is silent
-            if audio.dBFS < -60:
-                return jsonify({'status': 'error', 'message': f'Audio is too quiet (volume: {audio.dBFS:.1f}dBFS). Please speak louder or check microphone.'})
-            
-            # AGGRESSIVE audio enhancement for speech recognition
-            print(f"🔧 Enhancing audio for speech recognition...")
-            
-            # 1. Convert to mono
-            if audio.channels > 1:
-                audio = audio.set_channels(1)
-                print(f"  ✓ Converted to mono")
-            
-            # 2. Increase volume if too quiet
-            original_dbfs = audio.dBFS
-            if audio.dBFS < -25:
-                gain = -20 - audio.dBFS
-                audio = audio.apply_gain(gain)
-                print(f"  ✓ Increased volume by {gain:.1f}dB ({original_dbfs:.1f}dBFS → {audio.dBFS:.1f}dBFS)")
-            
-            # 3. Normalize
-            audio = audio.normalize()
-            print(f"  ✓ Normalized audio (peak at {audio.max_dBFS:.1f}dBFS)")
-            
-            # 4. Remove silence from beginning and end (more aggressive)
-            original_len = len(audio)
-            audio = audio.strip_silence(silence_thresh=-45, padding=300)
-            if len(audio) < original_len:
-                print(f"  ✓ Trimmed silence ({original_len/1000:.2f}s → {len(audio)/1000:.2f}s)")
-            
-            # 5. Apply high-pass filter to remove low-frequency noise
-            audio = audio.high_pass_filter(200)
-            print(f"  ✓ Applied high-pass filter (removed <200Hz noise)")
-            
-            # 6. Set optimal sample rate for speech recognition
-            audio = audio.set_frame_rate(16000)
-            audio = audio.set_sample_width(2)  # 16-bit
-            print(f"  ✓ Set to 16kHz, 16-bit")
-            
-            # Export processed audio - KEEP FOR DEBUGGING
-            import time
-            timestamp = int(time.time())
-            debug_filename = f'debug_audio_{timestamp}.wav'
-            wav_filepath = os.path.join(app.config['UPLOAD_FOLDER'], debug_filename)
-            
-            audio.export(wav_filepath, format='wav', parameters=["-ac", "1", "-ar", "16000"])
-            print(f"✅ Processed audio saved: {debug_filename}")
-            print(f"   Final specs: {len(audio)/1000:.2f}s, mono, 16kHz, {audio.dBFS:.1f}dBFS")
-            
-            # Remove original file
-            if filepath != wav_filepath:
-                try:
-                    os.remove(filepath)
-                except:
-                    pass
-                    
-        except Exception as e:
-            print(f"💥 Audio processing FAILED: {type(e).__name__}: {e}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({'status': 'error', 'message': f'Audio processing failed: {str(e)}. Try uploading a WAV file instead.'})
-
-        # ✅ Try recognition with multiple strategies
-        # PRIORITIZE French first, then English, then Arabic variants
-        languages = [
-            ("fr-FR", "French"),
-            ("en-US", "English"),
-            ("ar-MA", "Arabic (Morocco)"),
-            ("ar-SA", "Arabic (Standard)")
-        ]
-        results = []
-        errors = []
-        
-        # Strategy 1: Without noise adjustment (for clean recordings)
-        print(f"\n📍 STRATEGY 1: Direct recognition (no noise adjustment)")
+            job_id = audio_jobs.submit(data, filename, hint)
+        except QueueFull as e:
+            # Shed load: the client retries after the estimated drain time
+            trace.fail('queue_full')
+            response = jsonify({'status': 'error', 'message': 'Server busy, please retry shortly.',
+                                'retry_after': e.retry_after})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
+
+        trace.note(job_id=job_id)
+        return jsonify({
+            'status': 'queued',
+            'job_id': job_id,
+            'poll_url': url_for('job_status', job_id=job_id)
+        }), 202
+
+# --- ROUTE 2b: AUDIO JOB RESULTS ---
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    # ?wait=N long-polls up to N seconds (capped at JOB_LONGPOLL_MAX) when this
+    # worker can hold a thread and a long-poll slot is free; otherwise the current state is returned at once
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0.0), JOB_LONGPOLL_MAX)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'wait must be a number of seconds'}), 400
+
+    job = job_store.read(job_id)
+    if job is not None and job['state'] != 'done' and wait > 0:
+        with held_thread() as held, job_store.longpoll_slot() as acquired:
+            if held and acquired:
+                job = job_store.wait(job_id, wait)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown or expired job'}), 404
+
+    if job['state'] == 'done':
+        return jsonify({'job_id': job_id, 'state': 'done', 'result': job['result']})
+    # The header only takes whole seconds; clients that can, use the body's
+    response = jsonify({'job_id': job_id, 'state': job['state'], 'retry_after': audio_jobs.poll_interval()})
+    response.headers['Retry-After'] = '1'
+    return response
+
+# --- ROUTE 2c: AUDIO QUEUE STATS ---
+@app.route('/api/jobs/stats', methods=['GET'])
+def job_stats():
+    return jsonify({'status': 'success', 'audio_jobs': audio_jobs.stats()})
+
+# --- ROUTE 3: STREAMING AUDIO (live recording, chunked upload) ---
+def recognize_segment(pcm, hint=None):
+    # One VAD segment (int16, 16 kHz) -> best recognition result
+    if not segment_level_ok(pcm):
+        return {'status': 'error', 'message': 'Segment too quiet'}
+    samples = audio_enhance.to_float(pcm.tobytes(), 2, 1)
+    enhanced, _ = enhance_samples(samples, STREAM_SAMPLE_RATE)
+    model = current_model()
+    scheduler = RecognitionScheduler(get_recognizer(), LANGUAGES, partial(get_prediction, model=model),
+                                     prior=language_prior, hint=hint)
+    results = recognize_with_strategies(scheduler, PCMBuffer(enhanced.tobytes()))
+    calls = {'recognizer_calls': scheduler.calls, 'recognizer_calls_saved': scheduler.calls_saved}
+    if not results:
+        return dict(calls, status='error', message='Could not recognize speech')
+
+    best_result = sorted(results, key=calculate_score, reverse=True)[0]
+    scheduler.observe(best_result)
+    return dict(
+        calls,
+        status='success',
+        text=best_result['text'],
+        prediction=best_result['prediction'],
+        confidence=best_result['confidence'],
+        model_version=model.version,
+        detected_lang=best_result['detected_lang'],
+        lang_name=best_result['lang_name']
+    )
+
+def stream_events(read, hint):
+    # Result events of one live stream, recorded as one 'stream' trace
+    trace = telemetry.RequestTrace('stream')
+
+    def process_segment(pcm, start, end):
+        # Runs on the stream's segment pool; record into this request's trace
+        with trace.activate():
+            return recognize_segment(pcm, hint)
+
+    event = {}
+    try:
+        for event in stream_results(read, process_segment):
+            yield event
+    finally:
+        if event.get('type') != 'final':
+            trace.fail('disconnected')
+        elif event['status'] != 'success':
+            trace.fail('no_speech')
+        trace.note(**{key: event.get(key) for key in (
+            'audio_seconds', 'truncated', 'timed_out', 'segments', 'prediction', 'confidence',
+            'recognizer_calls', 'recognizer_calls_saved')})
+        trace.finish()
+
+@app.route('/stream', methods=['POST'])
+def stream_audio():
+    # Body: raw 16 kHz mono PCM16 (little-endian), sent with chunked transfer
+    # encoding while recording. Response: one JSON object per line, a
+    # 'segment' event per completed speech segment, then a 'final' event.
+    # For HTTP clients that can read while still sending (curl, scripts):
+    # browsers only stream request bodies half-duplex, so the page uses the
+    # WebSocket below instead.
+    if not hold_thread():
+        return busy_response('No worker thread free for a live stream, upload the recording instead')
+    hint = request.args.get('lang_hint') or request.headers.get('Accept-Language')
+    # Under gunicorn reads go straight to the client socket, which gets a
+    # timeout for each read (see STREAM_IDLE_SECONDS in streaming.py)
+    client = request.environ.get('gunicorn.socket')
+
+    def read(size, timeout):
+        if client is not None:
+            client.settimeout(timeout)
         try:
-            with sr.AudioFile(wav_filepath) as source:
-                print(f"📊 Audio duration: {source.DURATION:.2f}s, Sample rate: {source.SAMPLE_RATE}Hz, Width: {source.SAMPLE_WIDTH}")
-                
-                r1 = sr.Recognizer()
-                r1.energy_threshold = 50
-                r1.dynamic_energy_threshold = False
-                
-                audio_data = r1.record(source)
-                
-                for lang_code, lang_name in languages:
-                    try:
-                        print(f"  🌐 Trying {lang_name}...")
-                        text = r1.recognize_google(audio_data, language=lang_code)
-                        if text and len(text.strip()) > 0:
-                            print(f"  ✅ SUCCESS: '{text}'")
-                            pred, conf = get_prediction(text)
-                            results.append({
-                                'text': text,
-                                'prediction': pred,
-                                'confidence': conf,
-                                'detected_lang': lang_code,
-                                'lang_name': lang_name,
-                                'strategy': 'direct'
-                            })
-                    except sr.UnknownValueError:
-                        print(f"  ❌ Could not understand")
-                    except Exception as e:
-                        print(f"  ❌ Error: {e}")
-                        
-        except Exception as e:
-            print(f"❌ Strategy 1 failed: {e}")
-        
-        # Strategy 2: With aggressive noise adjustment (for noisy recordings)
-        if not results:
-            print(f"\n📍 STRATEGY 2: With noise adjustment")
-            try:
-                with sr.AudioFile(wav_filepath) as source:
-                    r2 = sr.Recognizer()
-                    r2.energy_threshold = 100
-                    r2.dynamic_energy_threshold = True
-                    r2.dynamic_energy_adjustment_damping = 0.15
-                    r2.dynamic_energy_ratio = 1.5
-                    
-                    # Adjust for noise
-                    r2.adjust_for_ambient_noise(source, duration=min(1.0, source.DURATION))
-                    audio_data = r2.record(source)
-                    
-                    for lang_code, lang_name in languages:
-                        try:
-                            print(f"  🌐 Trying {lang_name}...")
-                            text = r2.recognize_google(audio_data, language=lang_code)
-                            if text and len(text.strip()) > 0:
-                                print(f"  ✅ SUCCESS: '{text}'")
-                                pred, conf = get_prediction(text)
-                                results.append({
-                                    'text': text,
-                                    'prediction': pred,
-                                    'confidence': conf,
-                                    'detected_lang': lang_code,
-                                    'lang_name': lang_name,
-                                    'strategy': 'noise-adjusted'
-                                })
-                        except sr.UnknownValueError:
-                            print(f"  ❌ Could not understand")
-                        except Exception as e:
-                            print(f"  ❌ Error: {e}")
-                            
-            except Exception as e:
-                print(f"❌ Strategy 2 failed: {e}")
-        
-        # Strategy 3: Partial recognition (show_all=True)
-        if not results:
-            print(f"\n📍 STRATEGY 3: Detailed recognition with alternatives")
-            try:
-                with sr.AudioFile(wav_filepath) as source:
-                    r3 = sr.Recognizer()
-                    r3.energy_threshold = 300
-                    audio_data = r3.record(source)
-                    
-                    for lang_code, lang_name in languages:
-                        try:
-                            print(f"  🌐 Trying {lang_name} with show_all...")
-                            response = r3.recognize_google(audio_data, language=lang_code, show_all=True)
-                            if response and 'alternative' in response:
-                                for alt in response['alternative']:
-                                    if 'transcript' in alt and alt['transcript']:
-                                        text = alt['transcript']
-                                        confidence_score = alt.get('confidence', 0.5) * 100
-                                        print(f"  ✅ Found: '{text}' (API confidence: {confidence_score:.1f}%)")
-                                        pred, conf = get_prediction(text)
-                                        results.append({
-                                            'text': text,
-                                            'prediction': pred,
-                                            'confidence': conf,
-                                            'detected_lang': lang_code,
-                                            'lang_name': lang_name,
-                                            'strategy': 'detailed',
-                                            'api_confidence': confidence_score
-                                        })
-                                        break
-                        except sr.UnknownValueError:
-                            print(f"  ❌ Could not understand")
-                        except Exception as e:
-                            print(f"  ❌ Error: {e}")
-                            
-            except Exception as e:
-                print(f"❌ Strategy 3 failed: {e}")
-        
-        # Return best result - prioritize by model prediction matching API language
-        if results:
-            # Score each result based on:
-            # 1. Model confidence (primary)
-            # 2. Whether model prediction matches API detected language (bonus)
-            def calculate_score(result):
-                score = result['confidence']
-                
-                # Map model predictions to expected language codes
-                pred_lang_map = {
-                    'Français': ['fr-FR'],
-                    'English': ['en-US'],
-                    'Darija': ['ar-MA', 'ar-SA']
-                }
-                
-                # Bonus if model prediction aligns with API detection
-                expected_codes = pred_lang_map.get(result['prediction'], [])
-                if result['detected_lang'] in expected_codes:
-                    score += 10  # Alignment bonus
-                
-                return score
-            
-            # Sort by score
-            sorted_results = sorted(results, key=calculate_score, reverse=True)
-            
-            # Print all results for debugging
-            print(f"\n📊 ALL RECOGNITION RESULTS:")
-            for i, r in enumerate(sorted_results, 1):
-                alignment = "✓" if r['prediction'] in r['lang_name'] or r['lang_name'] in r['prediction'] else "✗"
-                print(f"  {i}. '{r['text']}' | API: {r['lang_name']} | Model: {r['prediction']} | Conf: {r['confidence']}% | Align: {alignment}")
-            
-            best_result = sorted_results[0]
-            
-            # USE MODEL PREDICTION as the final language (not the API detection)
-            # This fixes the issue where French is detected as Darija by Google's API
-            final_prediction = best_result['prediction']
-            final_confidence = best_result['confidence']
-            final_text = best_result['text']
-            
-            print(f"\n🎯 FINAL RESULT:")
-            print(f"   Text: '{final_text}'")
-            print(f"   API detected as: {best_result['lang_name']}")
-            print(f"   Model classified as: {final_prediction} ✓")
-            print(f"   Confidence: {final_confidence}%")
-            print(f"{'='*60}\n")
-            
-            # Clean up on success
+            return request.stream.read(size)
+        except TimeoutError:
+            return None
+        finally:
+            if client is not None:
+                client.settimeout(None)
+
+    def generate():
+        for event in stream_events(read, hint):
+            yield json.dumps(event, ensure_ascii=False) + '\n'
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.call_on_close(release_thread)
+    return response
+
+# --- ROUTE 3b: STREAMING AUDIO OVER A WEBSOCKET (browser live recording) ---
+# Binary messages carry the same PCM as /stream; a text message (or closing
+# the socket) ends the audio. Each event is sent back as a JSON text message
+# as soon as it is ready, while the browser keeps recording. Needs flask-sock
+# and a free thread (see LONG-HELD REQUESTS); otherwise the page falls back
+# to /upload.
+if SOCK_AVAILABLE:
+    sock = Sock(app)
+
+    @sock.route('/ws/stream')
+    def stream_socket(ws):
+        with held_thread() as held:
+            if held:
+                serve_stream_socket(ws)
+            # else: closed without a final event, the page falls back to /upload
+
+    def serve_stream_socket(ws):
+        hint = request.args.get('lang_hint') or request.headers.get('Accept-Language')
+
+        def read(size, timeout):
             try:
-                os.remove(wav_filepath)
-            except:
-                pass
-            
-            # Return the MODEL prediction (not the API detection)
-            return jsonify({
-                'status': 'success',
-                'text': final_text,
-                'prediction': final_prediction,  # Use model prediction
-                'confidence': final_confidence,
-                'detected_lang': best_result['detected_lang'],  # Keep for debugging
-                'lang_name': best_result['lang_name']  # Keep for debugging
-            })
-        else:
-            print(f"\n❌ ALL STRATEGIES FAILED")
-            print(f"📁 Processed audio saved for debugging: {wav_filepath}")
-            print(f"   You can test this file manually or listen to it to check quality.")
-            print(f"{'='*60}\n")
-            
-            # Keep the WAV file for debugging - don't delete it
-            return jsonify({
-                'status': 'error', 
-                'message': 'Could not recognize speech. Check server console for details. Tips: Record for 2-3 seconds, speak clearly and loudly.',
-                'debug_info': f'Audio saved as {os.path.basename(wav_filepath)} for debugging',
-                'debug_file': wav_filepath
-            })
+                message = ws.receive(timeout=timeout)
+            except ConnectionClosed:
+                return b''
+            if message is None:
+                return None  # nothing within the timeout
+            return message if isinstance(message, bytes) else b''
+
+        events = stream_events(read, hint)
+        try:
+            for event in events:
+                ws.send(json.dumps(event, ensure_ascii=False))
+        except ConnectionClosed:
+            pass  # recorded as 'disconnected' by the trace
+        finally:
+            events.close()
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,228 @@
+import math
+import time
+from math import gcd
+
+import numpy as np
+
+# --- CONFIGURATION ---
+# Same targets as the former pydub chain in upload_file()
+TARGET_SAMPLE_RATE = 16000
+QUIET_DBFS = -25.0          # below this, boost towards...
+BOOST_TARGET_DBFS = -20.0   # ...this loudness
+NORMALIZE_HEADROOM_DB = 0.1
+SILENCE_THRESH_DBFS = -45.0
+SILENCE_LEN_MS = 1000
+SILENCE_PADDING_MS = 300
+HIGH_PASS_CUTOFF_HZ = 200.0
+
+
+def to_float(raw, sample_width, channels):
+    """Interleaved PCM bytes -> float32 array of shape (frames, channels) in [-1, 1).
+
+    Samples are signed at every width: pydub already unbiases 8-bit WAV data
+    when it loads it, so AudioSegment.raw_data is int8 there.
+    """
+    if sample_width == 1:
+        samples = np.frombuffer(raw, dtype=np.int8).astype(np.float32) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+    elif sample_width == 4:
+        samples = (np.frombuffer(raw, dtype='<i4') / 2147483648.0).astype(np.float32)
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width} bytes")
+    return samples.reshape(-1, channels)
+
+
+def to_int16(samples):
+    out = np.multiply(samples, 32768.0, dtype=np.float32)
+    np.rint(out, out=out)
+    np.clip(out, -32768, 32767, out=out)
+    return out.astype('<i2')
+
+
+def dbfs(samples):
+    # RMS level relative to full scale, as AudioSegment.dBFS
+    if samples.size == 0:
+        return -math.inf
+    rms = math.sqrt(float(np.dot(samples.ravel(), samples.ravel())) / samples.size)
+    return 20 * math.log10(rms) if rms > 0 else -math.inf
+
+
+def peak_dbfs(samples):
+    peak = float(np.abs(samples).max()) if samples.size else 0.0
+    return 20 * math.log10(peak) if peak > 0 else -math.inf
+
+
+# --- STAGES ---
+def downmix(samples):
+    if samples.ndim == 1:
+        return samples
+    if samples.shape[1] == 1:
+        return samples[:, 0]
+    return samples.mean(axis=1, dtype=np.float32)
+
+
+def gain_and_normalize(mono):
+    """Quiet-signal boost followed by peak normalisation, as one scale (in place).
+
+    The boost clips at full scale like pydub's apply_gain, so the clip is kept
+    before the normalisation factor is applied.
+    """
+    level = dbfs(mono)
+    boost_db = BOOST_TARGET_DBFS - level if level < QUIET_DBFS else 0.0
+    gain = 10 ** (boost_db / 20)
+
+    peak = float(np.abs(mono).max()) if mono.size else 0.0
+    if peak == 0:
+        return mono, boost_db
+    boosted_peak = min(peak * gain, 1.0)
+    target_peak = 10 ** (-NORMALIZE_HEADROOM_DB / 20)
+
+    if boosted_peak < peak * gain:
+        mono *= gain
+        np.clip(mono, -1.0, 1.0, out=mono)
+        mono *= target_peak / boosted_peak
+    else:
+        mono *= target_peak / peak
+    return mono, boost_db
+
+
+def resample(mono, sample_rate, target_rate=TARGET_SAMPLE_RATE):
+    if sample_rate == target_rate or mono.size == 0:
+        return mono
+    from scipy.signal import resample_poly
+
+    g = gcd(int(sample_rate), int(target_rate))
+    return resample_poly(mono, target_rate // g, sample_rate // g).astype(np.float32, copy=False)
+
+
+def nonsilent_ranges(mono, sample_rate, silence_thresh=SILENCE_THRESH_DBFS, silence_len=SILENCE_LEN_MS):
+    """Millisecond [start, end) ranges that are not inside a silence of at least silence_len.
+
+    Mirrors pydub.silence.detect_nonsilent (1 ms seek step) using a running
+    sum of per-millisecond energies instead of one RMS per window.
+    """
+    per_ms = sample_rate // 1000
+    length_ms = len(mono) // per_ms
+    if length_ms < silence_len:
+        return [(0, length_ms)]
+
+    frames = mono[:length_ms * per_ms].reshape(length_ms, per_ms)
+    energy = np.einsum('ij,ij->i', frames, frames, dtype=np.float64)
+    running = np.concatenate(([0.0], np.cumsum(energy)))
+    window = running[silence_len:] - running[:-silence_len]
+    threshold = (10 ** (silence_thresh / 20)) ** 2 * silence_len * per_ms
+    silent = window <= threshold  # one entry per window start
+
+    # Runs of silent window starts -> silence ranges [first_start, last_start + silence_len)
+    edges = np.diff(np.concatenate(([0], silent.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1 + silence_len
+
+    ranges = []
+    prev_end = 0
+    for start, end in zip(starts, ends):
+        if start > prev_end:
+            ranges.append((prev_end, int(start)))
+        prev_end = int(end)
+    if prev_end < length_ms:
+        ranges.append((prev_end, length_ms))
+    return ranges
+
+
+def strip_silence(mono, sample_rate, padding=SILENCE_PADDING_MS):
+    """Drop silences of at least SILENCE_LEN_MS, keeping ``padding`` ms around speech.
+
+    Kept chunks are joined with a padding/2 linear crossfade (pydub uses a
+    dB-linear fade of the same length).
+    """
+    ranges = nonsilent_ranges(mono, sample_rate)
+    if not ranges:
+        return mono[:0]
+    length_ms = len(mono) * 1000 // sample_rate
+    if ranges == [(0, length_ms)]:
+        return mono
+
+    # Pad each range and split the overlap between neighbours, as split_on_silence
+    padded = [[start - padding, end + padding] for start, end in ranges]
+    for left, right in zip(padded, padded[1:]):
+        if right[0] < left[1]:
+            left[1] = right[0] = (left[1] + right[0]) // 2
+    per_ms = sample_rate // 1000
+    chunks = [mono[max(s, 0) * per_ms:min(e, length_ms) * per_ms] for s, e in padded]
+    if len(chunks) == 1:
+        return chunks[0]
+
+    crossfade = (padding // 2) * per_ms
+    out_len = sum(len(c) for c in chunks) - crossfade * (len(chunks) - 1)
+    out = np.empty(max(out_len, 0), dtype=mono.dtype)
+    fade_in = np.linspace(0.0, 1.0, crossfade, dtype=np.float32)
+    pos = 0
+    for i, chunk in enumerate(chunks):
+        if i == 0 or crossfade == 0 or len(chunk) < crossfade or pos < crossfade:
+            out[pos:pos + len(chunk)] = chunk
+            pos += len(chunk)
+            continue
+        start = pos - crossfade
+        out[start:pos] = out[start:pos] * fade_in[::-1] + chunk[:crossfade] * fade_in
+        out[pos:pos + len(chunk) - crossfade] = chunk[crossfade:]
+        pos += len(chunk) - crossfade
+    return out[:pos]
+
+
+def high_pass(mono, sample_rate, cutoff=HIGH_PASS_CUTOFF_HZ):
+    # First-order RC filter: y[i] = a * (y[i-1] + x[i] - x[i-1]), y[0] = x[0]
+    if mono.size == 0:
+        return mono
+    from scipy.signal import lfilter
+
+    rc = 1.0 / (cutoff * 2 * math.pi)
+    dt = 1.0 / sample_rate
+    alpha = rc / (rc + dt)
+    b, a = [alpha, -alpha], [1.0, -alpha]
+    zi = np.array([(1 - alpha) * mono[0]])
+    out, _ = lfilter(b, a, mono, zi=zi)
+    return out.astype(np.float32, copy=False)
+
+
+# --- PIPELINE ---
+def enhance(samples, sample_rate):
+    """Downmix, boost/normalise, resample to 16 kHz, trim silence and high-pass.
+
+    ``samples`` is a float32 (frames, channels) array from to_float() and may
+    be modified in place. Returns the 16 kHz mono int16 signal and a report of
+    what each stage did, including its duration in seconds under ``timings``.
+    """
+    clock = time.perf_counter
+    timings = {}
+    report = {'channels': samples.shape[1] if samples.ndim > 1 else 1, 'timings': timings}
+
+    t = clock()
+    mono = downmix(samples)
+    timings['downmix'] = clock() - t
+
+    t = clock()
+    report['dbfs_before_gain'] = dbfs(mono)
+    mono, report['boost_db'] = gain_and_normalize(mono)
+    report['peak_dbfs'] = peak_dbfs(mono)
+    timings['normalize'] = clock() - t
+
+    t = clock()
+    mono = resample(mono, sample_rate)
+    timings['resample'] = clock() - t
+    report['duration_before_trim'] = len(mono) / TARGET_SAMPLE_RATE
+
+    t = clock()
+    mono = strip_silence(mono, TARGET_SAMPLE_RATE)
+    timings['strip_silence'] = clock() - t
+    report['duration'] = len(mono) / TARGET_SAMPLE_RATE
+
+    t = clock()
+    mono = high_pass(mono, TARGET_SAMPLE_RATE)
+    timings['high_pass'] = clock() - t
+
+    t = clock()
+    pcm = to_int16(mono)
+    report['dbfs'] = dbfs(mono)
+    timings['to_int16'] = clock() - t
+    return pcm, report
@@ -0,0 +1,120 @@
+import importlib.util
+import io
+import os
+
+import audio_enhance
+import telemetry
+
+# pydub and speech_recognition are only imported on the first audio request;
+# warm_audio_imports() loads them up front (e.g. in the gunicorn master)
+PYDUB_AVAILABLE = importlib.util.find_spec('pydub') is not None
+
+log = telemetry.get_logger('audio')
+
+# --- CONFIGURATION ---
+TARGET_SAMPLE_RATE = audio_enhance.TARGET_SAMPLE_RATE
+TARGET_SAMPLE_WIDTH = 2  # 16-bit
+# Frames per read in speech_recognition.AudioFile, used to mirror its stream offsets
+AUDIOFILE_CHUNK = 4096
+
+
+class AudioRejected(Exception):
+    """The upload decoded fine but cannot be recognised (too short, too quiet)."""
+
+
+class PCMBuffer:
+    """Decoded and enhanced mono PCM, shared by every recognition strategy."""
+
+    def __init__(self, pcm, sample_rate=TARGET_SAMPLE_RATE, sample_width=TARGET_SAMPLE_WIDTH):
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+
+    @property
+    def duration(self):
+        return len(self.pcm) / (self.sample_rate * self.sample_width)
+
+    def audio_data(self, skip_frames=0):
+        import speech_recognition as sr
+
+        pcm = self.pcm[skip_frames * self.sample_width:] if skip_frames else self.pcm
+        return sr.AudioData(pcm, self.sample_rate, self.sample_width)
+
+    def ambient_skip_frames(self, duration):
+        # Frames Recognizer.adjust_for_ambient_noise() consumes from an AudioFile
+        # before record() picks up the rest of the stream
+        seconds_per_buffer = (AUDIOFILE_CHUNK + 0.0) / self.sample_rate
+        elapsed_time = 0
+        buffers = 0
+        while True:
+            elapsed_time += seconds_per_buffer
+            if elapsed_time > duration:
+                break
+            buffers += 1
+        total_frames = len(self.pcm) // self.sample_width
+        return min(buffers * AUDIOFILE_CHUNK, total_frames)
+
+
+# --- DECODING ---
+def warm_audio_imports():
+    import speech_recognition  # noqa: F401
+    import pydub  # noqa: F401
+    import scipy.signal  # noqa: F401
+
+
+def decode_audio(data, filename):
+    from pydub import AudioSegment
+
+    # Decode straight from memory; pydub pipes the bytes to ffmpeg's stdin
+    with telemetry.span('decode'):
+        try:
+            return AudioSegment.from_file(io.BytesIO(data))
+        except Exception as load_error:
+            # Try forcing format based on extension
+            ext = os.path.splitext(filename)[1].lower().replace('.', '')
+            if ext in ['webm', 'ogg', 'mp4', 'wav', 'mp3']:
+                log.debug('decode_retry', format=ext, error=str(load_error))
+                return AudioSegment.from_file(io.BytesIO(data), format=ext)
+            raise load_error
+
+
+# --- ENHANCEMENT ---
+def enhance_samples(samples, sample_rate):
+    """audio_enhance.enhance() with each step recorded as an ``enhance.<step>`` span."""
+    pcm, report = audio_enhance.enhance(samples, sample_rate)
+    for step, seconds in report['timings'].items():
+        telemetry.record_stage(f'enhance.{step}', seconds)
+    return pcm, report
+
+
+def enhance_audio(audio):
+    """Validate a decoded AudioSegment and run the NumPy enhancement stage on it."""
+    with telemetry.span('enhance.to_float'):
+        samples = audio_enhance.to_float(audio.raw_data, audio.sample_width, audio.channels)
+        level = audio_enhance.dbfs(samples)
+
+    duration_sec = len(samples) / audio.frame_rate
+    telemetry.note(audio_seconds=round(duration_sec, 2), channels=audio.channels,
+                   sample_rate=audio.frame_rate, sample_width=audio.sample_width, input_dbfs=round(level, 1))
+
+    # Check if audio is too short
+    if duration_sec < 0.3:
+        raise AudioRejected(f'Audio too short ({duration_sec:.1f}s). Please record at least 1 second of clear speech.')
+
+    # Check if audio is silent
+    if level < -60:
+        raise AudioRejected(f'Audio is too quiet (volume: {level:.1f}dBFS). Please speak louder or check microphone.')
+
+    # Mono, boost + normalize, 16 kHz, silence trim, high-pass in one NumPy pass
+    pcm, report = enhance_samples(samples, audio.frame_rate)
+    log.debug('enhanced', boost_db=round(report['boost_db'], 1), peak_dbfs=round(report['peak_dbfs'], 1),
+              duration_before_trim=round(report['duration_before_trim'], 2),
+              duration=round(report['duration'], 2), dbfs=round(report['dbfs'], 1))
+    return pcm, report
+
+
+def prepare_pcm(data, filename):
+    """Decode and enhance an upload entirely in memory."""
+    pcm, report = enhance_audio(decode_audio(data, filename))
+    telemetry.note(processed_seconds=round(report['duration'], 2))
+    return PCMBuffer(pcm.tobytes(), TARGET_SAMPLE_RATE, TARGET_SAMPLE_WIDTH)
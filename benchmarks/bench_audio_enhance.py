@@ -0,0 +1,80 @@
+"""Compare the NumPy enhancement stage with the former pydub transform chain.
+
+    python benchmarks/bench_audio_enhance.py [--durations 1 5 15 30 60] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from pydub import AudioSegment
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audio_enhance  # noqa: E402
+
+
+def synthetic_clip(seconds, sample_rate=44100, channels=2, seed=0):
+    # Speech-like bursts (harmonics + syllable envelope) separated by pauses, over noise
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    voice = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((140, 280, 420, 560)))
+    envelope = np.clip(np.sin(2 * np.pi * 2.5 * t), 0, None)
+    # 1.5 s pauses every 4 s so silence trimming has work to do
+    envelope[(t % 4.0) > 2.5] = 0
+    signal = 0.05 * voice * envelope + 0.0002 * rng.standard_normal(len(t))
+    stereo = np.stack([signal] * channels, axis=1) if channels > 1 else signal[:, None]
+    pcm = (np.clip(stereo, -1, 1) * 32767).astype('<i2')
+    return AudioSegment(pcm.tobytes(), frame_rate=sample_rate, sample_width=2, channels=channels)
+
+
+def pydub_chain(audio):
+    # The chain upload_file() used before the NumPy stage
+    if audio.channels > 1:
+        audio = audio.set_channels(1)
+    if audio.dBFS < -25:
+        audio = audio.apply_gain(-20 - audio.dBFS)
+    audio = audio.normalize()
+    audio = audio.strip_silence(silence_thresh=-45, padding=300)
+    audio = audio.high_pass_filter(200)
+    audio = audio.set_frame_rate(16000)
+    audio = audio.set_sample_width(2)
+    return audio
+
+
+def numpy_stage(audio):
+    samples = audio_enhance.to_float(audio.raw_data, audio.sample_width, audio.channels)
+    pcm, _ = audio_enhance.enhance(samples, audio.frame_rate)
+    return pcm
+
+
+def best_of(func, arg, repeat):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--durations', type=float, nargs='+', default=[1, 5, 15, 30, 60])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'clip':>6} | {'pydub':>9} | {'numpy':>9} | {'speedup':>7} | {'out (pydub/numpy)':>17} | {'level Δ':>7}")
+    for seconds in args.durations:
+        clip = synthetic_clip(seconds)
+        pydub_t, reference = best_of(pydub_chain, clip, args.repeat)
+        numpy_t, pcm = best_of(numpy_stage, clip, args.repeat)
+
+        ref_samples = audio_enhance.to_float(reference.raw_data, 2, 1)
+        level_delta = audio_enhance.dbfs(pcm.astype(np.float32) / 32768) - audio_enhance.dbfs(ref_samples)
+        print(f"{seconds:5.0f}s | {pydub_t * 1000:7.1f}ms | {numpy_t * 1000:7.1f}ms | {pydub_t / numpy_t:6.1f}x | "
+              f"{len(reference) / 1000:7.2f}s/{len(pcm) / 16000:6.2f}s | {level_delta:+6.2f}dB")
+
+
+if __name__ == '__main__':
+    main()
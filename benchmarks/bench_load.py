@@ -0,0 +1,388 @@
+"""Load test of the web app under gunicorn, across worker settings.
+
+    python benchmarks/bench_load.py [--worker-class sync gthread] [--workers 1 2 4] [--threads 1 4]
+                                    [--concurrency 16] [--mix text=0.9,upload=0.1] [--duration 20]
+                                    [--recognizer-latency 0.5] [--out benchmarks/results/load.json]
+
+For every combination of worker class, worker count and thread count, a
+fresh ``gunicorn app:app`` (with gunicorn.conf.py) is started locally with the
+fake recognizer (``--recognizer-latency`` seconds per call) in place of the
+speech API, so no network is needed. ``--concurrency`` clients then send a
+``--mix`` of operations back to back for ``--warmup`` + ``--duration``
+seconds:
+
+* text: ``POST /`` with a synthetic sentence, as the form does;
+* upload: ``POST /upload`` with a synthetic WAV clip, then ``GET /jobs/<id>``
+  polling like scripts.js until the result is in. Its latency is the
+  whole round trip. A 429 counts as rejected; the client waits for its
+  Retry-After before the next operation but does not resend the clip.
+
+Per configuration the report has the sustained rate (operations started
+during the measured window that completed, per second), p50/p95/p99
+latency of successful operations, error and rejection rates, and the peak
+memory of the gunicorn processes (total PSS and RSS per worker), printed as
+a table and written as JSON. The clients share the machine with the server:
+on a small host, run them with fewer threads than the server has CPUs, or
+read the numbers as a lower bound.
+"""
+import argparse
+import http.client
+import importlib.util
+import itertools
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+INVOCATION_DIR = os.getcwd()
+
+from bench_audio_enhance import synthetic_clip  # noqa: E402
+from bench_startup import ROOT, children, smaps_rollup, wait_ready  # noqa: E402
+from suite import git_commit, summarize, synthetic_corpus, wav_bytes  # noqa: E402
+
+DEFAULT_OUT = os.path.join(ROOT, 'benchmarks', 'results', 'load.json')
+OPERATIONS = ('text', 'upload')
+# Worker classes that take no --threads, and the module each one needs
+ASYNC_WORKER_CLASSES = {'gevent': 'gevent', 'eventlet': 'eventlet'}
+# Same long-poll as the browser client (static/scripts.js)
+JOB_LONGPOLL_SECONDS = 15
+MEMORY_SAMPLE_INTERVAL = 0.5
+
+
+# --- REQUESTS ---
+def multipart(fields, files):
+    # files: {name: (filename, bytes, content type)}
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data, content_type) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: {content_type}\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def request(conn, method, path, body=None, headers=None):
+    conn.request(method, path, body=body, headers=headers or {})
+    response = conn.getresponse()
+    return response.status, response.getheader('Retry-After'), response.read()
+
+
+def backoff(conn, retry_after):
+    # The server drops idle keep-alive connections (gunicorn --keep-alive,
+    # 2 s), so reconnect afterwards rather than write to a closed socket
+    conn.close()
+    time.sleep(float(retry_after or 1))
+
+
+def text_operation(conn, rng, corpus, uploads):
+    body = urlencode({'text_input': rng.choice(corpus)})
+    status, _, _ = request(conn, 'POST', '/', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+    return 'ok' if status == 200 else f'http_{status}'
+
+
+def upload_operation(conn, rng, corpus, uploads):
+    body, content_type = rng.choice(uploads)
+    status, retry_after, data = request(conn, 'POST', '/upload', body, {'Content-Type': content_type})
+    if status == 429:
+        # Back off as the browser does before this client's next operation
+        backoff(conn, retry_after)
+        return 'rejected'
+    if status != 202:
+        return f'http_{status}'
+    poll_path = f"{json.loads(data)['poll_url']}?wait={JOB_LONGPOLL_SECONDS}"
+    while True:
+        status, retry_after, data = request(conn, 'GET', poll_path)
+        if status != 200:
+            return f'http_{status}'
+        job = json.loads(data)
+        if job['state'] == 'done':
+            return 'ok' if job['result'].get('status') == 'success' else 'failed'
+        # As the browser, poll again after the (fractional) interval in the body
+        backoff(conn, job.get('retry_after', retry_after))
+
+
+OPERATION_FUNCS = {'text': text_operation, 'upload': upload_operation}
+
+
+# --- LOAD ---
+def parse_mix(spec):
+    mix = {}
+    for item in spec.split(','):
+        name, _, weight = item.partition('=')
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r} (expected one of {', '.join(OPERATIONS)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("The mix needs at least one operation with a positive weight")
+    return mix
+
+
+def run_load(port, mix, concurrency, warmup, duration, corpus, uploads, seed=0):
+    """Closed-loop load; returns [(operation, latency seconds, outcome)] of the measured window."""
+    names, weights = zip(*mix.items())
+    started = time.monotonic()
+    measure_from, stop_at = started + warmup, started + warmup + duration
+    records = []
+    lock = threading.Lock()
+
+    def client(index):
+        rng = random.Random(seed * 1000 + index)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        while True:
+            op_start = time.monotonic()
+            if op_start >= stop_at:
+                break
+            name = rng.choices(names, weights)[0]
+            try:
+                outcome = OPERATION_FUNCS[name](conn, rng, corpus, uploads)
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                outcome = type(e).__name__
+                conn.close()
+            if op_start >= measure_from:
+                with lock:
+                    records.append((name, time.monotonic() - op_start, outcome))
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records
+
+
+class MemorySampler:
+    """Peak PSS of a gunicorn master and its workers, and peak RSS per worker, sampled in the background."""
+
+    def __init__(self, pid, interval=MEMORY_SAMPLE_INTERVAL):
+        self.pid = pid
+        self.interval = interval
+        self.peak_total_pss_kb = 0
+        self.peak_worker_rss_kb = 0
+        self.workers = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            total_pss = 0
+            worker_rss = []
+            for pid in [self.pid] + children(self.pid):
+                try:
+                    mem = smaps_rollup(pid)
+                except (FileNotFoundError, ProcessLookupError):
+                    continue  # a worker being replaced
+                total_pss += mem.get('Pss', 0)
+                if pid != self.pid:
+                    worker_rss.append(mem.get('Rss', 0))
+            self.peak_total_pss_kb = max(self.peak_total_pss_kb, total_pss)
+            self.peak_worker_rss_kb = max([self.peak_worker_rss_kb] + worker_rss)
+            self.workers = max(self.workers, len(worker_rss))
+
+
+# --- SERVER ---
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def configurations(worker_classes, workers, threads):
+    # sync with threads > 1 is gthread in gunicorn, and async classes take no threads
+    seen = set()
+    for worker_class, n_workers, n_threads in itertools.product(worker_classes, workers, threads):
+        if worker_class == 'sync' or worker_class in ASYNC_WORKER_CLASSES:
+            n_threads = 1
+        config = (worker_class, n_workers, n_threads)
+        if config not in seen:
+            seen.add(config)
+            yield config
+
+
+def server_env(args, workdir):
+    env = dict(os.environ,
+               SPEECH_RECOGNIZER='fake',
+               FAKE_RECOGNIZER_LATENCY=str(args.recognizer_latency),
+               FAKE_RECOGNIZER_JITTER=str(args.recognizer_jitter),
+               LOG_SAMPLE_RATE='0',
+               FEEDBACK_UPDATES='0',
+               AUDIO_JOBS_DIR=os.path.join(workdir, 'jobs'),
+               PROMETHEUS_MULTIPROC_DIR=os.path.join(workdir, 'metrics'))
+    os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'])
+    # Repeated clips would be answered from the transcript cache otherwise
+    if not args.transcript_cache:
+        env['TRANSCRIPT_CACHE_MAX_BYTES'] = '0'
+    for item in args.env:
+        key, _, value = item.partition('=')
+        env[key] = value
+    return env
+
+
+def measure_configuration(args, worker_class, workers, threads, concurrency, corpus, uploads):
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix='langpredict-load-')
+    cmd = [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+           '--workers', str(workers), '--threads', str(threads), '--worker-class', worker_class,
+           '--timeout', str(args.timeout), '--log-level', 'warning', *args.gunicorn_args]
+    log_path = os.path.join(workdir, 'gunicorn.log')
+    with open(log_path, 'wb') as log_file:
+        proc = subprocess.Popen(cmd, cwd=ROOT, env=server_env(args, workdir), stdout=log_file, stderr=log_file)
+    try:
+        if not wait_ready(port, args.timeout):
+            with open(log_path, encoding='utf-8', errors='replace') as f:
+                tail = f.read()[-2000:]
+            raise RuntimeError(f"gunicorn did not answer within {args.timeout}s:\n{tail}")
+        with MemorySampler(proc.pid) as memory:
+            records = run_load(port, args.mix, concurrency, args.warmup, args.duration, corpus, uploads,
+                               seed=args.seed)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    ops = {}
+    for name in args.mix:
+        done = [(latency, outcome) for op, latency, outcome in records if op == name]
+        ok = [latency for latency, outcome in done if outcome == 'ok']
+        outcomes = {}
+        for _, outcome in done:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        entry = summarize(ok) if ok else {'n': 0}
+        # Rate over the measured window rather than per client
+        entry['throughput_per_s'] = round(len(ok) / args.duration, 2)
+        entry.update(count=len(done), outcomes=outcomes,
+                     error_rate=round(1 - len(ok) / len(done), 4) if done else None,
+                     rejected_rate=round(outcomes.get('rejected', 0) / len(done), 4) if done else None)
+        ops[name] = entry
+
+    ok = sum(1 for _, _, outcome in records if outcome == 'ok')
+    return {
+        'worker_class': worker_class,
+        'workers': workers,
+        'threads': threads,
+        'concurrency': concurrency,
+        'rps': round(ok / args.duration, 2),
+        'error_rate': round(1 - ok / len(records), 4) if records else None,
+        'ops': ops,
+        'memory': {
+            'workers_seen': memory.workers,
+            'peak_total_pss_mb': round(memory.peak_total_pss_kb / 1024, 1),
+            'peak_worker_rss_mb': round(memory.peak_worker_rss_kb / 1024, 1),
+        },
+    }
+
+
+# --- REPORT ---
+def print_row(r):
+    def latency(op):
+        entry = r['ops'].get(op)
+        if not entry or not entry['n']:
+            return f"{'-':>19}"
+        cell = f"{entry['p50_ms']:.0f}/{entry['p99_ms']:.0f}ms"
+        return f"{cell:>19}"
+
+    errors = f"{r['error_rate']:.1%}" if r['error_rate'] is not None else '-'
+    rejected = r['ops'].get('upload', {}).get('rejected_rate')
+    rejected = f"{rejected:.1%}" if rejected is not None else '-'
+    print(f"{r['worker_class']:<8} | {r['workers']:>2}x{r['threads']:<2} | {r['concurrency']:>4} | "
+          f"{r['rps']:>8.1f} | {latency('text')} | {latency('upload')} | {errors:>6} | {rejected:>6} | "
+          f"{r['memory']['peak_total_pss_mb']:>7.1f}MB | {r['memory']['peak_worker_rss_mb']:>7.1f}MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--worker-class', nargs='+', default=['sync', 'gthread'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[16], help="Concurrent clients")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('text=0.9,upload=0.1'),
+                        help="Operation weights, e.g. text=0.9,upload=0.1")
+    parser.add_argument('--duration', type=float, default=20.0, help="Measured seconds per configuration")
+    parser.add_argument('--warmup', type=float, default=5.0, help="Unmeasured seconds before that")
+    parser.add_argument('--recognizer-latency', type=float, default=0.5, help="Seconds per fake recognizer call")
+    parser.add_argument('--recognizer-jitter', type=float, default=0.0)
+    parser.add_argument('--clip-seconds', type=float, default=3.0)
+    parser.add_argument('--clips', type=int, default=4, help="Distinct upload clips")
+    parser.add_argument('--transcript-cache', action='store_true', help="Keep the transcript cache enabled")
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help="Extra server environment (e.g. AUDIO_WORKERS=4); repeatable")
+    parser.add_argument('--timeout', type=int, default=60, help="gunicorn --timeout and startup timeout")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=DEFAULT_OUT)
+    parser.add_argument('--gunicorn-args', nargs=argparse.REMAINDER, default=[],
+                        help="Extra arguments passed to gunicorn (must come last)")
+    args = parser.parse_args(argv)
+
+    worker_classes = []
+    for worker_class in args.worker_class:
+        module = ASYNC_WORKER_CLASSES.get(worker_class)
+        if module and importlib.util.find_spec(module) is None:
+            print(f"⚠️ {worker_class} is not installed, skipping that worker class", file=sys.stderr)
+            continue
+        worker_classes.append(worker_class)
+
+    corpus = synthetic_corpus(2000, args.seed)
+    uploads = [multipart({}, {'audio_file': (f'clip{i}.wav', wav_bytes(synthetic_clip(args.clip_seconds, seed=i)),
+                                             'audio/wav')})
+               for i in range(args.clips)]
+
+    started = time.time()
+    print(f"{'class':<8} | {'w x t':<5} | {'conc':>4} | {'ok/s':>8} | {'text p50/p99':>19} | "
+          f"{'upload p50/p99':>19} | {'errors':>6} | {'429':>6} | {'PSS total':>9} | {'RSS/worker':>9}")
+    results = []
+    for worker_class, workers, threads in configurations(worker_classes, args.workers, args.threads):
+        for concurrency in args.concurrency:
+            result = measure_configuration(args, worker_class, workers, threads, concurrency, corpus, uploads)
+            results.append(result)
+            print_row(result)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)),
+            'cpus': os.cpu_count(),
+            'mix': args.mix,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'recognizer_latency': args.recognizer_latency,
+            'recognizer_jitter': args.recognizer_jitter,
+            'clip_seconds': args.clip_seconds,
+            'transcript_cache': args.transcript_cache,
+            'env': args.env,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    out = os.path.join(INVOCATION_DIR, args.out)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""Measure cold start and per-worker memory of the web app.
+
+    python benchmarks/bench_startup.py [--workers 1 4] [--runs 3] [--port 8765] [--gunicorn-args ...]
+
+Two measurements, each in fresh processes:
+
+* import: time to ``import app`` in a new interpreter, its RSS/PSS and
+  which heavy modules ended up loaded;
+* gunicorn: time from launching ``gunicorn app:app`` with N workers until
+  the first request is answered, then RSS, PSS and private memory per
+  worker. PSS divides shared pages between the processes mapping them, so
+  it is the number that drops when workers share a copy.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['sklearn', 'joblib', 'scipy', 'pydub', 'speech_recognition', 'pandas']
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+mem = {}
+with open('/proc/self/smaps_rollup') as f:
+    for line in f:
+        parts = line.split()
+        if parts[0] in ('Rss:', 'Pss:'):
+            mem[parts[0][:-1].lower()] = int(parts[1])
+print(json.dumps({'seconds': elapsed, 'modules': [m for m in %r if m in sys.modules], **mem}))
+"""
+
+
+def smaps_rollup(pid):
+    # kB values of /proc/<pid>/smaps_rollup
+    mem = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                mem[parts[0].rstrip(':')] = int(parts[1])
+    return mem
+
+
+def children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except FileNotFoundError:
+        return []
+
+
+def measure_import(runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', IMPORT_PROBE % HEAVY_MODULES], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    best = min(samples, key=lambda s: s['seconds'])
+    return best
+
+
+def wait_ready(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1) as res:
+                if res.status == 200:
+                    return True
+        except OSError:
+            time.sleep(0.02)
+    return False
+
+
+def measure_gunicorn(workers, port, extra_args, timeout=60):
+    cmd = [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+           '--workers', str(workers), *extra_args]
+    start = time.monotonic()
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_ready(port, timeout):
+            raise RuntimeError(f"gunicorn did not answer within {timeout}s")
+        ready = time.monotonic() - start
+
+        # Let every worker finish booting before reading its memory
+        deadline = time.monotonic() + timeout
+        while len(children(proc.pid)) < workers and time.monotonic() < deadline:
+            time.sleep(0.05)
+        for _ in range(workers * 4):
+            wait_ready(port, 1)
+        time.sleep(0.5)
+
+        worker_mem = [smaps_rollup(pid) for pid in children(proc.pid)]
+        master_mem = smaps_rollup(proc.pid)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+    def avg(key):
+        return sum(m.get(key, 0) for m in worker_mem) / max(len(worker_mem), 1) / 1024
+
+    private = [(m.get('Private_Clean', 0) + m.get('Private_Dirty', 0)) / 1024 for m in worker_mem]
+    total_pss = (sum(m.get('Pss', 0) for m in worker_mem) + master_mem.get('Pss', 0)) / 1024
+    return {
+        'workers': len(worker_mem),
+        'ready_seconds': ready,
+        'worker_rss_mb': avg('Rss'),
+        'worker_pss_mb': avg('Pss'),
+        'worker_private_mb': sum(private) / max(len(private), 1),
+        'total_pss_mb': total_pss,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--runs', type=int, default=3, help="Best of N for the import measurement")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--gunicorn-args', nargs=argparse.REMAINDER, default=[],
+                        help="Extra arguments passed to gunicorn (e.g. --preload)")
+    args = parser.parse_args(argv)
+
+    imp = measure_import(args.runs)
+    print(f"import app: {imp['seconds'] * 1000:.0f}ms, RSS {imp['rss'] / 1024:.1f}MB, "
+          f"PSS {imp['pss'] / 1024:.1f}MB, heavy modules: {', '.join(imp['modules']) or 'none'}")
+
+    print(f"{'workers':>7} | {'ready':>7} | {'RSS/worker':>10} | {'PSS/worker':>10} | "
+          f"{'private/worker':>14} | {'total PSS':>9}")
+    for workers in args.workers:
+        g = measure_gunicorn(workers, args.port, args.gunicorn_args)
+        print(f"{g['workers']:>7} | {g['ready_seconds']:6.2f}s | {g['worker_rss_mb']:8.1f}MB | "
+              f"{g['worker_pss_mb']:8.1f}MB | {g['worker_private_mb']:12.1f}MB | {g['total_pss_mb']:7.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""Latency/throughput suite for the text and audio hot paths.
+
+    python benchmarks/suite.py run [--out benchmarks/results/current.json] [--quick] [--seed 0]
+    python benchmarks/suite.py compare BASELINE CURRENT [--threshold 0.15] [--min-delta-ms 0.05]
+
+``run`` times every stage separately on a seeded synthetic corpus
+(French/English/Darija strings of varied lengths, WAV and WebM clips) with
+the fake recognizer standing in for the speech API, and writes p50/p95/p99
+latency and throughput per case as JSON. ``compare`` flags cases whose p50
+or p95 got slower than the baseline by more than ``--threshold`` and exits
+non-zero if any did.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import warnings
+import wave
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INVOCATION_DIR = os.getcwd()
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # the app resolves its artifacts relative to the repo root
+warnings.filterwarnings('ignore', message="Couldn't find ff", category=RuntimeWarning)
+
+import audio_enhance  # noqa: E402
+from audio_pipeline import decode_audio, PCMBuffer  # noqa: E402
+from bench_audio_enhance import synthetic_clip  # noqa: E402
+from inference import InferenceEngine, ENGINE_PATH  # noqa: E402
+from preprocessing import clean_text  # noqa: E402
+from recognition import FakeRecognizer, RecognitionScheduler, recognize_with_strategies, LANGUAGES  # noqa: E402
+from segmentation import Segmenter  # noqa: E402
+
+DEFAULT_OUT = os.path.join(ROOT, 'benchmarks', 'results', 'current.json')
+
+# --- SYNTHETIC CORPUS ---
+WORDS = {
+    'Français': "bonjour le la les de des et je tu il nous vous est suis très bien merci maison travail "
+                "demain aujourd'hui voiture manger parler avec pour sans toujours".split(),
+    'English': "hello the a of and to is are you we they very good thanks house work tomorrow today car "
+               "eat talk with for without always really".split(),
+    'Darija': "salam labas wach nta nti bghit daba ghda mzyan bzaf chokran dar khdma tomobil kla hder m3a "
+              "bla dima wakha zwin 3afak".split(),
+}
+# (words per text, share of the corpus)
+LENGTHS = [(2, 0.3), (8, 0.4), (30, 0.2), (120, 0.1)]
+NOISE = ['!', '?', ',', '...', ' http://example.com/x', ' www.test.ma', ' :)', '  ']
+
+
+def synthetic_corpus(n, seed=0):
+    rng = random.Random(seed)
+    labels = list(WORDS)
+    sizes, shares = zip(*LENGTHS)
+    corpus = []
+    for _ in range(n):
+        label = rng.choice(labels)
+        words = [rng.choice(WORDS[label]) for _ in range(rng.choices(sizes, weights=shares)[0])]
+        if rng.random() < 0.3:
+            words[rng.randrange(len(words))] += rng.choice(NOISE)
+        text = ' '.join(words)
+        corpus.append(text.capitalize() if rng.random() < 0.5 else text)
+    return corpus
+
+
+def wav_bytes(segment):
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as wav:
+        wav.setnchannels(segment.channels)
+        wav.setsampwidth(segment.sample_width)
+        wav.setframerate(segment.frame_rate)
+        wav.writeframes(segment.raw_data)
+    return buf.getvalue()
+
+
+def webm_bytes(segment):
+    buf = io.BytesIO()
+    segment.export(buf, format='webm', codec='libopus')
+    return buf.getvalue()
+
+
+# --- TIMING ---
+def time_calls(func, inputs, warmup=3, min_seconds=0.0):
+    """Call func on each input in turn, cycling until min_seconds; returns per-call seconds."""
+    for item in inputs[:warmup]:
+        func(item)
+    samples = []
+    clock = time.perf_counter_ns
+    deadline = clock() + min_seconds * 1e9
+    while True:
+        for item in inputs:
+            start = clock()
+            func(item)
+            samples.append((clock() - start) / 1e9)
+        if clock() >= deadline:
+            return samples
+
+
+def summarize(samples, items_per_call=1):
+    ms = np.asarray(samples) * 1000
+    total = float(np.sum(samples))
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'n': len(samples),
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'mean_ms': round(float(ms.mean()), 4),
+        'throughput_per_s': round(len(samples) * items_per_call / total, 1) if total else None,
+    }
+
+
+# --- CASES ---
+def text_cases(engine, n_texts, seed, min_seconds):
+    corpus = synthetic_corpus(n_texts, seed)
+    cleaned = [clean_text(text) for text in corpus]
+    batches = [cleaned[i:i + 100] for i in range(0, len(cleaned), 100)]
+    results = {
+        'text.clean': summarize(time_calls(clean_text, corpus)),
+        'text.vectorize': summarize(time_calls(engine._features, cleaned)),
+        'text.predict': summarize(time_calls(engine.predict, cleaned)),
+        'text.predict_batch_100': summarize(time_calls(engine.predict_proba, batches, warmup=1), 100),
+    }
+
+    # The corpus mixes languages text by text: a code-switched document
+    segmenter = Segmenter(engine)
+    document = ' '.join(corpus)
+    for size in (10_000, 100_000):
+        results[f'text.segment_{size // 1000}k'] = summarize(
+            time_calls(segmenter.segment, [document[:size]], warmup=1, min_seconds=min_seconds))
+
+    # End to end as served by the app, on a cold cache
+    import app
+    def cold_prediction(text):
+        app.current_model().cache.clear()
+        return app.get_prediction(text)
+    results['text.get_prediction'] = summarize(time_calls(cold_prediction, corpus))
+    return results
+
+
+def audio_cases(durations, repeat, seed, min_seconds):
+    results = {}
+    for seconds in durations:
+        clip = synthetic_clip(seconds, seed=seed)
+        tag = f"{seconds:g}s"
+        encoded = {'wav': wav_bytes(clip)}
+        try:
+            encoded['webm'] = webm_bytes(clip)
+        except Exception as e:
+            print(f"⚠️ WebM encoding unavailable, skipping: {e}", file=sys.stderr)
+
+        for fmt, data in encoded.items():
+            def decode(d, name=f'clip.{fmt}'):
+                return decode_audio(d, name)
+            try:
+                decode(data)
+            except Exception as e:
+                print(f"⚠️ Cannot decode {fmt} here, skipping: {e}", file=sys.stderr)
+                continue
+            results[f'audio.decode_{fmt}.{tag}'] = summarize(
+                time_calls(decode, [data] * repeat, warmup=0, min_seconds=min_seconds))
+
+        raw = clip.raw_data
+        rate = clip.frame_rate
+        samples = audio_enhance.to_float(raw, clip.sample_width, clip.channels)
+        mono = audio_enhance.downmix(samples)
+        normalized, _ = audio_enhance.gain_and_normalize(mono.copy())
+        resampled = audio_enhance.resample(normalized, rate)
+        trimmed = audio_enhance.strip_silence(resampled, audio_enhance.TARGET_SAMPLE_RATE)
+        filtered = audio_enhance.high_pass(trimmed, audio_enhance.TARGET_SAMPLE_RATE)
+
+        stages = [
+            ('to_float', lambda _: audio_enhance.to_float(raw, clip.sample_width, clip.channels)),
+            ('downmix', lambda _: audio_enhance.downmix(samples)),
+            ('gain_normalize', lambda _: audio_enhance.gain_and_normalize(mono.copy())),
+            ('resample', lambda _: audio_enhance.resample(normalized, rate)),
+            ('strip_silence', lambda _: audio_enhance.strip_silence(resampled, audio_enhance.TARGET_SAMPLE_RATE)),
+            ('high_pass', lambda _: audio_enhance.high_pass(trimmed, audio_enhance.TARGET_SAMPLE_RATE)),
+            ('to_int16', lambda _: audio_enhance.to_int16(filtered)),
+            ('enhance', lambda _: audio_enhance.enhance(samples.copy(), rate)),
+        ]
+        for name, func in stages:
+            results[f'audio.{name}.{tag}'] = summarize(
+                time_calls(func, [None] * repeat, warmup=1, min_seconds=min_seconds))
+
+        # Recognition fan-out with an instant stub, i.e. scheduling overhead only
+        pcm = PCMBuffer(audio_enhance.to_int16(filtered).tobytes())
+        recognizer = FakeRecognizer(latency=0.0)
+
+        def recognize(_):
+            scheduler = RecognitionScheduler(recognizer, LANGUAGES, lambda text: ('Français', 99.0))
+            return recognize_with_strategies(scheduler, pcm)
+        results[f'audio.recognize_stub.{tag}'] = summarize(
+            time_calls(recognize, [None] * repeat, warmup=1, min_seconds=min_seconds))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- COMMANDS ---
+def run_main(args):
+    # Audio cases run at least `repeat` calls and at least min_seconds each
+    n_texts, durations, repeat, min_seconds = (1000, [3], 10, 0.5) if args.quick else (5000, [3, 15], 20, 2.0)
+    engine = InferenceEngine.load(ENGINE_PATH)
+
+    started = time.time()
+    results = {}
+    # The app and the recognizer log every call; keep that out of the timings
+    # and the report. The telemetry handler holds the original sys.stdout, so
+    # its loggers are silenced rather than redirected.
+    loggers = logging.getLogger('langpredict')
+    level = loggers.level
+    loggers.setLevel(logging.CRITICAL)
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            results.update(text_cases(engine, n_texts, args.seed, min_seconds))
+            results.update(audio_cases(durations, repeat, args.seed, min_seconds))
+    finally:
+        loggers.setLevel(level)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'seed': args.seed,
+            'quick': args.quick,
+        },
+        'results': results,
+    }
+    out = os.path.join(INVOCATION_DIR, args.out)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'case':<32} | {'p50':>9} | {'p95':>9} | {'p99':>9} | {'throughput':>12}")
+    for name, r in results.items():
+        print(f"{name:<32} | {r['p50_ms']:7.3f}ms | {r['p95_ms']:7.3f}ms | {r['p99_ms']:7.3f}ms | "
+              f"{r['throughput_per_s']:>10,.0f}/s")
+    print(f"✅ Results written to {out}")
+    return 0
+
+
+def compare_main(args):
+    with open(os.path.join(INVOCATION_DIR, args.baseline), encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(os.path.join(INVOCATION_DIR, args.current), encoding='utf-8') as f:
+        current = json.load(f)
+    base, cur = baseline['results'], current['results']
+
+    print(f"baseline {baseline['meta'].get('commit')} vs current {current['meta'].get('commit')}, "
+          f"threshold +{args.threshold:.0%}")
+    print(f"{'case':<32} | {'p50 base':>9} | {'p50 now':>9} | {'Δp50':>7} | {'Δp95':>7} |")
+    regressions = []
+    for name in sorted(set(base) | set(cur)):
+        if name not in cur or name not in base:
+            print(f"{name:<32} | {'only in ' + ('baseline' if name in base else 'current'):>39} |")
+            continue
+        d50 = cur[name]['p50_ms'] / base[name]['p50_ms'] - 1 if base[name]['p50_ms'] else 0.0
+        d95 = cur[name]['p95_ms'] / base[name]['p95_ms'] - 1 if base[name]['p95_ms'] else 0.0
+        flag = ''
+        # Differences below the timer/scheduler noise floor are never regressions
+        slower = [(d, cur[name][key] - base[name][key]) for d, key in ((d50, 'p50_ms'), (d95, 'p95_ms'))]
+        if any(d > args.threshold and delta_ms > args.min_delta_ms for d, delta_ms in slower):
+            regressions.append(name)
+            flag = ' ❌ regression'
+        elif d50 < -args.threshold and base[name]['p50_ms'] - cur[name]['p50_ms'] > args.min_delta_ms:
+            flag = ' ✅ faster'
+        print(f"{name:<32} | {base[name]['p50_ms']:7.3f}ms | {cur[name]['p50_ms']:7.3f}ms | "
+              f"{d50:+6.0%} | {d95:+6.0%} |{flag}")
+
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    print("✅ No regressions")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help="Run the suite and save the results as JSON")
+    run.add_argument('--out', default=DEFAULT_OUT)
+    run.add_argument('--quick', action='store_true', help="Smaller corpus and fewer clips")
+    run.add_argument('--seed', type=int, default=0)
+    run.set_defaults(func=run_main)
+
+    compare = sub.add_parser('compare', help="Flag regressions of CURRENT against BASELINE")
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.15,
+                         help="Allowed relative slowdown of p50/p95 (default 0.15)")
+    compare.add_argument('--min-delta-ms', type=float, default=0.05,
+                         help="Ignore slowdowns smaller than this many milliseconds (default 0.05)")
+    compare.set_defaults(func=compare_main)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
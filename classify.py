@@ -0,0 +1,225 @@
+"""Bulk language classification of CSV / JSONL files.
+
+    python classify.py INPUT OUTPUT [--text-column text] [--workers N] [--chunk-size 2000]
+
+The input is read in chunks, so memory stays bounded whatever its size.
+Chunks are classified by a pool of worker processes, each loading the engine
+once (memory-mapped, see inference.py), and written to OUTPUT in input order
+with ``prediction`` and ``confidence`` columns added. The format of each file
+follows its extension (.csv, .jsonl / .ndjson).
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from inference import InferenceEngine, ArtifactError, ENGINE_PATH
+from preprocessing import clean_text
+
+# --- CONFIGURATION ---
+DEFAULT_CHUNK_SIZE = 2000
+# Chunks in flight per worker; bounds memory while keeping every worker busy
+CHUNKS_PER_WORKER = 2
+PROGRESS_INTERVAL = 1.0
+
+
+# --- WORKER ---
+_engine = None
+
+
+def _init_worker(engine_path):
+    global _engine
+    _engine = InferenceEngine.load(engine_path)
+
+
+def classify_texts(texts):
+    """clean_text + engine on one chunk; returns (predictions, confidences).
+
+    Texts that are empty after cleaning get no prediction.
+    """
+    cleaned = [clean_text(text) for text in texts]
+    unique = [text for text in dict.fromkeys(cleaned) if text]
+    labels = {}
+    if unique:
+        probs = _engine.predict_proba(unique)
+        best = probs.argmax(axis=1)
+        for text, index, row in zip(unique, best, probs):
+            labels[text] = (_engine.classes[int(index)], round(float(row[index]) * 100, 2))
+    predictions, confidences = [], []
+    for text in cleaned:
+        label, conf = labels.get(text, ('', ''))
+        predictions.append(label)
+        confidences.append(conf)
+    return predictions, confidences
+
+
+# --- POOL ---
+def map_ordered(func, tasks, workers, initializer, initargs=()):
+    """func(*task) for every task on a process pool, results in task order.
+
+    Tasks are submitted ahead by a bounded window (CHUNKS_PER_WORKER per
+    worker), so only a few chunks are in memory at once. With one worker
+    everything runs in this process.
+    """
+    if workers == 1:
+        initializer(*initargs)
+        for task in tasks:
+            yield func(*task)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(func, *task))
+            if len(pending) >= workers * CHUNKS_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# --- INPUT / OUTPUT ---
+def file_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise ValueError(f"Unsupported file type {ext!r} for {path} (expected .csv or .jsonl)")
+
+
+def read_rows(f, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(f)
+    else:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+RESULT_COLUMNS = ('prediction', 'confidence')
+
+
+class RowWriter:
+    """Writes result rows as JSON lines or CSV.
+
+    The CSV header is the input columns (all those seen in the first chunk,
+    for JSONL rows whose keys vary) followed by RESULT_COLUMNS; missing
+    values are left empty and keys first seen later are dropped.
+    """
+
+    def __init__(self, f, fmt):
+        self.f = f
+        self.fmt = fmt
+        self._csv = None
+
+    def write(self, rows):
+        if self.fmt == 'jsonl':
+            self.f.writelines(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+            return
+        if self._csv is None:
+            columns = [key for key in dict.fromkeys(key for row in rows for key in row) if key not in RESULT_COLUMNS]
+            self._csv = csv.DictWriter(self.f, fieldnames=columns + list(RESULT_COLUMNS), restval='',
+                                       extrasaction='ignore')
+            self._csv.writeheader()
+        self._csv.writerows(rows)
+
+
+# --- DRIVER ---
+def classify_file(input_path, output_path, text_column='text', workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                  engine_path=ENGINE_PATH, progress=None):
+    """Classify every row of input_path into output_path; returns (rows, seconds)."""
+    in_fmt, out_fmt = file_format(input_path), file_format(output_path)
+    workers = workers or os.cpu_count() or 1
+    # A missing or corrupt artifact raises ArtifactError here, before the
+    # output is truncated; inside the pool it would only surface as a
+    # BrokenProcessPool
+    InferenceEngine.load(engine_path)
+    started = time.monotonic()
+    done = 0
+    last_report = started
+
+    def report(final=False):
+        nonlocal last_report
+        now = time.monotonic()
+        if progress and (final or now - last_report >= PROGRESS_INTERVAL):
+            last_report = now
+            progress(done, now - started)
+
+    def finish(chunk, result):
+        nonlocal done
+        predictions, confidences = result
+        for row, label, conf in zip(chunk, predictions, confidences):
+            row['prediction'] = label
+            row['confidence'] = conf
+        writer.write(chunk)
+        done += len(chunk)
+        report()
+
+    with open(input_path, encoding='utf-8', newline='') as fin, \
+            open(output_path, 'w', encoding='utf-8', newline='') as fout:
+        writer = RowWriter(fout, out_fmt)
+        chunks = read_chunks(read_rows(fin, in_fmt), chunk_size)
+
+        def texts_of(chunk):
+            try:
+                return [row[text_column] for row in chunk]
+            except KeyError:
+                raise ValueError(f"Column {text_column!r} not found in {input_path}") from None
+
+        # Chunks wait here until their result comes back, in the same order
+        in_flight = deque()
+
+        def tasks():
+            for chunk in chunks:
+                in_flight.append(chunk)
+                yield (texts_of(chunk),)
+
+        for result in map_ordered(classify_texts, tasks(), workers, _init_worker, (engine_path,)):
+            finish(in_flight.popleft(), result)
+
+    report(final=True)
+    return done, time.monotonic() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--text-column', default='text')
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--engine', default=ENGINE_PATH, help="Exported engine directory")
+    args = parser.parse_args(argv)
+
+    def progress(rows, seconds):
+        rate = rows / seconds if seconds else 0.0
+        print(f"\r{rows:,} rows, {rate:,.0f} rows/s", end='', file=sys.stderr, flush=True)
+
+    try:
+        rows, seconds = classify_file(args.input, args.output, text_column=args.text_column, workers=args.workers,
+                                      chunk_size=args.chunk_size, engine_path=args.engine, progress=progress)
+    except (ArtifactError, ValueError, OSError) as e:
+        # Missing engine or input, unsupported extension, missing text column, bad JSON
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    print(file=sys.stderr)
+    print(f"✅ {rows:,} rows classified in {seconds:.1f}s ({rows / seconds if seconds else 0:,.0f} rows/s) "
+          f"-> {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import os
+import time
+import uuid
+import wave
+
+from disk_lru import LRUDirectory
+
+
+class DebugSpool:
+    """Opt-in, size-capped directory of processed audio kept for debugging.
+
+    Files get unique names and the oldest ones are evicted once the spool
+    exceeds ``max_bytes`` or ``max_files``.
+    """
+
+    PREFIX = 'debug_audio_'
+
+    def __init__(self, directory, max_bytes=50 * 1024 * 1024, max_files=100):
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self.max_files = int(max_files)
+        self._files = LRUDirectory(directory, self.max_bytes, max_files=self.max_files,
+                                   prefix=self.PREFIX, suffix='.wav')
+
+    def save_wav(self, pcm, sample_rate, sample_width, channels=1):
+        name = f"{self.PREFIX}{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:12]}.wav"
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp"
+        with wave.open(tmp_path, 'wb') as wav:
+            wav.setnchannels(channels)
+            wav.setsampwidth(sample_width)
+            wav.setframerate(sample_rate)
+            wav.writeframes(pcm)
+        os.replace(tmp_path, path)
+        self._files.added(os.path.getsize(path))
+        return path
+
+
+def spool_from_env():
+    # AUDIO_DEBUG_SPOOL=1 keeps processed audio of failed uploads
+    if os.environ.get('AUDIO_DEBUG_SPOOL', '0').lower() not in ('1', 'true', 'yes'):
+        return None
+    return DebugSpool(
+        os.environ.get('AUDIO_DEBUG_DIR', 'data/debug_audio'),
+        max_bytes=int(os.environ.get('AUDIO_DEBUG_MAX_BYTES', 50 * 1024 * 1024)),
+        max_files=int(os.environ.get('AUDIO_DEBUG_MAX_FILES', 100))
+    )
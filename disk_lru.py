@@ -0,0 +1,79 @@
+import os
+import threading
+
+
+class LRUDirectory:
+    """Size-capped directory of files, evicted least recently modified first.
+
+    Only files named ``prefix...suffix`` are managed. Callers report each file
+    they write with ``added()``; the directory is scanned (and the oldest
+    files removed) every ``scan_every`` additions, or as soon as the bytes or
+    files added since the last scan could take it over ``max_bytes`` or
+    ``max_files``. Other processes writing to the same directory are caught
+    up with at the next scan.
+    """
+
+    def __init__(self, directory, max_bytes, max_files=None, prefix='', suffix='', scan_every=64):
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self.max_files = max_files
+        self.prefix = prefix
+        self.suffix = suffix
+        self.scan_every = max(1, int(scan_every))
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # Running totals: as of the last scan, plus what this process added since
+        self._bytes = 0
+        self._files = 0
+        self._added = self.scan_every  # scan on the first addition
+
+    def entries(self):
+        """(mtime, path, size) of the managed files, oldest first."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.startswith(self.prefix) and entry.name.endswith(self.suffix):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, entry.path, st.st_size))
+        entries.sort()
+        return entries
+
+    def _over(self, total, files):
+        return total > self.max_bytes or (self.max_files is not None and files > self.max_files)
+
+    def added(self, size):
+        """Record a newly written file of ``size`` bytes; returns the number of files evicted."""
+        with self._lock:
+            self._bytes += size
+            self._files += 1
+            self._added += 1
+            due = self._added >= self.scan_every or self._over(self._bytes, self._files)
+        return self.evict() if due else 0
+
+    def evict(self):
+        """Scan the directory and remove the oldest files beyond the caps; returns how many."""
+        # One scan at a time per process; a concurrent caller skips it
+        if not self._scan_lock.acquire(blocking=False):
+            return 0
+        try:
+            entries = self.entries()
+            total = sum(size for _, _, size in entries)
+            removed = 0
+            while entries and self._over(total, len(entries)):
+                _, path, size = entries.pop(0)
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass  # another worker got there first
+                total -= size
+            with self._lock:
+                self._bytes, self._files, self._added = total, len(entries), 0
+            return removed
+        finally:
+            self._scan_lock.release()
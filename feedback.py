@@ -0,0 +1,185 @@
+"""Corrected labels from /api/feedback and the updater that learns from them.
+
+    python feedback.py apply [--engine data/processed/language_engine]
+
+Feedback is appended to a JSON lines log shared by every worker. The updater
+folds new entries into the NB counts of the current engine
+(InferenceEngine.updated) and publishes the result as a new version, which
+workers pick up on their next request. Each version records in its manifest
+how far into the log it has read (``feedback_offset``), so nothing is
+applied twice; a freshly exported engine starts again from the beginning of
+the log.
+"""
+import argparse
+import fcntl
+import json
+import os
+import sys
+import threading
+import time
+
+import telemetry
+from inference import InferenceEngine, ENGINE_PATH, VersionConflict, publish
+from preprocessing import clean_text
+
+log = telemetry.get_logger('feedback')
+
+# --- CONFIGURATION ---
+FEEDBACK_PATH = os.environ.get('FEEDBACK_PATH', 'data/feedback/feedback.jsonl')
+# When set, /api/feedback only accepts requests carrying it as X-Feedback-Token
+FEEDBACK_TOKEN = os.environ.get('FEEDBACK_TOKEN')
+# The web app folds feedback into the served model every
+# FEEDBACK_UPDATE_INTERVAL seconds only if FEEDBACK_UPDATES=1, or if it is
+# unset and FEEDBACK_TOKEN is configured: without a token anyone could
+# retrain the public model. Otherwise feedback is only collected (apply it
+# with the CLI).
+FEEDBACK_UPDATES = os.environ.get('FEEDBACK_UPDATES', '1' if FEEDBACK_TOKEN else '0').lower() in ('1', 'true', 'yes')
+FEEDBACK_UPDATE_INTERVAL = float(os.environ.get('FEEDBACK_UPDATE_INTERVAL', 30))
+# Entries folded into one new version at most
+FEEDBACK_MAX_BATCH = int(os.environ.get('FEEDBACK_MAX_BATCH', 10000))
+# The log is never rotated (versions record offsets into it): once it holds
+# FEEDBACK_MAX_BYTES, new feedback is refused until it is archived by hand
+FEEDBACK_MAX_BYTES = int(os.environ.get('FEEDBACK_MAX_BYTES', 50 * 1024 * 1024))
+
+
+class FeedbackLogFull(Exception):
+    """The feedback log reached its size cap."""
+
+
+class FeedbackLog:
+    """Append-only JSON lines file of corrected labels."""
+
+    def __init__(self, path=FEEDBACK_PATH, max_bytes=FEEDBACK_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def append(self, text, label, **fields):
+        """Append one entry; raises FeedbackLogFull once the log holds max_bytes."""
+        line = json.dumps(dict(fields, text=text, label=label, ts=round(time.time(), 3)), ensure_ascii=False)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # one whole line per writer
+            if os.fstat(f.fileno()).st_size >= self.max_bytes:
+                raise FeedbackLogFull(f"{self.path} holds {self.max_bytes} bytes")
+            f.write(line + '\n')
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def read_from(self, offset, limit=FEEDBACK_MAX_BATCH):
+        """Complete entries after byte ``offset``, and the offset just past them."""
+        entries = []
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return entries, offset
+        with f:
+            f.seek(offset)
+            while len(entries) < limit:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break  # end of file, or a line still being written
+                offset += len(line)
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    log.warning('feedback_line_skipped', offset=offset - len(line))
+        return entries, offset
+
+
+def apply_feedback(feedback, engine_path=ENGINE_PATH):
+    """Publish a new engine version with the feedback not yet applied; returns it, or None."""
+    engine = InferenceEngine.load(engine_path)
+    offset = engine.metadata.get('feedback_offset', 0)
+    if feedback.size() < offset:
+        log.warning('feedback_log_truncated', offset=offset, size=feedback.size())
+        offset = 0
+    entries, new_offset = feedback.read_from(offset)
+    if new_offset == offset:
+        return None
+
+    texts, labels = [], []
+    for entry in entries:
+        text = clean_text(entry.get('text'))
+        if text and entry.get('label') in engine.classes:
+            texts.append(text)
+            labels.append(entry['label'])
+    metadata = dict(engine.metadata, feedback_offset=new_offset, parent_version=engine.version,
+                    feedback_applied=engine.metadata.get('feedback_applied', 0) + len(texts))
+    updated = engine.updated(texts, labels, metadata=metadata)
+    version = publish(updated, engine_path, parent=engine.version)
+    log.info('model_updated', version=version, parent_version=engine.version, applied=len(texts),
+             skipped=len(entries) - len(texts))
+    return version
+
+
+class FeedbackUpdater:
+    """Background thread running apply_feedback() every ``interval`` seconds.
+
+    Every worker process starts one on its first request (after a preloading
+    gunicorn master has forked); a lock file lets one of them update at a
+    time.
+    """
+
+    def __init__(self, feedback, engine_path=ENGINE_PATH, interval=FEEDBACK_UPDATE_INTERVAL):
+        self.feedback = feedback
+        self.engine_path = engine_path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='feedback-updater', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.run_once()
+
+    def run_once(self):
+        with open(f"{self.feedback.path}.lock", 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None  # another worker is updating
+            try:
+                version = apply_feedback(self.feedback, self.engine_path)
+            except VersionConflict as e:
+                log.info('model_update_deferred', reason=str(e))  # retried on the next run
+                return None
+            except Exception as e:
+                telemetry.MODEL_UPDATES.labels('failed').inc()
+                log.error('model_update_failed', error=f'{type(e).__name__}: {e}', exc_info=True)
+                return None
+            if version is not None:
+                telemetry.MODEL_UPDATES.labels('published').inc()
+            return version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fold collected feedback into the published model.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    apply = sub.add_parser('apply', help="Publish a new engine version with the pending feedback")
+    apply.add_argument('--engine', default=ENGINE_PATH)
+    apply.add_argument('--feedback', default=FEEDBACK_PATH)
+    args = parser.parse_args(argv)
+
+    version = FeedbackUpdater(FeedbackLog(args.feedback), args.engine).run_once()
+    if version is None:
+        print("No pending feedback (or another updater is running).")
+    else:
+        print(f"✅ Published version {version} to {args.engine}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+# Picked up automatically by `gunicorn app:app` when run from the repo root.
+import gc
+import os
+import shutil
+import tempfile
+
+# Import the app (and memory-map the engine) once in the master; workers are
+# forked from it and share those pages instead of loading their own copy.
+# GUNICORN_PRELOAD=0 goes back to per-worker imports.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1').lower() in ('1', 'true', 'yes')
+
+# Threaded workers: a long-poll or live stream holds one thread, not the whole
+# worker, and the app keeps at least one thread per worker for everything else
+# (see LONG-HELD REQUESTS in app.py). GUNICORN_THREADS=1 gives sync workers,
+# which never hold a request open.
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Workers write their metrics to files here so /metrics can sum them. Must be
+# set before prometheus_client is imported, i.e. before the app is loaded. The
+# default directory is emptied here, before the app writes anything, and
+# removed on exit; an explicitly configured one should be emptied between runs.
+_DEFAULT_METRICS_DIR = os.path.join(tempfile.gettempdir(), f'langpredict-metrics-{os.getuid()}')
+if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    shutil.rmtree(_DEFAULT_METRICS_DIR, ignore_errors=True)
+    os.makedirs(_DEFAULT_METRICS_DIR)
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = _DEFAULT_METRICS_DIR
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before the first fork
+    if os.environ.get('PRELOAD_AUDIO_LIBS', '0').lower() in ('1', 'true', 'yes'):
+        from audio_pipeline import warm_audio_imports
+        warm_audio_imports()
+        server.log.info("Audio libraries preloaded")
+    # Keep the garbage collector from touching (and so copying) inherited objects
+    gc.freeze()
+
+
+def on_exit(server):
+    if os.environ['PROMETHEUS_MULTIPROC_DIR'] == _DEFAULT_METRICS_DIR:
+        shutil.rmtree(_DEFAULT_METRICS_DIR, ignore_errors=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    # Tell the app how many requests this worker serves at once; a worker
+    # class given on the command line wins over the settings above
+    kind = worker.cfg.worker_class_str
+    if kind == 'gthread':
+        concurrency = worker.cfg.threads
+    elif kind in ('gevent', 'eventlet'):
+        concurrency = worker.cfg.worker_connections
+    else:
+        concurrency = 1
+    os.environ['WEB_WORKER_THREADS'] = str(concurrency)
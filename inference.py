@@ -0,0 +1,651 @@
+import argparse
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+
+log = logging.getLogger('langpredict.inference')
+
+# Same whitespace collapsing as sklearn's char analyzer
+WHITE_SPACES = re.compile(r"\s\s+")
+
+# The vectorised paths (train.py, segmentation.py) handle n-grams as integer
+# keys: one code point (21 bits) per character, so up to MAX_NGRAM characters
+# fit in an int64
+CODE_POINT_BITS = 21
+MAX_NGRAM = 3
+
+# Directory of .npy arrays plus a manifest; workers memory-map it read-only
+ENGINE_PATH = 'data/processed/language_engine'
+ARTIFACT_FORMAT = 'langpredict-engine/1'
+MANIFEST_NAME = 'manifest.json'
+ARRAY_NAMES = ('terms', 'idf', 'feature_log_prob', 'class_log_prior', 'classes')
+# Raw NB counts, needed to update the model online (see InferenceEngine.updated)
+COUNT_ARRAY_NAMES = ('feature_count', 'class_count')
+# Published versions live next to ENGINE_PATH, which is a symlink to the
+# current one; the newest ENGINE_KEEP_VERSIONS are kept
+ENGINE_KEEP_VERSIONS = int(os.environ.get('ENGINE_KEEP_VERSIONS', 5))
+
+# Strings used to check the exported engine against the sklearn pipeline
+PARITY_SAMPLES = [
+    "",
+    "bonjour comment allez vous",
+    "hello how are you doing today",
+    "salam labas 3lik chno kat dir",
+    "leadership hya parfait",
+    "je suis   très   content",
+    "ok",
+    "this is a much longer sentence written in english to cover more trigrams",
+    "wach nta mzyan ghda ghadi nmchi l dar",
+    "c'est la vie, mon ami!",
+]
+
+
+class ArtifactError(Exception):
+    """A model artifact is missing, incomplete or corrupt."""
+
+
+class VersionConflict(Exception):
+    """publish() was given a parent version that is no longer the current one."""
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# --- N-GRAM KEYS ---
+def to_code_points(s):
+    return np.frombuffer(s.encode('utf-32-le'), dtype='<u4')
+
+
+def ngram_key(term):
+    key = 0
+    for ch in term:
+        key = (key << CODE_POINT_BITS) | ord(ch)
+    return key
+
+
+def decode_ngram_key(key):
+    chars = []
+    while key:
+        chars.append(chr(key & ((1 << CODE_POINT_BITS) - 1)))
+        key >>= CODE_POINT_BITS
+    return ''.join(reversed(chars))
+
+
+def ngram_key_array(code_points, n):
+    """Key of the n-gram starting at each position of code_points.
+
+    Code point 0 never survives clean_text(), so keys of different lengths
+    cannot collide.
+    """
+    count = len(code_points) - n + 1
+    if count <= 0:
+        return np.zeros(0, dtype=np.int64)
+    code_points = code_points.astype(np.int64, copy=False)
+    keys = code_points[:count].copy()
+    for j in range(1, n):
+        keys = (keys << CODE_POINT_BITS) | code_points[j:j + count]
+    return keys
+
+
+def lookup_keys(sorted_keys, keys):
+    """(position in sorted_keys, found) of each key; sorted_keys must not be empty."""
+    pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return pos, sorted_keys[pos] == keys
+
+
+# --- TF-IDF / NB MATH ---
+def l2_tfidf(rows, indices, tf, idf, n_rows):
+    """l2-normalised TF-IDF weights of sparse term counts (empty rows stay zero vectors)."""
+    weights = np.asarray(tf, dtype=np.float64) * idf[indices]
+    norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=n_rows))
+    return weights / norms[rows]
+
+
+def joint_log_likelihood(rows, indices, weights, feature_log_prob, class_log_prior, n_rows):
+    """MultinomialNB joint log-likelihood (n_rows, n_classes) of sparse TF-IDF rows."""
+    jll = np.tile(class_log_prior, (n_rows, 1))
+    if not len(indices):
+        return jll
+    contributions = weights[:, None] * feature_log_prob[indices]
+    for k in range(jll.shape[1]):
+        jll[:, k] += np.bincount(rows, weights=contributions[:, k], minlength=n_rows)
+    return jll
+
+
+def nb_log_probs(feature_count, class_count, alpha, fit_prior=True):
+    """(feature_log_prob, class_log_prior) of MultinomialNB fitted to these counts."""
+    smoothed = feature_count + alpha
+    feature_log_prob = np.log(smoothed) - np.log(smoothed.sum(axis=0))
+    if fit_prior:
+        class_log_prior = np.log(class_count) - np.log(class_count.sum())
+    else:
+        class_log_prior = np.full(len(class_count), -np.log(len(class_count)))
+    return feature_log_prob, class_log_prior
+
+
+class InferenceEngine:
+    """TF-IDF (char n-grams) + MultinomialNB inference in a single NumPy pass."""
+
+    def __init__(self, vocabulary, idf, feature_log_prob, class_log_prior, classes,
+                 ngram_range=(1, 3), lowercase=True, feature_count=None, class_count=None,
+                 alpha=None, fit_prior=True, version=0, metadata=None):
+        self.vocabulary = vocabulary
+        self.idf = np.asarray(idf, dtype=np.float64)
+        # Stored as (n_features, n_classes) so one row per n-gram can be gathered
+        self.feature_log_prob = np.asarray(feature_log_prob, dtype=np.float64)
+        self.class_log_prior = np.asarray(class_log_prior, dtype=np.float64)
+        self.classes = [str(c) for c in classes]
+        self.ngram_range = (int(ngram_range[0]), int(ngram_range[1]))
+        self.lowercase = bool(lowercase)
+        # Optional NB counts, (n_features, n_classes) and (n_classes,)
+        self.feature_count = None if feature_count is None else np.asarray(feature_count, dtype=np.float64)
+        self.class_count = None if class_count is None else np.asarray(class_count, dtype=np.float64)
+        self.alpha = None if alpha is None else float(alpha)
+        self.fit_prior = bool(fit_prior)
+        # Published version number (0: never published) and free-form manifest metadata
+        self.version = int(version)
+        self.metadata = dict(metadata or {})
+
+    @property
+    def updatable(self):
+        return self.feature_count is not None and self.class_count is not None and self.alpha is not None
+
+    # --- CONSTRUCTION ---
+    @classmethod
+    def from_sklearn(cls, vectorizer, model):
+        if vectorizer.analyzer != 'char':
+            raise ValueError(f"Unsupported analyzer {vectorizer.analyzer!r} (expected 'char')")
+        if vectorizer.norm != 'l2' or not vectorizer.use_idf or vectorizer.sublinear_tf:
+            raise ValueError("Only l2-normalised, idf-weighted, linear-tf vectorizers are supported")
+        if vectorizer.strip_accents is not None or vectorizer.preprocessor is not None:
+            raise ValueError("Custom preprocessing is not supported")
+
+        n_features = len(vectorizer.vocabulary_)
+        terms = [None] * n_features
+        for term, index in vectorizer.vocabulary_.items():
+            terms[index] = term
+
+        # Counts are only kept when the model can be updated from them
+        # exactly: a scalar alpha and priors fitted from the class counts
+        counts = {}
+        if np.ndim(model.alpha) == 0 and model.class_prior is None:
+            counts = dict(feature_count=model.feature_count_.T, class_count=model.class_count_,
+                          alpha=model.alpha, fit_prior=model.fit_prior)
+
+        return cls(
+            vocabulary={term: i for i, term in enumerate(terms)},
+            idf=vectorizer.idf_,
+            feature_log_prob=model.feature_log_prob_.T,
+            class_log_prior=model.class_log_prior_,
+            classes=model.classes_,
+            ngram_range=vectorizer.ngram_range,
+            lowercase=vectorizer.lowercase,
+            **counts,
+        )
+
+    @classmethod
+    def from_pickles(cls, vectorizer_path, model_path):
+        # Fallback when no exported artifact exists; imports scikit-learn
+        import joblib
+
+        for path in (vectorizer_path, model_path):
+            if not os.path.isfile(path):
+                raise ArtifactError(f"Missing model artifact {path}")
+        try:
+            vectorizer = joblib.load(vectorizer_path)
+            model = joblib.load(model_path)
+            return cls.from_sklearn(vectorizer, model)
+        except Exception as e:
+            raise ArtifactError(f"Cannot load {vectorizer_path} / {model_path}: {e}") from e
+
+    @classmethod
+    def load(cls, path=ENGINE_PATH, verify=True):
+        """Open an exported artifact directory, memory-mapping its arrays read-only.
+
+        Every process that loads the same directory shares one copy of the
+        arrays through the page cache. Raises ArtifactError if the directory
+        is missing, incomplete or does not match its manifest.
+        """
+        manifest_path = os.path.join(path, MANIFEST_NAME)
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            raise ArtifactError(f"Missing engine artifact {manifest_path} (run: python inference.py export)")
+        except ValueError as e:
+            raise ArtifactError(f"Corrupt engine manifest {manifest_path}: {e}") from e
+        if manifest.get('format') != ARTIFACT_FORMAT:
+            raise ArtifactError(f"Unsupported engine artifact format {manifest.get('format')!r} in {path}")
+        missing = [key for key in ('arrays', 'ngram_range', 'lowercase') if key not in manifest]
+        if missing:
+            raise ArtifactError(f"Engine manifest {manifest_path} lacks {', '.join(missing)}")
+
+        arrays = {}
+        for name in ARRAY_NAMES + COUNT_ARRAY_NAMES:
+            spec = manifest['arrays'].get(name)
+            file_path = os.path.join(path, f"{name}.npy")
+            if spec is None:
+                if name in COUNT_ARRAY_NAMES:
+                    continue  # exported without counts: served, but not updatable
+                raise ArtifactError(f"Engine manifest {manifest_path} does not list {name!r}")
+            try:
+                if verify and _sha256(file_path) != spec['sha256']:
+                    raise ArtifactError(f"Checksum mismatch for {file_path}")
+                array = np.load(file_path, mmap_mode='r', allow_pickle=False)
+            except FileNotFoundError:
+                raise ArtifactError(f"Missing engine array {file_path}")
+            except ValueError as e:
+                raise ArtifactError(f"Corrupt engine array {file_path}: {e}") from e
+            if array.dtype.str != spec['dtype'] or list(array.shape) != spec['shape']:
+                raise ArtifactError(f"Engine array {file_path} is {array.dtype.str}{list(array.shape)}, "
+                                    f"expected {spec['dtype']}{spec['shape']}")
+            arrays[name] = array
+
+        terms = arrays['terms']
+        return cls(
+            vocabulary={str(term): i for i, term in enumerate(terms)},
+            idf=arrays['idf'],
+            feature_log_prob=arrays['feature_log_prob'],
+            class_log_prior=arrays['class_log_prior'],
+            classes=arrays['classes'],
+            ngram_range=tuple(manifest['ngram_range']),
+            lowercase=manifest['lowercase'],
+            feature_count=arrays.get('feature_count'),
+            class_count=arrays.get('class_count'),
+            alpha=manifest.get('alpha'),
+            fit_prior=manifest.get('fit_prior', True),
+            version=manifest.get('version', 0),
+            metadata=manifest.get('metadata'),
+        )
+
+    def save(self, path=ENGINE_PATH):
+        terms = [None] * len(self.vocabulary)
+        for term, index in self.vocabulary.items():
+            terms[index] = term
+        arrays = {
+            'terms': np.array(terms, dtype=str),
+            'idf': np.ascontiguousarray(self.idf),
+            'feature_log_prob': np.ascontiguousarray(self.feature_log_prob),
+            'class_log_prior': np.ascontiguousarray(self.class_log_prior),
+            'classes': np.array(self.classes, dtype=str),
+        }
+        if self.updatable:
+            arrays['feature_count'] = np.ascontiguousarray(self.feature_count)
+            arrays['class_count'] = np.ascontiguousarray(self.class_count)
+
+        # Build the whole directory next to the target, then swap it in
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        manifest = {
+            'format': ARTIFACT_FORMAT,
+            'version': self.version,
+            'ngram_range': list(self.ngram_range),
+            'lowercase': self.lowercase,
+            'alpha': self.alpha,
+            'fit_prior': self.fit_prior,
+            'metadata': self.metadata,
+            'arrays': {},
+        }
+        for name, array in arrays.items():
+            file_path = os.path.join(tmp_path, f"{name}.npy")
+            np.save(file_path, array, allow_pickle=False)
+            manifest['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape),
+                                        'sha256': _sha256(file_path)}
+        with open(os.path.join(tmp_path, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+        old_path = f"{path}.old-{os.getpid()}"
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    # --- FEATURE EXTRACTION ---
+    def _ngrams(self, text):
+        if self.lowercase:
+            text = text.lower()
+        text = WHITE_SPACES.sub(" ", text)
+        min_n, max_n = self.ngram_range
+        text_len = len(text)
+        for n in range(min_n, min(max_n, text_len) + 1):
+            for i in range(text_len - n + 1):
+                yield text[i:i + n]
+
+    def _features(self, text):
+        # Raw term counts restricted to the vocabulary
+        counts = {}
+        vocabulary = self.vocabulary
+        for gram in self._ngrams(text):
+            index = vocabulary.get(gram)
+            if index is not None:
+                counts[index] = counts.get(index, 0) + 1
+        return counts
+
+    def _tfidf(self, texts):
+        # Sparse l2-normalised TF-IDF rows as (rows, indices, weights)
+        rows, indices, tf = [], [], []
+        for row, text in enumerate(texts):
+            counts = self._features(text)
+            rows.extend([row] * len(counts))
+            indices.extend(counts.keys())
+            tf.extend(counts.values())
+
+        rows = np.asarray(rows, dtype=np.intp)
+        indices = np.asarray(indices, dtype=np.intp)
+        return rows, indices, l2_tfidf(rows, indices, tf, self.idf, len(texts))
+
+    def _joint_log_likelihood(self, texts):
+        rows, indices, weights = self._tfidf(texts)
+        return joint_log_likelihood(rows, indices, weights, self.feature_log_prob, self.class_log_prior,
+                                    len(texts))
+
+    # --- ONLINE UPDATES ---
+    def updated(self, texts, labels, metadata=None):
+        """A copy of the engine with (texts, labels) added to the NB counts.
+
+        Same result as MultinomialNB.partial_fit on the vectorizer output: the
+        vocabulary and idf stay fixed, only counts and log-probabilities move.
+        The copy is unpublished (version 0) until publish() writes it.
+        """
+        if not self.updatable:
+            raise ValueError("This engine was exported without NB counts (re-export it to enable updates)")
+        class_index = {label: k for k, label in enumerate(self.classes)}
+        unknown = sorted({label for label in labels if label not in class_index})
+        if unknown:
+            raise ValueError(f"Unknown labels {unknown} (expected one of {self.classes})")
+
+        feature_count = np.array(self.feature_count)
+        class_count = np.array(self.class_count)
+        targets = np.array([class_index[label] for label in labels], dtype=np.intp)
+        rows, indices, weights = self._tfidf(texts)
+        np.add.at(feature_count, (indices, targets[rows]), weights)
+        class_count += np.bincount(targets, minlength=len(self.classes))
+
+        feature_log_prob, class_log_prior = nb_log_probs(feature_count, class_count, self.alpha, self.fit_prior)
+
+        return InferenceEngine(
+            vocabulary=self.vocabulary,
+            idf=self.idf,
+            feature_log_prob=feature_log_prob,
+            class_log_prior=class_log_prior,
+            classes=self.classes,
+            ngram_range=self.ngram_range,
+            lowercase=self.lowercase,
+            feature_count=feature_count,
+            class_count=class_count,
+            alpha=self.alpha,
+            fit_prior=self.fit_prior,
+            metadata=metadata,
+        )
+
+    # --- PREDICTION ---
+    def predict_proba(self, texts):
+        jll = self._joint_log_likelihood(texts)
+        jll -= jll.max(axis=1, keepdims=True)
+        probs = np.exp(jll)
+        probs /= probs.sum(axis=1, keepdims=True)
+        return probs
+
+    def predict(self, text):
+        # Single-string fast path: no row bookkeeping, one small dot product
+        counts = self._features(text)
+        jll = self.class_log_prior.copy()
+        if counts:
+            indices = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+            weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+            weights *= self.idf[indices]
+            weights /= np.sqrt(weights @ weights)
+            jll += weights @ self.feature_log_prob[indices]
+        probs = np.exp(jll - jll.max())
+        probs /= probs.sum()
+        best = int(probs.argmax())
+        return self.classes[best], probs
+
+
+# --- VERSIONED ARTIFACTS ---
+def versions_dir(path=ENGINE_PATH):
+    return f"{path}.versions"
+
+
+def _version_number(name):
+    # 'v000012' -> 12; other names -> None
+    if name.startswith('v') and name[1:].isdigit():
+        return int(name[1:])
+    return None
+
+
+def _published_version(path):
+    try:
+        with open(os.path.join(path, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f).get('version', 0)
+    except (OSError, ValueError):
+        return None
+
+
+def publish(engine, path=ENGINE_PATH, keep=ENGINE_KEEP_VERSIONS, parent=None):
+    """Save engine as the next version and atomically point path at it.
+
+    Versions are written to versions_dir(path) and path becomes a symlink to
+    the current one, so processes that load path never see a partial
+    artifact and those still mapping an older version are unaffected. Sets
+    and returns engine.version. A plain directory found at path (an export
+    from before versioning) is moved in as the first version.
+
+    With ``parent``, raises VersionConflict unless path is still at that
+    version, so an update derived from it cannot undo a concurrent publish.
+    """
+    directory = versions_dir(path)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, '.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # one publisher at a time
+        if parent is not None and _published_version(path) != parent:
+            raise VersionConflict(f"{path} is at version {_published_version(path)}, not {parent}")
+        existing = [n for n in map(_version_number, os.listdir(directory)) if n is not None]
+        if os.path.isdir(path) and not os.path.islink(path):
+            legacy = max(existing, default=0) + 1
+            os.rename(path, os.path.join(directory, f"v{legacy:06d}"))
+            existing.append(legacy)
+
+        engine.version = max(existing, default=0) + 1
+        target = os.path.join(directory, f"v{engine.version:06d}")
+        engine.save(target)
+        link_path = f"{path}.link-{os.getpid()}"
+        os.symlink(os.path.relpath(target, os.path.dirname(path) or '.'), link_path)
+        os.replace(link_path, path)
+        existing.append(engine.version)
+
+        # Keep the newest versions (this one included) for rollback; older
+        # ones may still be memory-mapped by running workers, which is fine
+        # once unlinked
+        for number in sorted(existing)[:-keep] if keep > 0 else []:
+            shutil.rmtree(os.path.join(directory, f"v{number:06d}"), ignore_errors=True)
+    return engine.version
+
+
+class EngineWatcher:
+    """Serves the engine published at path and picks up new versions.
+
+    current() checks path at most every ``check_interval`` seconds. The
+    request that notices a new version loads it while concurrent requests
+    keep using the previous one, so a swap never blocks. ``build(engine)``
+    derives whatever must change together with the engine (caches, ...).
+    """
+
+    def __init__(self, path, engine, build=None, check_interval=0.0):
+        self.path = path
+        self.build = build or (lambda e: e)
+        self.check_interval = float(check_interval)
+        self._lock = threading.Lock()
+        self._state = self.build(engine)
+        self._signature = self._current_signature()
+        self._next_check = 0.0
+
+    def _current_signature(self):
+        # Published versions are never rewritten, so the link target (one
+        # syscall) identifies them; a plain directory falls back to its manifest
+        try:
+            return os.readlink(self.path)
+        except OSError:
+            pass
+        try:
+            st = os.stat(os.path.join(self.path, MANIFEST_NAME))
+        except OSError:
+            return None
+        return st.st_dev, st.st_ino, st.st_mtime_ns
+
+    def current(self):
+        if self.check_interval:
+            now = time.monotonic()
+            if now < self._next_check:
+                return self._state
+            self._next_check = now + self.check_interval
+        signature = self._current_signature()
+        if signature is not None and signature != self._signature and self._lock.acquire(blocking=False):
+            try:
+                self._swap(signature)
+            finally:
+                self._lock.release()
+        return self._state
+
+    def _swap(self, signature):
+        # Load through the resolved directory: the link may move mid-load
+        target = os.path.realpath(self.path)
+        try:
+            state = self.build(InferenceEngine.load(target))
+        except (ArtifactError, ValueError) as e:
+            log.error('engine_reload_failed', extra={'fields': {'path': target, 'error': str(e)}})
+        else:
+            self._state = state
+            log.info('engine_reloaded', extra={'fields': {'path': target}})
+        # A broken version is not retried; the next publish replaces it
+        self._signature = signature
+
+
+class PickleWatcher(EngineWatcher):
+    """EngineWatcher for an engine compiled from the pickled sklearn pipeline.
+
+    Used when no artifact was exported: the engine is recompiled whenever
+    either pickle changes on disk (mtime, size or inode).
+    """
+
+    def __init__(self, vectorizer_path, model_path, engine, build=None, check_interval=1.0):
+        self.paths = (vectorizer_path, model_path)
+        super().__init__(vectorizer_path, engine, build=build, check_interval=check_interval)
+
+    def _current_signature(self):
+        signature = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None  # mid-rewrite; keep the current engine
+            signature.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    def _swap(self, signature):
+        try:
+            state = self.build(InferenceEngine.from_pickles(*self.paths))
+        except ArtifactError as e:
+            log.error('engine_reload_failed', extra={'fields': {'path': self.paths[1], 'error': str(e)}})
+        else:
+            self._state = state
+            log.info('engine_reloaded', extra={'fields': {'path': self.paths[1]}})
+        self._signature = signature
+
+
+# --- PARITY CHECK ---
+def check_parity(engine, vectorizer, model, texts, atol=1e-9):
+    expected = model.predict_proba(vectorizer.transform(texts))
+    expected_labels = [str(label) for label in model.predict(vectorizer.transform(texts))]
+    batch = engine.predict_proba(texts)
+    single = [engine.predict(text) for text in texts]
+
+    # Both the batch and the single-string paths must agree with sklearn
+    mismatches = [
+        text for text, (label, _), row, expected_label in zip(texts, single, batch, expected_labels)
+        if label != expected_label or engine.classes[int(row.argmax())] != expected_label
+    ]
+    max_diff = 0.0
+    if len(texts):
+        max_diff = max(float(np.abs(batch - expected).max()),
+                       float(np.abs(np.array([p for _, p in single]) - expected).max()))
+    return max_diff <= atol and not mismatches, max_diff, mismatches
+
+
+def _time_per_call(func, texts, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            func(text)
+    return (time.perf_counter() - start) / (repeat * len(texts))
+
+
+# --- CLI ---
+def export_main(args):
+    import joblib
+
+    vectorizer = joblib.load(args.vectorizer)
+    model = joblib.load(args.model)
+    engine = InferenceEngine.from_sklearn(vectorizer, model)
+
+    samples = list(PARITY_SAMPLES)
+    if args.samples:
+        with open(args.samples, encoding='utf-8') as f:
+            samples.extend(line.rstrip('\n') for line in f)
+
+    ok, max_diff, mismatches = check_parity(engine, vectorizer, model, samples)
+    print(f"Parity on {len(samples)} samples: max |Δp| = {max_diff:.3e}, label mismatches = {len(mismatches)}")
+    if not ok:
+        for text in mismatches[:10]:
+            print(f"  mismatch: {text!r}")
+        print("❌ Engine does not match the sklearn pipeline, artifact not written.")
+        return 1
+
+    version = publish(engine, args.out)
+    print(f"✅ Engine written to {args.out} (version {version})")
+
+    def sklearn_single(text):
+        vec = vectorizer.transform([text])
+        model.predict(vec)
+        model.predict_proba(vec)
+
+    sklearn_t = _time_per_call(sklearn_single, PARITY_SAMPLES, args.repeat)
+    engine_t = _time_per_call(engine.predict, PARITY_SAMPLES, args.repeat)
+    print(f"Single-string latency: sklearn {sklearn_t * 1e6:.1f}µs, engine {engine_t * 1e6:.1f}µs "
+          f"({sklearn_t / engine_t:.1f}x faster)")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the sklearn text model to the NumPy inference engine.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    export = sub.add_parser('export', help="Convert the pickled vectorizer/model into an engine artifact")
+    export.add_argument('--vectorizer', default='data/processed/tfidf_vectorizer.pkl')
+    export.add_argument('--model', default='data/processed/language_model.pkl')
+    export.add_argument('--out', default=ENGINE_PATH)
+    export.add_argument('--samples', help="Extra parity samples, one text per line")
+    export.add_argument('--repeat', type=int, default=50, help="Repetitions for the latency comparison")
+    export.set_defaults(func=export_main)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
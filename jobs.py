@@ -0,0 +1,237 @@
+import fcntl
+import json
+import math
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import telemetry
+
+log = telemetry.get_logger('jobs')
+
+# --- CONFIGURATION ---
+# Audio worker threads and queued jobs per web worker process; a full queue
+# answers 429 instead of piling up requests
+AUDIO_WORKERS = int(os.environ.get('AUDIO_WORKERS', 2))
+AUDIO_QUEUE_SIZE = int(os.environ.get('AUDIO_QUEUE_SIZE', 8))
+# A long-poll on /jobs/<id>?wait=N holds a request thread. By default each
+# worker long-polls on as many threads as it can spare (its thread count
+# minus one, see LONG-HELD REQUESTS in app.py; none on sync workers);
+# JOB_LONGPOLL_SLOTS > 0 also caps the waits at once across processes. The
+# others answer immediately with a poll interval based on the job duration.
+JOB_LONGPOLL_SLOTS = int(os.environ.get('JOB_LONGPOLL_SLOTS', 0))
+JOB_LONGPOLL_MAX = float(os.environ.get('JOB_LONGPOLL_MAX', 20))
+JOB_POLL_INTERVAL = 0.1
+MIN_POLL_INTERVAL = 0.2
+# Job states are files shared by every worker process of the host, so a poll
+# can land on any of them; finished jobs are kept for JOB_TTL seconds
+JOBS_DIR = os.environ.get('AUDIO_JOBS_DIR', os.path.join(tempfile.gettempdir(), 'langpredict-jobs'))
+JOB_TTL = float(os.environ.get('JOB_TTL', 600))
+# Starting guess for the duration of one job, refined as jobs complete
+INITIAL_JOB_SECONDS = 3.0
+MAX_RETRY_AFTER = 60
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Audio queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobStore:
+    """Job state as one JSON file per job, written atomically.
+
+    States go queued -> running -> done; ``result`` is set once done. A job
+    whose owning process died before finishing reads back as failed.
+    """
+
+    def __init__(self, directory=JOBS_DIR, ttl=JOB_TTL, longpoll_slots=JOB_LONGPOLL_SLOTS):
+        self.directory = directory
+        self.ttl = ttl
+        self.longpoll_slots = longpoll_slots
+        self._last_purge = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def write(self, job_id, state, **fields):
+        job = dict(fields, job_id=job_id, state=state, owner=os.getpid(), updated=time.time())
+        path = self._path(job_id)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return job
+
+    def remove(self, job_id):
+        try:
+            os.remove(self._path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def read(self, job_id):
+        if not _JOB_ID.match(job_id):
+            return None
+        try:
+            with open(self._path(job_id), encoding='utf-8') as f:
+                job = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if job['state'] != 'done' and job['owner'] != os.getpid() and not _pid_alive(job['owner']):
+            job = dict(job, state='done', result={
+                'status': 'error', 'message': 'The server restarted while processing this audio. Please try again.'})
+        return job
+
+    def wait(self, job_id, timeout):
+        # Poll the file until the job is done or the timeout expires
+        deadline = time.monotonic() + timeout
+        job = self.read(job_id)
+        while job is not None and job['state'] != 'done' and time.monotonic() < deadline:
+            time.sleep(JOB_POLL_INTERVAL)
+            job = self.read(job_id)
+        return job
+
+    @contextmanager
+    def longpoll_slot(self):
+        """Yield True while holding one of the host-wide long-poll slots, False if all are taken."""
+        if not self.longpoll_slots:
+            yield True  # no host-wide cap
+            return
+        for slot in range(self.longpoll_slots):
+            fd = os.open(os.path.join(self.directory, f".longpoll-{slot}.lock"), os.O_RDWR | os.O_CREAT)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            try:
+                yield True
+            finally:
+                os.close(fd)  # releases the lock
+            return
+        yield False
+
+    def purge(self, interval=60.0):
+        # Drop expired job files, at most once per interval per process
+        now = time.time()
+        if now - self._last_purge < interval:
+            return
+        self._last_purge = now
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    if now - entry.stat().st_mtime > self.ttl:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass  # another worker got there first
+
+
+class AudioJobQueue:
+    """Bounded queue of audio jobs served by a pool of background threads.
+
+    ``handler(*args)`` returns the JSON-serialisable result of a job. The
+    threads start on the first submit in each process, so a preloading
+    gunicorn master never owns them.
+    """
+
+    def __init__(self, handler, store, workers=AUDIO_WORKERS, maxsize=AUDIO_QUEUE_SIZE):
+        self.handler = handler
+        self.store = store
+        self.workers = max(1, workers)
+        self.maxsize = max(1, maxsize)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._running = 0
+        self._avg_seconds = INITIAL_JOB_SECONDS
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=self.maxsize)
+            self._running = 0
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f'audio-job-{i}', daemon=True).start()
+
+    def retry_after(self):
+        # Time for the current backlog to drain, in whole seconds
+        backlog = self._queue.qsize() + self._running if self._queue else 0
+        seconds = math.ceil(max(1, backlog) * self._avg_seconds / self.workers)
+        return int(min(max(seconds, 1), MAX_RETRY_AFTER))
+
+    def poll_interval(self):
+        # Suggested delay before polling a job again, when it cannot long-poll
+        return round(min(max(self._avg_seconds / 4, MIN_POLL_INTERVAL), 1.0), 2)
+
+    def submit(self, *args):
+        """Queue a job and return its id; raises QueueFull when the queue is at capacity."""
+        self._ensure_started()
+        self.store.purge()
+        job_id = uuid.uuid4().hex
+        # Written before queueing so the worker's 'running' cannot be overwritten
+        self.store.write(job_id, 'queued')
+        try:
+            self._queue.put_nowait((job_id, args, time.monotonic()))
+        except queue.Full:
+            self.store.remove(job_id)
+            telemetry.AUDIO_JOBS.labels('rejected').inc()
+            raise QueueFull(self.retry_after())
+        telemetry.AUDIO_JOBS.labels('queued').inc()
+        telemetry.AUDIO_QUEUE_DEPTH.set(self._queue.qsize())
+        return job_id
+
+    def _work(self):
+        while True:
+            job_id, args, enqueued = self._queue.get()
+            telemetry.AUDIO_QUEUE_DEPTH.set(self._queue.qsize())
+            telemetry.AUDIO_JOB_WAIT_SECONDS.observe(time.monotonic() - enqueued)
+            with self._lock:
+                self._running += 1
+            self.store.write(job_id, 'running')
+            start = time.monotonic()
+            try:
+                result = self.handler(*args)
+                outcome = 'done'
+            except Exception as e:
+                log.error('job_failed', job_id=job_id, error=f'{type(e).__name__}: {e}', exc_info=True)
+                result = {'status': 'error', 'message': 'Audio processing failed'}
+                outcome = 'failed'
+            finally:
+                elapsed = time.monotonic() - start
+                with self._lock:
+                    self._running -= 1
+                    self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+            self.store.write(job_id, 'done', result=result)
+            telemetry.AUDIO_JOBS.labels(outcome).inc()
+            self._queue.task_done()
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'capacity': self.maxsize,
+            'queued': self._queue.qsize() if self._queue else 0,
+            'running': self._running,
+            'avg_job_seconds': round(self._avg_seconds, 3),
+        }
@@ -0,0 +1,18 @@
+import re
+
+# Text normalisation shared by the web app and the offline tools
+
+
+# --- CLEANING ---
+# Removed by clean_text(), URLs first, then punctuation (segmentation.py
+# applies the same patterns to keep character offsets)
+URL_PATTERN = re.compile(r'http\S+|www\S+|https\S+', flags=re.MULTILINE)
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+
+def clean_text(text):
+    if not isinstance(text, str): return ""
+    text = text.lower() 
+    text = URL_PATTERN.sub('', text)
+    text = PUNCTUATION_PATTERN.sub('', text) 
+    text = text.strip()
+    return text
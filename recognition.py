@@ -0,0 +1,465 @@
+import argparse
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import telemetry
+
+# speech_recognition is imported where it is used, so importing this module
+# (and the web app) stays cheap until the first audio request
+
+log = telemetry.get_logger('recognition')
+
+# --- CONFIGURATION ---
+# Per remote call timeout (seconds) and overall deadline for one strategy
+RECOGNIZER_TIMEOUT = float(os.environ.get('RECOGNIZER_TIMEOUT', 8))
+RECOGNITION_DEADLINE = float(os.environ.get('RECOGNITION_DEADLINE', 10))
+RECOGNIZER_MAX_WORKERS = int(os.environ.get('RECOGNIZER_MAX_WORKERS', 8))
+
+# Adaptive scheduling: stop once a result scores at least EARLY_STOP_SCORE
+# (model confidence + alignment bonus); the first wave queries the
+# FIRST_WAVE_SIZE most likely languages, the second wave the rest
+EARLY_STOP_SCORE = float(os.environ.get('EARLY_STOP_SCORE', 100))
+FIRST_WAVE_SIZE = int(os.environ.get('FIRST_WAVE_SIZE', 1))
+PRIOR_DECAY = float(os.environ.get('LANGUAGE_PRIOR_DECAY', 0.98))
+
+# Recognizer languages, in default priority order: French first, then
+# English, then Arabic variants
+LANGUAGES = [
+    ("fr-FR", "French"),
+    ("en-US", "English"),
+    ("ar-MA", "Arabic (Morocco)"),
+    ("ar-SA", "Arabic (Standard)")
+]
+
+# Map model predictions to expected recognizer language codes
+PRED_LANG_MAP = {
+    'Français': ['fr-FR'],
+    'English': ['en-US'],
+    'Darija': ['ar-MA', 'ar-SA']
+}
+
+
+# --- RECOGNIZERS ---
+class BaseRecognizer:
+    """Speech-to-text backend: one call per (audio, language)."""
+
+    name = 'base'
+
+    def recognize(self, audio_data, language, show_all=False, timeout=None):
+        raise NotImplementedError
+
+
+class GoogleRecognizer(BaseRecognizer):
+    name = 'google'
+
+    def recognize(self, audio_data, language, show_all=False, timeout=None):
+        import speech_recognition as sr
+
+        # A fresh Recognizer per call: they are cheap and not shared across threads
+        r = sr.Recognizer()
+        r.operation_timeout = timeout
+        return r.recognize_google(audio_data, language=language, show_all=show_all)
+
+
+class FakeRecognizer(BaseRecognizer):
+    """Offline stand-in with configurable latency, for tests and benchmarks."""
+
+    name = 'fake'
+
+    DEFAULT_TRANSCRIPTS = {
+        'fr-FR': 'bonjour comment allez vous',
+        'en-US': 'hello how are you',
+        'ar-MA': 'salam labas 3lik',
+        'ar-SA': None,
+    }
+
+    def __init__(self, latency=0.5, jitter=0.0, transcripts=None, seed=None):
+        self.latency = float(latency)
+        self.jitter = float(jitter)
+        self.transcripts = dict(self.DEFAULT_TRANSCRIPTS if transcripts is None else transcripts)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def recognize(self, audio_data, language, show_all=False, timeout=None):
+        import speech_recognition as sr
+
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise sr.RequestError("recognition operation timed out")
+        time.sleep(delay)
+
+        text = self.transcripts.get(language)
+        if not text:
+            if show_all:
+                return []
+            raise sr.UnknownValueError()
+        if show_all:
+            return {'alternative': [{'transcript': text, 'confidence': 0.9}], 'final': True}
+        return text
+
+
+def make_recognizer(name=None):
+    name = (name or os.environ.get('SPEECH_RECOGNIZER', 'google')).lower()
+    if name == 'google':
+        return GoogleRecognizer()
+    if name == 'fake':
+        return FakeRecognizer(
+            latency=float(os.environ.get('FAKE_RECOGNIZER_LATENCY', 0.5)),
+            jitter=float(os.environ.get('FAKE_RECOGNIZER_JITTER', 0.0))
+        )
+    raise ValueError(f"Unknown speech recognizer {name!r} (expected 'google' or 'fake')")
+
+
+# --- CONCURRENT FAN-OUT ---
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    # One bounded pool per process, shared by all requests
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=RECOGNIZER_MAX_WORKERS,
+                                           thread_name_prefix='recognizer')
+        return _executor
+
+
+def _extract_text(response, show_all):
+    # Returns (text, api_confidence) or (None, None)
+    if not show_all:
+        return (response, None) if response and response.strip() else (None, None)
+    if response and 'alternative' in response:
+        for alt in response['alternative']:
+            if alt.get('transcript'):
+                return alt['transcript'], alt.get('confidence', 0.5) * 100
+    return None, None
+
+
+def _timed_recognize(recognizer, audio_data, language, strategy, show_all, timeout):
+    import speech_recognition as sr
+
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        response = recognizer.recognize(audio_data, language, show_all, timeout)
+        outcome = 'ok' if response else 'no_speech'
+        return response
+    except sr.UnknownValueError:
+        outcome = 'no_speech'
+        raise
+    finally:
+        telemetry.record_recognizer_call(language, strategy, outcome, time.perf_counter() - start)
+
+
+def run_strategy(recognizer, audio_data, languages, strategy, predict, show_all=False,
+                 timeout=None, deadline=None, executor=None, failures=None):
+    """Query every language concurrently and return the results in ``languages`` order.
+
+    Languages that missed the deadline or raised are counted in ``failures``
+    (a Counter, keys 'deadline_misses' and 'errors'), when given.
+    """
+    import speech_recognition as sr
+
+    timeout = RECOGNIZER_TIMEOUT if timeout is None else timeout
+    deadline = RECOGNITION_DEADLINE if deadline is None else deadline
+    executor = executor or get_executor()
+    failures = Counter() if failures is None else failures
+
+    # Each call runs in a copy of the caller's context so its timing lands in
+    # the caller's request trace
+    futures = [
+        executor.submit(contextvars.copy_context().run, _timed_recognize, recognizer, audio_data,
+                        lang_code, strategy, show_all, timeout)
+        for lang_code, _ in languages
+    ]
+    wait(futures, timeout=deadline)
+
+    results = []
+    for future, (lang_code, lang_name) in zip(futures, languages):
+        if not future.done():
+            future.cancel()
+            telemetry.record_deadline_miss(lang_code, strategy)
+            failures['deadline_misses'] += 1
+            continue
+        try:
+            text, api_confidence = _extract_text(future.result(), show_all)
+        except sr.UnknownValueError:
+            continue
+        except Exception as e:
+            log.debug('recognizer_error', language=lang_code, strategy=strategy, error=str(e))
+            failures['errors'] += 1
+            continue
+        if not text:
+            continue
+
+        pred, conf = predict(text)
+        log.debug('recognized', language=lang_code, strategy=strategy, text=text, prediction=pred,
+                  confidence=conf)
+        result = {
+            'text': text,
+            'prediction': pred,
+            'confidence': conf,
+            'detected_lang': lang_code,
+            'lang_name': lang_name,
+            'strategy': strategy
+        }
+        if api_confidence is not None:
+            result['api_confidence'] = api_confidence
+        results.append(result)
+    return results
+
+
+# --- SCORING ---
+def calculate_score(result):
+    # 1. Model confidence (primary)
+    # 2. Bonus if model prediction aligns with the recognizer language
+    score = result['confidence']
+    expected_codes = PRED_LANG_MAP.get(result['prediction'], [])
+    if result['detected_lang'] in expected_codes:
+        score += 10  # Alignment bonus
+    return score
+
+
+# --- ADAPTIVE SCHEDULING ---
+def parse_language_hint(hint, languages):
+    # Accept-Language style hint ("fr-FR,fr;q=0.9,en;q=0.8") -> codes of the
+    # first tag that matches one of ``languages``
+    if not hint:
+        return set()
+    for tag in hint.split(','):
+        tag = tag.split(';')[0].strip().lower()
+        if not tag or tag == '*':
+            continue
+        primary = tag.split('-')[0]
+        exact = {code for code, _ in languages if code.lower() == tag}
+        if exact:
+            return exact
+        matched = {code for code, _ in languages if code.split('-')[0].lower() == primary}
+        if matched:
+            return matched
+    return set()
+
+
+class LanguagePrior:
+    """Exponentially decayed mix of recently recognised languages."""
+
+    def __init__(self, decay=PRIOR_DECAY):
+        self.decay = decay
+        self._weights = {}
+        self._lock = threading.Lock()
+
+    def observe(self, lang_code):
+        with self._lock:
+            for code in self._weights:
+                self._weights[code] *= self.decay
+            self._weights[lang_code] = self._weights.get(lang_code, 0.0) + 1.0
+
+    def weights(self):
+        with self._lock:
+            return dict(self._weights)
+
+    def order(self, languages, hint=None):
+        # Hinted languages first, then by traffic weight, then the configured order
+        hinted = parse_language_hint(hint, languages)
+        weights = self.weights()
+        ranked = sorted(
+            enumerate(languages),
+            key=lambda item: (item[1][0] not in hinted, -weights.get(item[1][0], 0.0), item[0])
+        )
+        return [lang for _, lang in ranked]
+
+
+class RecognitionScheduler:
+    """Per-request scheduler: queries languages in prior order and stops early.
+
+    Each strategy runs in two waves (the most likely languages, then the rest,
+    concurrently); the second wave is skipped once a result scores at least
+    ``threshold`` with calculate_score. ``failures`` counts the calls that
+    errored or missed the deadline; results of a run with failures are
+    incomplete and should not be cached.
+    """
+
+    def __init__(self, recognizer, languages, predict, prior=None, hint=None,
+                 threshold=EARLY_STOP_SCORE, first_wave=FIRST_WAVE_SIZE):
+        self.recognizer = recognizer
+        self.languages = list(languages)
+        self.predict = predict
+        self.prior = prior or LanguagePrior()
+        self.hint = hint
+        self.threshold = threshold
+        self.first_wave = max(1, first_wave)
+        self.calls = 0
+        self.calls_saved = 0
+        self.failures = Counter()
+
+    def run(self, audio_data, strategy, show_all=False, deadline=None):
+        deadline = RECOGNITION_DEADLINE if deadline is None else deadline
+        ordered = self.prior.order(self.languages, self.hint)
+        waves = [ordered[:self.first_wave], ordered[self.first_wave:]]
+        start = time.monotonic()
+        results = []
+        calls = 0
+
+        for wave in waves:
+            if not wave:
+                continue
+            remaining = deadline - (time.monotonic() - start)
+            if remaining <= 0:
+                self.failures['deadline_misses'] += len(wave)
+                break
+            results += run_strategy(self.recognizer, audio_data, wave, strategy, self.predict,
+                                    show_all=show_all, deadline=remaining, failures=self.failures)
+            calls += len(wave)
+            if any(calculate_score(r) >= self.threshold for r in results):
+                break
+
+        # Savings are measured against querying every language for this strategy
+        self.calls += calls
+        self.calls_saved += len(ordered) - calls
+        return results
+
+    def observe(self, best_result):
+        self.prior.observe(best_result['detected_lang'])
+
+
+# --- STRATEGIES ---
+def recognize_with_strategies(scheduler, pcm):
+    """Run the direct, noise-adjusted and show_all strategies on one PCM buffer.
+
+    Each strategy only runs if the previous ones produced nothing.
+    """
+    results = []
+
+    # Strategy 1: Without noise adjustment (for clean recordings)
+    results += _run_logged(scheduler, pcm.audio_data, 'direct')
+
+    # Strategy 2: With noise adjustment (for noisy recordings). Calibrating on
+    # up to 1s of ambient audio consumes it, so only the rest is recognised
+    if not results:
+        skip = pcm.ambient_skip_frames(min(1.0, pcm.duration))
+        results += _run_logged(scheduler, lambda: pcm.audio_data(skip), 'noise-adjusted')
+
+    # Strategy 3: Partial recognition (show_all=True)
+    if not results:
+        results += _run_logged(scheduler, pcm.audio_data, 'detailed', show_all=True)
+
+    return results
+
+
+def _run_logged(scheduler, make_audio_data, strategy, show_all=False):
+    telemetry.note(strategy=strategy)
+    try:
+        with telemetry.span(f'recognize.{strategy}'):
+            return scheduler.run(make_audio_data(), strategy, show_all=show_all)
+    except Exception as e:
+        log.warning('strategy_failed', strategy=strategy, error=f'{type(e).__name__}: {e}')
+        scheduler.failures['errors'] += 1
+        return []
+
+
+# --- OFFLINE MEASUREMENTS ---
+# Simulated clips: the matching recognizer language returns a clean transcript,
+# the others return a garbled one the model is unsure about
+SIMULATED_SPEECH = {
+    'fr-FR': ('bonjour tout le monde', 'Français'),
+    'en-US': ('hello everybody', 'English'),
+    'ar-MA': ('salam labas 3likom', 'Darija'),
+}
+
+
+def _fanout_main(args):
+    import speech_recognition as sr
+
+    recognizer = FakeRecognizer(latency=args.latency, jitter=args.jitter, seed=0)
+    audio_data = sr.AudioData(b'\0\0' * 16000, 16000, 2)
+
+    def predict(text):
+        return 'unknown', 0.0
+
+    start = time.perf_counter()
+    for _ in range(args.strategies):
+        for lang_code, _ in LANGUAGES:
+            try:
+                recognizer.recognize(audio_data, lang_code)
+            except sr.UnknownValueError:
+                pass
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(args.strategies):
+        run_strategy(recognizer, audio_data, LANGUAGES, f'strategy-{i + 1}', predict)
+    concurrent = time.perf_counter() - start
+
+    calls = args.strategies * len(LANGUAGES)
+    print(f"{calls} calls @ {args.latency:.2f}s(+{args.jitter:.2f}s jitter): "
+          f"sequential {sequential:.2f}s, concurrent {concurrent:.2f}s ({sequential / concurrent:.1f}x)")
+
+
+def _schedule_main(args):
+    import speech_recognition as sr
+
+    mix = {}
+    for part in args.mix.split(','):
+        code, share = part.split('=')
+        mix[code.strip()] = float(share)
+    codes, shares = zip(*mix.items())
+
+    rng = random.Random(0)
+    prior = LanguagePrior()
+    audio_data = sr.AudioData(b'\0\0' * 16000, 16000, 2)
+    labels = {text: label for text, label in SIMULATED_SPEECH.values()}
+
+    def predict(text):
+        return (labels[text], 97.0) if text in labels else ('English', 40.0)
+
+    total_calls = total_saved = 0
+    for _ in range(args.requests):
+        spoken = rng.choices(codes, weights=shares)[0]
+        transcripts = {code: f'garbled {code}' for code, _ in LANGUAGES}
+        transcripts[spoken] = SIMULATED_SPEECH[spoken][0]
+        recognizer = FakeRecognizer(latency=args.latency, transcripts=transcripts)
+
+        scheduler = RecognitionScheduler(recognizer, LANGUAGES, predict, prior=prior)
+        results = scheduler.run(audio_data, 'direct')
+        if results:
+            scheduler.observe(max(results, key=calculate_score))
+        total_calls += scheduler.calls
+        total_saved += scheduler.calls_saved
+
+    baseline = args.requests * len(LANGUAGES)
+    print(f"{args.requests} requests, mix {args.mix}: {total_calls / args.requests:.2f} calls/request "
+          f"(baseline {len(LANGUAGES)}), {total_saved} calls saved ({total_saved / baseline:.0%})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline recognition measurements with the fake recognizer.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    fanout = sub.add_parser('fanout', help="Compare sequential and concurrent recognition")
+    fanout.add_argument('--latency', type=float, default=0.3, help="Fake recognizer latency per call (s)")
+    fanout.add_argument('--jitter', type=float, default=0.1)
+    fanout.add_argument('--strategies', type=int, default=3, help="Strategies to run (1-3)")
+    fanout.set_defaults(func=_fanout_main)
+
+    schedule = sub.add_parser('schedule', help="Average recognizer calls per request with the adaptive scheduler")
+    schedule.add_argument('--mix', default='fr-FR=0.8,en-US=0.1,ar-MA=0.1', help="Traffic mix as code=share,...")
+    schedule.add_argument('--requests', type=int, default=200)
+    schedule.add_argument('--latency', type=float, default=0.0)
+    schedule.set_defaults(func=_schedule_main)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+import os
+
+import numpy as np
+
+from inference import MAX_NGRAM, WHITE_SPACES, lookup_keys, ngram_key, ngram_key_array, to_code_points
+from preprocessing import URL_PATTERN, PUNCTUATION_PATTERN
+
+# --- CONFIGURATION ---
+# Window length and step, in words. Each word is labelled with the average of
+# the windows covering it, so shorter windows follow switches more closely but
+# see less context.
+SEGMENT_WINDOW_WORDS = int(os.environ.get('SEGMENT_WINDOW_WORDS', 5))
+SEGMENT_STRIDE_WORDS = int(os.environ.get('SEGMENT_STRIDE_WORDS', 1))
+
+
+# str.isspace() by code point; every whitespace character is below U+3001
+_IS_SPACE = np.array([chr(c).isspace() for c in range(0x3001)] + [False])
+
+
+def _space_mask(code_points):
+    return _IS_SPACE[np.minimum(code_points, len(_IS_SPACE) - 1)]
+
+
+def normalize(text):
+    """The string the engine sees for clean_text(text), and the index in text of each of its characters."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        origin = np.arange(len(text))
+    else:
+        # A few characters lowercase to several (e.g. 'İ'); they all map back to it
+        origin = np.repeat(np.arange(len(text)), [len(ch.lower()) for ch in text])
+
+    # Dropped characters become NUL (itself punctuation) so positions survive
+    masked = URL_PATTERN.sub(lambda m: '\0' * len(m.group()), lowered)
+    masked = PUNCTUATION_PATTERN.sub('\0', masked)
+    origin = origin[to_code_points(masked) != 0]
+    kept = masked.replace('\0', '')
+
+    stripped = kept.strip()
+    lead = len(kept) - len(kept.lstrip())
+    origin = origin[lead:lead + len(stripped)]
+
+    # A whitespace run keeps its first character
+    spaces = _space_mask(to_code_points(stripped))
+    keep = np.ones(len(stripped), dtype=bool)
+    keep[1:] = ~(spaces[1:] & spaces[:-1])
+    return WHITE_SPACES.sub(' ', stripped), origin[keep]
+
+
+def _sort_key_dtype(upper):
+    # 16-bit keys let np.argsort(kind='stable') use radix sort
+    return np.uint16 if upper < 2 ** 16 else np.intp
+
+
+class Segmenter:
+    """Splits mixed-language text into labelled spans with the NB engine.
+
+    A window of ``window`` words slides over the text ``stride`` words at a
+    time. Rather than vectorizing every window, each n-gram occurrence is
+    added to the running TF-IDF state when the first window containing it is
+    reached and removed after the last one, so the work is linear in the text
+    length whatever the overlap. All windows are then scored in one batch and
+    consecutive words with the same label are merged into spans.
+    """
+
+    def __init__(self, engine, window=SEGMENT_WINDOW_WORDS, stride=SEGMENT_STRIDE_WORDS):
+        min_n, max_n = engine.ngram_range
+        if max_n > MAX_NGRAM:
+            raise ValueError(f"Segmentation supports n-grams of up to {MAX_NGRAM} characters, not {max_n}")
+        self.engine = engine
+        self.window = max(1, int(window))
+        self.stride = max(1, int(stride))
+        self.ngram_sizes = range(min_n, max_n + 1)
+
+        # Sorted integer keys of the vocabulary, per n-gram length
+        self._keys = {}
+        for n in self.ngram_sizes:
+            terms = [(term, index) for term, index in engine.vocabulary.items() if len(term) == n]
+            keys = np.array([ngram_key(term) for term, _ in terms], dtype=np.int64)
+            order = np.argsort(keys)
+            self._keys[n] = (keys[order], np.array([index for _, index in terms], dtype=np.intp)[order])
+
+        idf = np.asarray(engine.idf, dtype=np.float64)
+        self._idf_sq = idf * idf
+        # Contribution of one occurrence of each feature to the unnormalised
+        # jll, one contiguous column per class
+        self._weighted_log_prob = np.ascontiguousarray(
+            (idf[:, None] * np.asarray(engine.feature_log_prob, dtype=np.float64)).T)
+        self._feature_dtype = _sort_key_dtype(len(idf))
+
+    def _occurrences(self, code_points):
+        # (start, length, feature) of every in-vocabulary n-gram
+        code_points = code_points.astype(np.int64)
+        starts, lengths, features = [], [], []
+        for n in self.ngram_sizes:
+            vocab_keys, vocab_index = self._keys[n]
+            keys = ngram_key_array(code_points, n)
+            if not len(keys) or not len(vocab_keys):
+                continue
+            pos, found = lookup_keys(vocab_keys, keys)
+            found = np.flatnonzero(found)
+            starts.append(found)
+            lengths.append(np.full(len(found), n))
+            features.append(vocab_index[pos[found]])
+        if not starts:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty, empty
+        return np.concatenate(starts), np.concatenate(lengths), np.concatenate(features)
+
+    def window_log_likelihood(self, s, window_start, window_end, code_points=None):
+        """Joint log-likelihood of each window s[window_start[k]:window_end[k]].
+
+        Window bounds must be non-decreasing. Equal to
+        engine._joint_log_likelihood() of the window strings, without building
+        them.
+        """
+        n_windows = len(window_start)
+        jll = np.tile(np.asarray(self.engine.class_log_prior, dtype=np.float64), (n_windows, 1))
+        if code_points is None:
+            code_points = to_code_points(s)
+        starts, lengths, features = self._occurrences(code_points)
+
+        # Windows that contain an occurrence form a range [first, last]: the
+        # first one ending at or after its end, the last one starting at or
+        # before its start (counted per character position)
+        ends_before = np.zeros(len(s) + 2, dtype=np.intp)
+        np.cumsum(np.bincount(window_end, minlength=len(s) + 1), out=ends_before[1:])
+        starts_upto = np.cumsum(np.bincount(window_start, minlength=len(s) + 1))
+        first = ends_before[starts + lengths]
+        last = starts_upto[starts] - 1
+        inside = first <= last
+        first, last, features = first[inside], last[inside], features[inside]
+        if not len(features):
+            return jll
+
+        # An occurrence is added when window `first` is reached and removed
+        # when window `last + 1` is; bins past the last window are dropped
+        def per_window(times, weights=None):
+            return np.bincount(times, weights=weights, minlength=n_windows + 1)[:n_windows]
+
+        removed = last + 1
+        active = np.cumsum(per_window(first) - per_window(removed))
+        has_terms = active > 0
+        if not has_terms.any():
+            return jll
+
+        # Squared TF-IDF norm: adding an occurrence of a feature counted c
+        # times adds idf² (2c + 1), removing one adds idf² (1 - 2c). Sorted by
+        # feature, occurrences keep their text order, in which both `first`
+        # and `removed` are non-decreasing, so c comes from searchsorted.
+        order = np.argsort(features.astype(self._feature_dtype), kind='stable')
+        features, first, removed = features[order], first[order], removed[order]
+        group_start = np.ones(len(features), dtype=bool)
+        group_start[1:] = features[1:] != features[:-1]
+        group_first = np.maximum.accumulate(np.where(group_start, np.arange(len(features)), 0))
+        rank = np.arange(len(features)) - group_first
+        stride = n_windows + 2
+        added_key = features * stride + first
+        removed_key = features * stride + removed
+        # At the same window, removals are applied before additions
+        count_at_add = rank - (np.searchsorted(removed_key, added_key, side='right') - group_first)
+        count_at_remove = (np.searchsorted(added_key, removed_key, side='left') - group_first) - rank
+        idf_sq = self._idf_sq[features]
+        sum_sq = np.cumsum(per_window(first, idf_sq * (2 * count_at_add + 1))
+                           + per_window(removed, idf_sq * (1 - 2 * count_at_remove)))
+
+        # Cumulative sums leave rounding residue: clamp the squared norm
+        norms = np.sqrt(np.maximum(sum_sq[has_terms], 1e-300))
+        for k, weighted in enumerate(self._weighted_log_prob):
+            contribution = weighted[features]
+            dot = np.cumsum(per_window(first, contribution) - per_window(removed, contribution))
+            jll[has_terms, k] += dot[has_terms] / norms
+        return jll
+
+    def segment(self, text):
+        """Labelled spans of text, in order.
+
+        Each span is a dict with ``start``/``end`` (character offsets into
+        text, end exclusive), ``text``, ``prediction``, ``confidence`` and
+        ``words``. Text that clean_text() removes entirely gives no spans.
+        """
+        s, origin = normalize(text)
+        if not s:
+            return []
+        code_points = to_code_points(s)
+        spaces = _space_mask(code_points)
+        word_start = np.flatnonzero(~spaces & np.concatenate([[True], spaces[:-1]]))
+        word_end = np.flatnonzero(~spaces & np.concatenate([spaces[1:], [True]])) + 1
+        n_words = len(word_start)
+
+        # Windows of `window` words every `stride` words, the last one ending on the last word
+        size = min(self.window, n_words)
+        first_words = np.arange(0, n_words - size + 1, self.stride)
+        if first_words[-1] != n_words - size:
+            first_words = np.append(first_words, n_words - size)
+        jll = self.window_log_likelihood(s, word_start[first_words], word_end[first_words + size - 1],
+                                         code_points)
+        jll -= jll.max(axis=1, keepdims=True)
+        probs = np.exp(jll)
+        probs /= probs.sum(axis=1, keepdims=True)
+
+        # Each word gets the mean of the windows covering it
+        word_index = np.arange(n_words)
+        lo = np.searchsorted(first_words + size, word_index, side='right')
+        hi = np.searchsorted(first_words, word_index, side='right')
+        cumulative = np.vstack([np.zeros((1, probs.shape[1])), np.cumsum(probs, axis=0)])
+        word_probs = (cumulative[hi] - cumulative[lo]) / (hi - lo)[:, None]
+        labels = word_probs.argmax(axis=1)
+
+        # Runs of equally labelled words become spans
+        breaks = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+        run_start = np.concatenate([[0], breaks])
+        run_end = np.concatenate([breaks, [n_words]])
+        run_conf = np.add.reduceat(word_probs[word_index, labels], run_start) / (run_end - run_start)
+
+        classes = self.engine.classes
+        spans = []
+        for first_word, end_word, conf in zip(run_start.tolist(), run_end.tolist(), run_conf.tolist()):
+            start = int(origin[word_start[first_word]])
+            end = int(origin[word_end[end_word - 1] - 1]) + 1
+            spans.append({
+                'start': start,
+                'end': end,
+                'text': text[start:end],
+                'prediction': classes[int(labels[first_word])],
+                'confidence': round(conf * 100, 2),
+                'words': end_word - first_word,
+            })
+        return spans
@@ -44,7 +44,7 @@ function setBusyState(isBusy, text = "Identify Language") {
   }
 }
 
-function updateResultUI(predictionKey, confidenceVal) {
+function updateResultUI(predictionKey, confidenceVal, modelVersion) {
   const langData = LANG_MAP[predictionKey] || {
     label: predictionKey || "Unknown",
     class: "da",
@@ -60,6 +60,11 @@ function updateResultUI(predictionKey, confidenceVal) {
               <i class="fas fa-language"></i> ${langData.label}
             </div>
             <div class="result-score">Confidence Score: ${confidenceDisplay}</div>
+            ${
+              modelVersion !== undefined && modelVersion !== null
+                ? `<div class="result-version">Model version ${modelVersion}</div>`
+                : ""
+            }
           </div>
         `;
   resultContainer.innerHTML = html;
@@ -70,6 +75,108 @@ function updateResultUI(predictionKey, confidenceVal) {
 let mediaRecorder = null;
 let audioChunks = [];
 let isRecording = false;
+let liveStream = null;
+
+// --- Live streaming (16 kHz PCM sent over a WebSocket while recording) ---
+// fetch() request streams are half-duplex (no response until the body is
+// closed) and need HTTP/2, so partial results come back over /ws/stream
+const STREAM_SAMPLE_RATE = 16000;
+const STREAM_SOCKET_URL = `${location.protocol === "https:" ? "wss" : "ws"}://${location.host}/ws/stream`;
+
+function handleStreamEvent(live, event) {
+  console.log("📥 Stream event:", event);
+  if (event.type === "segment") {
+    if (event.status === "success") {
+      live.texts.push(event.text);
+      textArea.value = live.texts.join(" ");
+      updateResultUI(event.prediction, event.confidence, event.model_version);
+    }
+  } else if (event.type === "final") {
+    live.finished = true;
+    setBusyState(false);
+    textArea.placeholder = "Type text here...";
+    if (event.status === "success") {
+      textArea.value = event.text || "";
+      displayStatus("Audio processed successfully!");
+      updateResultUI(event.prediction, event.confidence, event.model_version);
+    } else {
+      displayStatus(event.message || "Processing failed", "error");
+      resultContainer.innerHTML = "";
+    }
+  }
+}
+
+function startLiveStream(mediaStream) {
+  if (!("WebSocket" in window)) return null;
+  let context;
+  try {
+    context = new AudioContext({ sampleRate: STREAM_SAMPLE_RATE });
+  } catch (e) {
+    console.warn("⚠️ 16 kHz AudioContext unavailable, streaming disabled:", e);
+    return null;
+  }
+
+  const live = { context, failed: false, finished: false, texts: [], pending: [] };
+  try {
+    live.source = context.createMediaStreamSource(mediaStream);
+  } catch (e) {
+    console.warn("⚠️ Cannot capture PCM, streaming disabled:", e);
+    context.close();
+    return null;
+  }
+
+  const socket = new WebSocket(STREAM_SOCKET_URL);
+  socket.binaryType = "arraybuffer";
+  live.socket = socket;
+  socket.onopen = () => {
+    // Audio captured while connecting
+    live.pending.forEach((chunk) => socket.send(chunk));
+    live.pending = [];
+    console.log("📡 Streaming audio to /ws/stream");
+  };
+  socket.onmessage = (message) => handleStreamEvent(live, JSON.parse(message.data));
+  live.done = new Promise((resolve) => {
+    socket.onclose = () => {
+      if (!live.finished) {
+        console.warn("⚠️ Streaming failed, falling back to /upload");
+        live.failed = true;
+      }
+      resolve();
+    };
+  });
+
+  live.processor = context.createScriptProcessor(4096, 1, 1);
+  live.processor.onaudioprocess = (event) => {
+    if (live.failed || live.stopped) return;
+    const input = event.inputBuffer.getChannelData(0);
+    const pcm = new Int16Array(input.length);
+    for (let i = 0; i < input.length; i++) {
+      const sample = Math.max(-1, Math.min(1, input[i]));
+      pcm[i] = sample < 0 ? sample * 0x8000 : sample * 0x7fff;
+    }
+    if (socket.readyState === WebSocket.OPEN) {
+      socket.send(pcm.buffer);
+    } else if (socket.readyState === WebSocket.CONNECTING) {
+      live.pending.push(pcm.buffer);
+    }
+  };
+  live.source.connect(live.processor);
+  live.processor.connect(context.destination);
+  return live;
+}
+
+function stopLiveStream(live) {
+  live.stopped = true;
+  live.processor.disconnect();
+  live.source.disconnect();
+  live.context.close();
+  // A text message ends the audio; the server then sends the final event and closes
+  if (live.socket.readyState === WebSocket.OPEN) {
+    live.socket.send("end");
+  } else {
+    live.socket.close();
+  }
+}
 
 function toggleRecording() {
   if (isRecording) {
@@ -129,11 +236,25 @@ function startRecording() {
         }
       };
       
+      // Stream PCM while recording when the browser supports it; the
+      // MediaRecorder blob is still kept as a fallback for /upload
+      liveStream = startLiveStream(stream);
+
       mediaRecorder.onstop = () => {
         const audioBlob = new Blob(audioChunks, { type: mediaRecorder.mimeType });
         console.log('🎵 Total audio size:', audioBlob.size, 'bytes, Type:', audioBlob.type);
-        sendAudioToServer(audioBlob);
         stream.getTracks().forEach(track => track.stop());
+
+        const live = liveStream;
+        liveStream = null;
+        if (!live) {
+          sendAudioToServer(audioBlob);
+          return;
+        }
+        stopLiveStream(live);
+        live.done.then(() => {
+          if (live.failed || !live.finished) sendAudioToServer(audioBlob);
+        });
       };
       
       // Request data every 100ms for better chunking
@@ -158,6 +279,35 @@ function stopRecording() {
   }
 }
 
+// --- Audio jobs: /upload queues the clip, /jobs/<id> returns the result ---
+const JOB_LONGPOLL_SECONDS = 15;
+const MAX_BUSY_RETRIES = 3;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+async function submitAudio(formData, attempt = 0) {
+  const res = await fetch("/upload", { method: "POST", body: formData });
+  const data = await res.json();
+  if (res.status === 429 && attempt < MAX_BUSY_RETRIES) {
+    // Server is shedding load: wait for the suggested time and try again
+    const retryAfter = data.retry_after || 2;
+    displayStatus(`Server busy, retrying in ${retryAfter}s...`, "error");
+    await sleep(retryAfter * 1000);
+    return submitAudio(formData, attempt + 1);
+  }
+  if (res.status !== 202) return data;
+
+  console.log("🧾 Audio job queued:", data.job_id);
+  while (true) {
+    const poll = await fetch(`${data.poll_url}?wait=${JOB_LONGPOLL_SECONDS}`);
+    const job = await poll.json();
+    if (!poll.ok) return job;
+    if (job.state === "done") return job.result;
+    // No long-poll slot was free (or the wait ran out): poll again shortly
+    await sleep((job.retry_after || 1) * 1000);
+  }
+}
+
 function sendAudioToServer(audioBlob) {
   const formData = new FormData();
   
@@ -176,11 +326,7 @@ function sendAudioToServer(audioBlob) {
   console.log('📤 Sending audio:', audioBlob.size, 'bytes as', extension);
   formData.append('audio_file', audioBlob, `recording.${extension}`);
   
-  fetch("/upload", {
-    method: "POST",
-    body: formData,
-  })
-    .then((res) => res.json())
+  submitAudio(formData)
     .then((data) => {
       setBusyState(false);
       console.log('📥 Server response:', data);
@@ -188,7 +334,7 @@ function sendAudioToServer(audioBlob) {
         textArea.value = data.text || "";
         textArea.placeholder = "Type text here...";
         displayStatus("Audio processed successfully!");
-        updateResultUI(data.prediction, data.confidence);
+        updateResultUI(data.prediction, data.confidence, data.model_version);
       } else {
         console.error('❌ Server error:', data.message, data.debug_info);
         displayStatus(data.message || "Processing failed", "error");
@@ -216,17 +362,13 @@ function uploadFile() {
     setBusyState(true, "Uploading...");
     const formData = new FormData();
     formData.append("audio_file", file);
-    fetch("/upload", {
-      method: "POST",
-      body: formData,
-    })
-      .then((res) => res.json())
+    submitAudio(formData)
       .then((data) => {
         setBusyState(false);
         if (data.status === "success") {
           textArea.value = data.text || "";
           displayStatus("File uploaded and processed!");
-          updateResultUI(data.prediction, data.confidence);
+          updateResultUI(data.prediction, data.confidence, data.model_version);
         } else {
           displayStatus(data.message || "Upload failed", "error");
           resultContainer.innerHTML = "";
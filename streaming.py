@@ -0,0 +1,231 @@
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+import audio_enhance
+
+# --- CONFIGURATION ---
+STREAM_SAMPLE_RATE = 16000
+# Stop reading after this much audio; keep below the gunicorn worker timeout
+STREAM_MAX_SECONDS = float(os.environ.get('STREAM_MAX_SECONDS', 25))
+# Wall-clock limits on reading, so a client that goes quiet cannot hold a
+# worker thread: at most STREAM_IDLE_SECONDS between two chunks and
+# STREAM_DEADLINE_SECONDS in all
+STREAM_IDLE_SECONDS = float(os.environ.get('STREAM_IDLE_SECONDS', 5))
+STREAM_DEADLINE_SECONDS = float(os.environ.get('STREAM_DEADLINE_SECONDS', STREAM_MAX_SECONDS + 10))
+# Concurrent segment recognitions per stream
+STREAM_SEGMENT_WORKERS = int(os.environ.get('STREAM_SEGMENT_WORKERS', 2))
+# Bytes per read from the request body (100 ms of 16 kHz PCM16)
+STREAM_READ_BYTES = 3200
+
+
+class EnergyVAD:
+    """Frame-energy voice activity detector that emits completed speech segments.
+
+    A frame is speech when its level is above both ``threshold_dbfs`` and the
+    running noise floor plus ``margin_db``. A segment starts on the first
+    speech frame (with ``pre_roll_ms`` of context), ends after ``hangover_ms``
+    of non-speech, and is force-cut at ``max_segment_ms``.
+    """
+
+    def __init__(self, sample_rate=STREAM_SAMPLE_RATE, frame_ms=30, threshold_dbfs=-45.0,
+                 margin_db=10.0, hangover_ms=500, pre_roll_ms=200, min_speech_ms=250,
+                 max_segment_ms=15000):
+        self.sample_rate = sample_rate
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.threshold_dbfs = threshold_dbfs
+        self.margin_db = margin_db
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.pre_roll_frames = pre_roll_ms // frame_ms
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.max_segment_frames = max(1, max_segment_ms // frame_ms)
+
+        self.noise_floor = None
+        self._pending = np.zeros(0, dtype=np.int16)
+        self._frames_seen = 0
+        self._pre_roll = []
+        self._segment = []
+        self._segment_start = 0
+        self._speech_frames = 0
+        self._silent_run = 0
+
+    def _frame_level(self, frames):
+        x = frames.astype(np.float32) / 32768.0
+        rms = np.sqrt(np.einsum('ij,ij->i', x, x) / x.shape[1])
+        return 20 * np.log10(np.maximum(rms, 1e-10))
+
+    def _close_segment(self):
+        # Drop the trailing hangover, keep the segment if it had enough speech
+        segment = None
+        if self._speech_frames >= self.min_speech_frames:
+            frames = self._segment[:len(self._segment) - self._silent_run] or self._segment
+            segment = (self._segment_start / self.sample_rate, np.concatenate(frames))
+        self._segment = []
+        self._speech_frames = 0
+        self._silent_run = 0
+        return segment
+
+    def feed(self, samples):
+        """Consume int16 samples; return the list of (start_seconds, samples) segments completed."""
+        samples = np.concatenate((self._pending, samples)) if len(self._pending) else samples
+        n_frames = len(samples) // self.frame_len
+        self._pending = samples[n_frames * self.frame_len:]
+        if n_frames == 0:
+            return []
+
+        frames = samples[:n_frames * self.frame_len].reshape(n_frames, self.frame_len)
+        levels = self._frame_level(frames)
+        completed = []
+        for frame, level in zip(frames, levels):
+            # Until a non-speech frame is seen, the absolute threshold alone decides
+            floor = self.noise_floor if self.noise_floor is not None else self.threshold_dbfs - self.margin_db
+            is_speech = level > self.threshold_dbfs and level > floor + self.margin_db
+
+            if not self._segment:
+                if is_speech:
+                    self._segment = self._pre_roll + [frame]
+                    self._segment_start = (self._frames_seen - len(self._pre_roll)) * self.frame_len
+                    self._speech_frames = 1
+                    self._pre_roll = []
+                else:
+                    # Track the noise floor on non-speech audio only
+                    self.noise_floor = level if self.noise_floor is None else 0.95 * self.noise_floor + 0.05 * level
+                    self._pre_roll = (self._pre_roll + [frame])[-self.pre_roll_frames:] if self.pre_roll_frames else []
+            else:
+                self._segment.append(frame)
+                if is_speech:
+                    self._speech_frames += 1
+                    self._silent_run = 0
+                else:
+                    self._silent_run += 1
+                if self._silent_run >= self.hangover_frames or len(self._segment) >= self.max_segment_frames:
+                    segment = self._close_segment()
+                    if segment is not None:
+                        completed.append(segment)
+            self._frames_seen += 1
+        return completed
+
+    def flush(self):
+        """End of stream: return the segment in progress, if any."""
+        if not self._segment:
+            return []
+        self._silent_run = 0
+        segment = self._close_segment()
+        return [segment] if segment is not None else []
+
+
+def aggregate_segments(segments):
+    """Final verdict over recognised segments, weighted by duration x confidence."""
+    recognised = [s for s in segments if s.get('prediction')]
+    if not recognised:
+        return None
+    total = sum(s['duration'] for s in recognised)
+    scores = {}
+    for s in recognised:
+        scores[s['prediction']] = scores.get(s['prediction'], 0.0) + s['duration'] * s['confidence']
+    prediction = max(scores, key=scores.get)
+    return {
+        'prediction': prediction,
+        'confidence': round(scores[prediction] / total, 2) if total else 0.0,
+        'text': ' '.join(s['text'] for s in sorted(recognised, key=lambda s: s['start'])),
+        'segments': len(recognised),
+        # Segments may straddle a model update; report the newest version used
+        'model_version': max((s['model_version'] for s in recognised if 'model_version' in s), default=None),
+        'distribution': {label: round(score / total, 2) for label, score in scores.items()} if total else {}
+    }
+
+
+def stream_results(read, process_segment, vad=None, max_seconds=STREAM_MAX_SECONDS,
+                   workers=STREAM_SEGMENT_WORKERS, idle_seconds=STREAM_IDLE_SECONDS,
+                   deadline_seconds=STREAM_DEADLINE_SECONDS):
+    """Read raw 16 kHz PCM16 mono chunks with ``read(n, timeout)`` and yield result events as dicts.
+
+    ``read`` returns b'' at the end of the audio and None when nothing came
+    within ``timeout`` seconds; reading then stops (``timed_out`` in the final
+    event), as it does ``deadline_seconds`` after the start. Each completed
+    speech segment is handed to ``process_segment(pcm_int16,
+    start, end)`` on a small thread pool; its result is yielded as a
+    ``segment`` event as soon as it is ready, while reading continues. A
+    ``final`` event with the aggregate closes the stream.
+    """
+    vad = vad or EnergyVAD(sample_rate=STREAM_SAMPLE_RATE)
+    started = time.monotonic()
+    received = 0
+    max_bytes = int(max_seconds * STREAM_SAMPLE_RATE) * 2
+    truncated = False
+    timed_out = False
+    deadline = started + deadline_seconds
+    leftover = b''
+    futures = {}
+    segments = []
+    index = 0
+
+    def drain(block):
+        done = [f for f in futures if f.done()]
+        if block and futures and not done:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            meta = futures.pop(future)
+            try:
+                result = future.result() or {}
+            except Exception as e:
+                result = {'error': str(e)}
+            event = dict(meta, **result, type='segment')
+            segments.append(event)
+            yield event
+
+    def submit(found):
+        nonlocal index
+        for start, pcm in found:
+            duration = len(pcm) / STREAM_SAMPLE_RATE
+            meta = {'index': index, 'start': round(start, 3), 'end': round(start + duration, 3),
+                    'duration': round(duration, 3)}
+            futures[executor.submit(process_segment, pcm, meta['start'], meta['end'])] = meta
+            index += 1
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stream-segment') as executor:
+        while True:
+            remaining = deadline - time.monotonic()
+            chunk = read(STREAM_READ_BYTES, min(idle_seconds, remaining)) if remaining > 0 else None
+            if chunk is None:
+                timed_out = True
+                break
+            if not chunk:
+                break
+            received += len(chunk)
+            chunk = leftover + chunk
+            usable = len(chunk) - len(chunk) % 2
+            leftover = chunk[usable:]
+            samples = np.frombuffer(chunk[:usable], dtype='<i2')
+            submit(vad.feed(samples))
+            yield from drain(block=False)
+            if received >= max_bytes:
+                truncated = True
+                break
+
+        submit(vad.flush())
+        while futures:
+            yield from drain(block=True)
+
+    final = aggregate_segments(segments)
+    yield {
+        'type': 'final',
+        'status': 'success' if final else 'error',
+        'message': None if final else 'No speech recognised in the stream.',
+        'audio_seconds': round(received / 2 / STREAM_SAMPLE_RATE, 3),
+        'elapsed_seconds': round(time.monotonic() - started, 3),
+        'truncated': truncated,
+        'timed_out': timed_out,
+        'recognizer_calls': sum(s.get('recognizer_calls', 0) for s in segments),
+        'recognizer_calls_saved': sum(s.get('recognizer_calls_saved', 0) for s in segments),
+        **(final or {})
+    }
+
+
+def segment_level_ok(pcm):
+    # Skip segments that are essentially silent after VAD
+    level = audio_enhance.dbfs(pcm.astype(np.float32) / 32768.0)
+    return not math.isinf(level) and level > -60
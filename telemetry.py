@@ -0,0 +1,276 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+# --- CONFIGURATION ---
+# Share of successful requests that get a log line; failures are always logged
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.1))
+# DEBUG adds one line per recognizer answer and pipeline step
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# --- METRICS ---
+# With several gunicorn workers, PROMETHEUS_MULTIPROC_DIR (set in
+# gunicorn.conf.py) lets /metrics aggregate the values of every worker
+REQUESTS = Counter('langpredict_requests_total', "Requests handled", ['endpoint', 'status'])
+FAILURES = Counter('langpredict_failures_total', "Failed requests by reason", ['endpoint', 'reason'])
+REQUEST_SECONDS = Histogram('langpredict_request_seconds', "Request latency", ['endpoint'],
+                            buckets=LATENCY_BUCKETS)
+STAGE_SECONDS = Histogram('langpredict_stage_seconds', "Time spent in each processing stage", ['stage'],
+                          buckets=LATENCY_BUCKETS)
+RECOGNIZER_CALL_SECONDS = Histogram('langpredict_recognizer_call_seconds', "Speech recognizer call latency",
+                                    ['language', 'strategy', 'outcome'], buckets=LATENCY_BUCKETS)
+RECOGNIZER_DEADLINE_MISSES = Counter('langpredict_recognizer_deadline_misses_total',
+                                     "Recognizer calls still running at the strategy deadline",
+                                     ['language', 'strategy'])
+RECOGNIZER_CALLS_PER_REQUEST = Histogram('langpredict_recognizer_calls_per_request',
+                                         "Recognizer calls made for one audio request",
+                                         buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24))
+STRATEGY_REACHED = Counter('langpredict_strategy_reached_total',
+                           "Last recognition strategy run for an audio request", ['endpoint', 'strategy'])
+PREDICTIONS = Counter('langpredict_predictions_total', "Final predictions by language",
+                      ['endpoint', 'language'])
+AUDIO_JOBS = Counter('langpredict_audio_jobs_total', "Audio jobs by outcome (queued, rejected, done, failed)",
+                     ['outcome'])
+AUDIO_JOB_WAIT_SECONDS = Histogram('langpredict_audio_job_wait_seconds', "Time audio jobs spend queued",
+                                   buckets=LATENCY_BUCKETS)
+AUDIO_QUEUE_DEPTH = Gauge('langpredict_audio_queue_depth', "Audio jobs waiting for a worker",
+                          multiprocess_mode='livesum')
+FEEDBACK = Counter('langpredict_feedback_total', "Corrected labels received", ['label'])
+MODEL_UPDATES = Counter('langpredict_model_updates_total', "Online model updates by outcome (published, failed)",
+                        ['outcome'])
+MODEL_VERSION = Gauge('langpredict_model_version', "Engine version served by each worker",
+                      multiprocess_mode='liveall')
+TRANSCRIPT_CACHE_LOOKUPS = Counter('langpredict_transcript_cache_lookups_total',
+                                   "Transcript cache lookups by outcome (hit, miss)", ['outcome'])
+TRANSCRIPT_CACHE_BYTES_SAVED = Counter('langpredict_transcript_cache_audio_bytes_saved_total',
+                                       "PCM bytes not sent to the recognizer thanks to cache hits")
+TRANSCRIPT_CACHE_CALLS_SAVED = Counter('langpredict_transcript_cache_recognizer_calls_saved_total',
+                                       "Recognizer calls replaced by cache hits")
+
+
+def render_metrics():
+    """Prometheus text exposition of this process, or of all workers in multiprocess mode."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+# --- LOGGING ---
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class EventLogger(logging.LoggerAdapter):
+    """logger.info('event_name', key=value, ...) -> one JSON line."""
+
+    RESERVED = ('exc_info', 'stack_info', 'stacklevel', 'extra')
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in self.RESERVED}
+        kwargs['extra'] = {'fields': fields}
+        return msg, kwargs
+
+
+_root = logging.getLogger('langpredict')
+if not _root.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(JsonFormatter())
+    _root.addHandler(_handler)
+    _root.setLevel(LOG_LEVEL)
+    _root.propagate = False
+
+
+def get_logger(name):
+    return EventLogger(logging.getLogger(f'langpredict.{name}'), {})
+
+
+log = get_logger('request')
+
+
+# --- TRACES ---
+_current = contextvars.ContextVar('langpredict_trace', default=None)
+
+
+def current_trace():
+    return _current.get()
+
+
+_stage_histograms = {}
+
+
+def record_stage(stage, seconds):
+    histogram = _stage_histograms.get(stage)
+    if histogram is None:
+        histogram = _stage_histograms[stage] = STAGE_SECONDS.labels(stage)
+    histogram.observe(seconds)
+    trace = _current.get()
+    if trace is not None:
+        trace.add_stage(stage, seconds)
+
+
+class span:
+    """``with span('decode'):`` records the block's duration with record_stage().
+
+    A plain class rather than @contextmanager: it wraps the per-request hot
+    paths, where the generator machinery cost more than the metric itself.
+    """
+
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_stage(self.stage, time.perf_counter() - self.start)
+
+
+def record_recognizer_call(language, strategy, outcome, seconds):
+    RECOGNIZER_CALL_SECONDS.labels(language, strategy, outcome).observe(seconds)
+    trace = _current.get()
+    if trace is not None:
+        trace.add_call(language, strategy, outcome, seconds)
+
+
+def record_deadline_miss(language, strategy):
+    RECOGNIZER_DEADLINE_MISSES.labels(language, strategy).inc()
+    trace = _current.get()
+    if trace is not None:
+        trace.add_call(language, strategy, 'deadline', None)
+
+
+def note(**fields):
+    # Attach fields to the log line of the current request, if any
+    trace = _current.get()
+    if trace is not None:
+        trace.note(**fields)
+
+
+class RequestTrace:
+    """Stage timings and outcome of one request.
+
+    Spans recorded while the trace is active (see activate()) are added to
+    it; finish() turns it into request metrics and one structured log line,
+    sampled at LOG_SAMPLE_RATE unless the request failed.
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.reason = None
+        self.fields = {}
+        self.stages = {}
+        self.calls = []
+        self._lock = threading.Lock()
+        self._finished = False
+
+    @contextmanager
+    def activate(self):
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def add_stage(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_call(self, language, strategy, outcome, seconds):
+        call = {'language': language, 'strategy': strategy, 'outcome': outcome}
+        if seconds is not None:
+            call['ms'] = round(seconds * 1000, 1)
+        with self._lock:
+            self.calls.append(call)
+
+    def note(self, **fields):
+        with self._lock:
+            self.fields.update(fields)
+
+    def fail(self, reason, **fields):
+        self.reason = reason
+        self.note(**fields)
+
+    def finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        elapsed = time.perf_counter() - self.started
+        status = 'error' if self.reason else 'success'
+
+        REQUESTS.labels(self.endpoint, status).inc()
+        REQUEST_SECONDS.labels(self.endpoint).observe(elapsed)
+        if self.reason:
+            FAILURES.labels(self.endpoint, self.reason).inc()
+        if self.fields.get('recognizer_calls') is not None:
+            RECOGNIZER_CALLS_PER_REQUEST.observe(self.fields['recognizer_calls'])
+        if self.fields.get('strategy'):
+            STRATEGY_REACHED.labels(self.endpoint, self.fields['strategy']).inc()
+        if status == 'success' and self.fields.get('prediction'):
+            PREDICTIONS.labels(self.endpoint, self.fields['prediction']).inc()
+
+        if status == 'success' and random.random() >= LOG_SAMPLE_RATE:
+            return
+        entry = dict(self.fields, endpoint=self.endpoint, status=status, reason=self.reason,
+                     duration_ms=round(elapsed * 1000, 1),
+                     stages_ms={stage: round(s * 1000, 2) for stage, s in self.stages.items()})
+        if self.calls:
+            entry['calls'] = self.calls
+        if status == 'success':
+            log.info('request', **entry)
+        else:
+            log.warning('request', **entry)
+
+
+def traced(endpoint):
+    """Decorator for Flask views: one RequestTrace per call.
+
+    Views mark failures with current_trace().fail(reason); a response with an
+    HTTP error status counts as a failure too.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            trace = RequestTrace(endpoint)
+            try:
+                with trace.activate():
+                    response = view(*args, **kwargs)
+                code = response[1] if isinstance(response, tuple) else getattr(response, 'status_code', 200)
+                if trace.reason is None and code >= 400:
+                    trace.fail(f'http_{code}')
+                return response
+            except Exception as e:
+                trace.fail(f'exception_{type(e).__name__}')
+                raise
+            finally:
+                trace.finish()
+        return wrapper
+    return decorator
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PROCESSED = os.path.join(ROOT, 'data', 'processed')
+VECTORIZER_PATH = os.path.join(PROCESSED, 'tfidf_vectorizer.pkl')
+MODEL_PATH = os.path.join(PROCESSED, 'language_model.pkl')
+DATASET_PATH = os.path.join(PROCESSED, 'combined_dataset.csv')
+
+
+def require(*paths):
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        pytest.skip(f"missing {', '.join(os.path.relpath(p, ROOT) for p in missing)}")
+
+
+@pytest.fixture(scope='session')
+def sklearn_pipeline():
+    """The pickled (vectorizer, model) the notebooks produce."""
+    require(VECTORIZER_PATH, MODEL_PATH)
+    joblib = pytest.importorskip('joblib')
+    pytest.importorskip('sklearn')
+    return joblib.load(VECTORIZER_PATH), joblib.load(MODEL_PATH)
+
+
+@pytest.fixture(scope='session')
+def engine(sklearn_pipeline):
+    from inference import InferenceEngine
+    return InferenceEngine.from_sklearn(*sklearn_pipeline)
+
+
+@pytest.fixture(scope='session')
+def dataset_texts():
+    """A seeded sample of cleaned dataset rows."""
+    import csv
+    import random
+    from preprocessing import clean_text
+
+    require(DATASET_PATH)
+    with open(DATASET_PATH, encoding='utf-8', newline='') as f:
+        texts = [row['text'] for row in csv.DictReader(f)]
+    return [clean_text(text) for text in random.Random(0).sample(texts, min(1000, len(texts)))]
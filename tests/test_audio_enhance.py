@@ -0,0 +1,38 @@
+import io
+import math
+import wave
+
+import numpy as np
+import pytest
+
+import audio_enhance
+
+AudioSegment = pytest.importorskip('pydub').AudioSegment
+
+
+def wav_bytes(samples, sample_width, sample_rate=16000):
+    # A 0.3-amplitude sine written as WAV PCM of the given width (8-bit WAV is unsigned)
+    if sample_width == 1:
+        data = np.rint(samples * 127 + 128).astype(np.uint8).tobytes()
+    else:
+        scale = float(2 ** (8 * sample_width - 1) - 1)
+        data = np.rint(samples * scale).astype(f'<i{sample_width}').tobytes()
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(sample_width)
+        wav.setframerate(sample_rate)
+        wav.writeframes(data)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('sample_width', [1, 2, 4])
+def test_to_float_level_matches_pydub(sample_width):
+    t = np.arange(16000) / 16000
+    audio = AudioSegment.from_wav(io.BytesIO(wav_bytes(0.3 * np.sin(2 * math.pi * 440 * t), sample_width)))
+    samples = audio_enhance.to_float(audio.raw_data, audio.sample_width, audio.channels)
+    # pydub truncates the RMS to an integer sample value, which costs up to
+    # ~0.3 dB at 8 bits
+    tolerance = 0.5 if sample_width == 1 else 0.01
+    assert audio_enhance.dbfs(samples) == pytest.approx(audio.dBFS, abs=tolerance)
+    assert abs(float(samples.mean())) < 0.01
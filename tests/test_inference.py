@@ -0,0 +1,77 @@
+import copy
+import os
+
+import numpy as np
+
+from inference import InferenceEngine, PARITY_SAMPLES, PickleWatcher, check_parity
+
+# Inputs the char analyzer handles specially: multi-character lowercasing,
+# whitespace runs of mixed kinds, non-Latin scripts, strings shorter than an n-gram
+EDGE_SAMPLES = [
+    " ",
+    "a",
+    "ab",
+    "İstanbul",
+    "ǅemal STRASSE ß",
+    "tab\tand\nnewline\r\n  runs",
+    "مرحبا كيف حالك",
+    "3afak 7ta l ghda 9rib",
+    "emoji 🙂 inside 🙂🙂",
+    "x" * 500,
+    "mixed bonjour hello salam " * 20,
+]
+
+
+def test_parity_on_edge_strings(engine, sklearn_pipeline):
+    ok, max_diff, mismatches = check_parity(engine, *sklearn_pipeline, PARITY_SAMPLES + EDGE_SAMPLES)
+    assert ok, (max_diff, mismatches)
+
+
+def test_parity_on_dataset_rows(engine, sklearn_pipeline, dataset_texts):
+    ok, max_diff, mismatches = check_parity(engine, *sklearn_pipeline, dataset_texts)
+    assert ok, (max_diff, mismatches[:10])
+
+
+def test_saved_artifact_round_trips(engine, tmp_path, dataset_texts):
+    path = str(tmp_path / 'engine')
+    engine.save(path)
+    loaded = InferenceEngine.load(path)
+    assert loaded.classes == engine.classes
+    assert loaded.vocabulary == engine.vocabulary
+    np.testing.assert_array_equal(loaded.predict_proba(dataset_texts), engine.predict_proba(dataset_texts))
+
+
+def test_pickle_watcher_recompiles_changed_pickles(sklearn_pipeline, tmp_path):
+    import joblib
+
+    vectorizer, model = sklearn_pipeline
+    vectorizer_path, model_path = str(tmp_path / 'vectorizer.pkl'), str(tmp_path / 'model.pkl')
+    joblib.dump(vectorizer, vectorizer_path)
+    joblib.dump(model, model_path)
+    watcher = PickleWatcher(vectorizer_path, model_path, InferenceEngine.from_pickles(vectorizer_path, model_path),
+                            build=lambda engine: (engine, {}), check_interval=0)
+    state = watcher.current()
+    assert watcher.current() is state
+
+    retrained = copy.deepcopy(model)
+    retrained.class_log_prior_ = retrained.class_log_prior_[::-1].copy()
+    joblib.dump(retrained, model_path + '.tmp')
+    os.replace(model_path + '.tmp', model_path)
+    engine, cache = watcher.current()
+    assert (engine, cache) is not state
+    np.testing.assert_array_equal(engine.class_log_prior, retrained.class_log_prior_)
+
+
+def test_updated_matches_partial_fit(engine, sklearn_pipeline, dataset_texts):
+    vectorizer, model = sklearn_pipeline
+    assert engine.updatable
+    rng = np.random.default_rng(0)
+    texts = dataset_texts[:200]
+    labels = [engine.classes[k] for k in rng.integers(len(engine.classes), size=len(texts))]
+
+    updated = engine.updated(texts, labels)
+    refitted = copy.deepcopy(model).partial_fit(vectorizer.transform(texts), labels)
+    np.testing.assert_allclose(updated.feature_log_prob, refitted.feature_log_prob_.T, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(updated.class_log_prior, refitted.class_log_prior_, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(updated.predict_proba(texts), refitted.predict_proba(vectorizer.transform(texts)),
+                               rtol=0, atol=1e-9)
@@ -0,0 +1,65 @@
+import random
+import re
+
+import numpy as np
+import pytest
+
+from inference import WHITE_SPACES
+from preprocessing import clean_text
+from segmentation import Segmenter, normalize
+from test_inference import EDGE_SAMPLES
+
+_WORD = re.compile(r"\S+")
+
+NORMALIZE_SAMPLES = EDGE_SAMPLES + [
+    "",
+    "!!!",
+    "Salam  labas!! je suis très content, http://x.y/z today\n\n ok",
+    "  İstanbul wach\tnta  ",
+    "see www.example.com/path?q=1 and https://a.b then stop.",
+]
+
+VOCABULARY = ["bonjour", "comment", "allez", "vous", "hello", "how", "are", "you", "salam", "labas",
+              "wach", "nta", "mzyan", "the", "je", "suis", "ghadi", "nmchi", "dar", "c'est", "la",
+              "vie", "3lik", "x", "é!", "İstanbul"]
+
+
+def window_bounds(s, window, stride):
+    # Same windows as Segmenter.segment: every stride words, plus one ending at the last word
+    words = [(m.start(), m.end()) for m in _WORD.finditer(s)]
+    window = min(window, len(words))
+    first_words = np.arange(0, len(words) - window + 1, stride)
+    if first_words[-1] != len(words) - window:
+        first_words = np.append(first_words, len(words) - window)
+    starts = np.array([words[i][0] for i in first_words])
+    ends = np.array([words[i + window - 1][1] for i in first_words])
+    return starts, ends
+
+
+@pytest.fixture(scope='session')
+def segmenter(engine):
+    return Segmenter(engine)
+
+
+@pytest.mark.parametrize('text', NORMALIZE_SAMPLES)
+def test_normalize_matches_clean_text(text):
+    s, origin = normalize(text)
+    assert s == WHITE_SPACES.sub(' ', clean_text(text))
+    assert len(origin) == len(s)
+    for k, i in enumerate(origin):
+        assert (s[k].isspace() and text[i].isspace()) or s[k] in text[i].lower(), (k, i)
+
+
+def test_window_likelihood_matches_engine(engine, segmenter, dataset_texts):
+    rng = random.Random(0)
+    documents = [" ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(1, 40))) for _ in range(200)]
+    documents += [" ".join(dataset_texts[i:i + 5]) for i in range(0, 200, 5)]
+    for document in documents:
+        s, _ = normalize(document)
+        if not _WORD.search(s):
+            continue
+        for window, stride in [(1, 1), (3, 1), (5, 2), (8, 3)]:
+            starts, ends = window_bounds(s, window, stride)
+            got = segmenter.window_log_likelihood(s, starts, ends)
+            expected = engine._joint_log_likelihood([s[a:b] for a, b in zip(starts, ends)])
+            np.testing.assert_allclose(got, expected, rtol=0, atol=1e-9)
@@ -0,0 +1,53 @@
+import csv
+import random
+
+import numpy as np
+import pytest
+
+from conftest import DATASET_PATH, require
+from preprocessing import clean_text
+
+
+@pytest.fixture(scope='module')
+def small_corpus(tmp_path_factory):
+    """A seeded sample of dataset rows, written to a CSV of its own."""
+    require(DATASET_PATH)
+    with open(DATASET_PATH, encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        fieldnames, rows = reader.fieldnames, list(reader)
+    path = tmp_path_factory.mktemp('train') / 'corpus.csv'
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(random.Random(0).sample(rows, min(600, len(rows))))
+    return str(path)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_streaming_trainer_matches_sklearn(small_corpus, workers):
+    pytest.importorskip('sklearn')
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.naive_bayes import MultinomialNB
+    from train import Dataset, train
+
+    # Small chunks, so every pass merges the counts of several of them
+    dataset = Dataset(small_corpus, chunk_size=50)
+    engine, report = train(dataset, workers=workers, max_features=0)
+    texts, labels = [], []
+    for chunk_texts, chunk_labels in dataset.chunks('train'):
+        texts += chunk_texts
+        labels += chunk_labels
+    assert report['train_rows'] == len(texts) > 2 * dataset.chunk_size
+
+    vectorizer = TfidfVectorizer(analyzer='char', ngram_range=engine.ngram_range)
+    model = MultinomialNB().fit(vectorizer.fit_transform([clean_text(t) for t in texts]), labels)
+    assert engine.vocabulary == vectorizer.vocabulary_
+    assert list(engine.classes) == list(model.classes_)
+    np.testing.assert_allclose(engine.idf, vectorizer.idf_, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(engine.feature_log_prob, model.feature_log_prob_.T, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(engine.class_log_prior, model.class_log_prior_, rtol=0, atol=1e-12)
+
+    test_texts = [clean_text(t) for chunk_texts, _ in dataset.chunks('test') for t in chunk_texts]
+    assert test_texts
+    np.testing.assert_allclose(engine.predict_proba(test_texts),
+                               model.predict_proba(vectorizer.transform(test_texts)), rtol=0, atol=1e-9)
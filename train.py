@@ -0,0 +1,350 @@
+"""Out-of-core training of the text model, straight to a published engine.
+
+    python train.py [DATA] [--workers N] [--chunk-size 10000] [--max-features 5000] [--out ENGINE]
+
+Replaces the fitting steps of notebooks 2.0 and 3.0 (clean_text, char 1-3-gram
+TfidfVectorizer with max_features, MultinomialNB). The dataset (.csv or .jsonl)
+is streamed three times in chunks, each chunk handled by a pool of worker
+processes:
+
+1. n-gram term and document frequencies of the training rows, from which
+   the vocabulary (most frequent n-grams) and idf follow;
+2. NB feature counts of the l2-normalised TF-IDF training rows;
+3. evaluation on the held-out rows.
+
+Memory is bounded by the chunks in flight and the table of distinct n-grams,
+whatever the number of rows. Rows are assigned to the train or test split
+(and to the ``--sample``) by a hash of their row number and ``--seed``, so
+the split does not depend on the chunk size or worker count; it is random
+rather than stratified. The engine is published as a new version of
+``--out`` with its NB counts, so it can be updated from feedback (see
+feedback.py) and workers pick it up without a restart.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+from classify import file_format, map_ordered, read_chunks, read_rows
+from inference import (InferenceEngine, ENGINE_PATH, MAX_NGRAM, WHITE_SPACES, decode_ngram_key,
+                       joint_log_likelihood, l2_tfidf, lookup_keys, nb_log_probs, ngram_key_array,
+                       publish, to_code_points)
+from preprocessing import clean_text
+
+# --- CONFIGURATION ---
+DATA_PATH = 'data/processed/combined_dataset.csv'
+DEFAULT_CHUNK_SIZE = 10000
+# Same settings as the notebooks
+NGRAM_RANGE = (1, 3)
+MAX_FEATURES = 5000
+TEST_SIZE = 0.2
+ALPHA = 1.0
+SEED = 42
+
+
+# --- N-GRAMS ---
+def ngram_keys(texts, ngram_range):
+    """(document, key) of every character n-gram of the cleaned texts (see inference.ngram_key)."""
+    cleaned = [WHITE_SPACES.sub(' ', clean_text(text)) for text in texts]
+    lengths = np.fromiter(map(len, cleaned), dtype=np.intp, count=len(cleaned))
+    code_points = to_code_points(''.join(cleaned)).astype(np.int64)
+    doc_of_char = np.repeat(np.arange(len(cleaned)), lengths)
+    doc_end = np.cumsum(lengths)
+
+    docs, keys = [], []
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        key = ngram_key_array(code_points, n)
+        count = len(key)
+        if not count:
+            continue
+        # N-grams must not run into the next document
+        inside = np.arange(n, count + n) <= doc_end[doc_of_char[:count]]
+        docs.append(doc_of_char[:count][inside])
+        keys.append(key[inside])
+    if not keys:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    return np.concatenate(docs), np.concatenate(keys)
+
+
+def _merge_counts(keys, *columns):
+    # Sum the columns of rows with equal keys; returns sorted unique keys and sums
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return (unique,) + tuple(np.bincount(inverse, weights=column, minlength=len(unique)).astype(np.int64)
+                             for column in columns)
+
+
+# --- WORKERS ---
+_state = None
+
+
+def _init_worker(state):
+    global _state
+    _state = state
+
+
+def count_ngrams(texts):
+    """Pass 1: (keys, term frequencies, document frequencies) of one chunk."""
+    docs, keys = ngram_keys(texts, _state['ngram_range'])
+    order = np.lexsort((docs, keys))
+    docs, keys = docs[order], keys[order]
+    # A (key, document) pair counts once towards the document frequency
+    first_in_doc = np.ones(len(keys), dtype=bool)
+    first_in_doc[1:] = (keys[1:] != keys[:-1]) | (docs[1:] != docs[:-1])
+    return _merge_counts(keys, np.ones(len(keys)), first_in_doc.astype(np.float64))
+
+
+def _tfidf(texts):
+    # Sparse l2-normalised TF-IDF rows over the vocabulary, as (rows, indices, weights)
+    docs, keys = ngram_keys(texts, _state['ngram_range'])
+    vocab_keys, vocab_index = _state['vocab_keys'], _state['vocab_index']
+    pos, found = lookup_keys(vocab_keys, keys)
+    n_features = len(vocab_keys)
+    cells, tf = np.unique(docs[found] * n_features + vocab_index[pos[found]], return_counts=True)
+    rows, indices = np.divmod(cells, n_features)
+    return rows, indices, l2_tfidf(rows, indices, tf, _state['idf'], len(texts))
+
+
+def count_features(texts, targets):
+    """Pass 2: NB feature counts (n_features, n_classes) of one chunk."""
+    n_features, n_classes = len(_state['vocab_keys']), _state['n_classes']
+    rows, indices, weights = _tfidf(texts)
+    cells = indices * n_classes + targets[rows]
+    return np.bincount(cells, weights=weights, minlength=n_features * n_classes).reshape(n_features, n_classes)
+
+
+def confusion(texts, targets):
+    """Pass 3: confusion matrix (true x predicted) of one chunk."""
+    n_classes = _state['n_classes']
+    rows, indices, weights = _tfidf(texts)
+    jll = joint_log_likelihood(rows, indices, weights, _state['feature_log_prob'], _state['class_log_prior'],
+                               len(texts))
+    predicted = jll.argmax(axis=1)
+    return np.bincount(targets * n_classes + predicted, minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+
+
+def map_chunks(func, tasks, workers, state):
+    """func(*task) for every task on a process pool, results in task order."""
+    return map_ordered(func, tasks, workers, _init_worker, (state,))
+
+
+# --- DATASET ---
+def _row_draws(seed, first_row, count, salt):
+    # splitmix64 of (seed, row number, salt) -> uniform [0, 1)
+    with np.errstate(over='ignore'):
+        x = np.arange(first_row, first_row + count, dtype=np.uint64) * np.uint64(2) + np.uint64(salt)
+        x += np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x ^= x >> np.uint64(31)
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+class Dataset:
+    """Streams the (text, label) rows of one split of a CSV / JSONL file in chunks."""
+
+    def __init__(self, path, text_column='text', label_column='language', chunk_size=DEFAULT_CHUNK_SIZE,
+                 test_size=TEST_SIZE, sample=1.0, seed=SEED):
+        self.path = path
+        self.format = file_format(path)
+        self.text_column = text_column
+        self.label_column = label_column
+        self.chunk_size = chunk_size
+        self.test_size = test_size
+        self.sample = sample
+        self.seed = seed
+
+    def chunks(self, split):
+        """Lists of texts and labels of the 'train' or 'test' rows; rows without a label are skipped."""
+        with open(self.path, encoding='utf-8', newline='') as f:
+            first_row = 0
+            for chunk in read_chunks(read_rows(f, self.format), self.chunk_size):
+                keep = _row_draws(self.seed, first_row, len(chunk), 0) < self.sample
+                in_test = _row_draws(self.seed, first_row, len(chunk), 1) < self.test_size
+                keep &= in_test if split == 'test' else ~in_test
+                first_row += len(chunk)
+                try:
+                    rows = [(row[self.text_column], row[self.label_column])
+                            for row, kept in zip(chunk, keep.tolist()) if kept]
+                except KeyError as e:
+                    raise ValueError(f"Column {e.args[0]!r} not found in {self.path}") from None
+                rows = [(text, str(label)) for text, label in rows if label not in (None, '')]
+                if rows:
+                    texts, labels = zip(*rows)
+                    yield list(texts), list(labels)
+
+
+# --- TRAINING ---
+def build_vocabulary(keys, tf, df, n_docs, max_features):
+    """Vocabulary and idf as fitted by TfidfVectorizer(max_features=...).
+
+    The most frequent n-grams are kept (ties broken alphabetically, which
+    sklearn leaves unspecified) and indexed in alphabetical order; the idf
+    is smoothed.
+    """
+    terms = [decode_ngram_key(int(key)) for key in keys]
+    ranked = sorted(range(len(terms)), key=lambda i: (-tf[i], terms[i]))
+    if max_features:
+        ranked = ranked[:max_features]
+    selected = sorted(ranked, key=terms.__getitem__)
+    vocabulary = {terms[i]: index for index, i in enumerate(selected)}
+    idf = np.log((1 + n_docs) / (1 + df[selected])) + 1
+    return vocabulary, keys[selected], idf
+
+
+def train(dataset, workers=None, ngram_range=NGRAM_RANGE, max_features=MAX_FEATURES, alpha=ALPHA,
+          progress=None):
+    """Fit the engine on dataset's train split; returns (engine, report)."""
+    if ngram_range[1] > MAX_NGRAM:
+        raise ValueError(f"N-grams of up to {MAX_NGRAM} characters are supported, not {ngram_range[1]}")
+    workers = workers or os.cpu_count() or 1
+    progress = progress or (lambda *args: None)
+    started = time.monotonic()
+
+    # Pass 1: n-gram statistics and class counts
+    label_counts = Counter()
+    keys, tf, df = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    def train_texts():
+        for texts, labels in dataset.chunks('train'):
+            label_counts.update(labels)
+            yield (texts,)
+
+    for chunk_keys, chunk_tf, chunk_df in map_chunks(count_ngrams, train_texts(), workers,
+                                                     {'ngram_range': ngram_range}):
+        keys, tf, df = _merge_counts(np.concatenate([keys, chunk_keys]), np.concatenate([tf, chunk_tf]),
+                                     np.concatenate([df, chunk_df]))
+        progress('ngrams', sum(label_counts.values()), time.monotonic() - started)
+    n_docs = sum(label_counts.values())
+    if not n_docs:
+        raise ValueError(f"No training rows in {dataset.path}")
+
+    classes = sorted(label_counts)
+    class_index = {label: k for k, label in enumerate(classes)}
+    vocabulary, vocab_keys, idf = build_vocabulary(keys, tf, df, n_docs, max_features)
+    if not vocabulary:
+        raise ValueError(f"No n-grams in the training rows of {dataset.path}")
+    order = np.argsort(vocab_keys)
+    state = {
+        'ngram_range': ngram_range,
+        'vocab_keys': vocab_keys[order],
+        'vocab_index': order,
+        'idf': idf,
+        'n_classes': len(classes),
+    }
+
+    def labelled(split):
+        for texts, labels in dataset.chunks(split):
+            known = [(text, class_index[label]) for text, label in zip(texts, labels) if label in class_index]
+            if known:
+                texts, targets = zip(*known)
+                yield list(texts), np.array(targets, dtype=np.intp)
+
+    # Pass 2: NB counts, as MultinomialNB.fit on the TF-IDF rows
+    feature_count = np.zeros((len(vocabulary), len(classes)))
+    for counts in map_chunks(count_features, labelled('train'), workers, state):
+        feature_count += counts
+        progress('counts', None, time.monotonic() - started)
+    class_count = np.array([label_counts[label] for label in classes], dtype=np.float64)
+    feature_log_prob, class_log_prior = nb_log_probs(feature_count, class_count, alpha)
+
+    # Pass 3: held-out evaluation
+    state.update(feature_log_prob=feature_log_prob, class_log_prior=class_log_prior)
+    matrix = np.zeros((len(classes), len(classes)), dtype=np.int64)
+    for chunk_matrix in map_chunks(confusion, labelled('test'), workers, state):
+        matrix += chunk_matrix
+        progress('evaluate', int(matrix.sum()), time.monotonic() - started)
+
+    test_rows = int(matrix.sum())
+    report = {
+        'train_rows': n_docs,
+        'test_rows': test_rows,
+        'features': len(vocabulary),
+        'ngrams_seen': len(keys),
+        'accuracy': round(float(np.trace(matrix)) / test_rows, 4) if test_rows else None,
+        'classes': {},
+        'confusion': matrix.tolist(),
+        'seconds': round(time.monotonic() - started, 2),
+    }
+    for k, label in enumerate(classes):
+        true, predicted, correct = matrix[k].sum(), matrix[:, k].sum(), matrix[k, k]
+        precision = correct / predicted if predicted else 0.0
+        recall = correct / true if true else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        report['classes'][label] = {'precision': round(float(precision), 4), 'recall': round(float(recall), 4),
+                                    'f1': round(float(f1), 4), 'support': int(true)}
+
+    engine = InferenceEngine(
+        vocabulary=vocabulary,
+        idf=idf,
+        feature_log_prob=feature_log_prob,
+        class_log_prior=class_log_prior,
+        classes=classes,
+        ngram_range=ngram_range,
+        lowercase=True,
+        feature_count=feature_count,
+        class_count=class_count,
+        alpha=alpha,
+        fit_prior=True,
+        metadata={
+            'trained_from': dataset.path,
+            'train_rows': n_docs,
+            'test_rows': test_rows,
+            'test_accuracy': report['accuracy'],
+            'test_size': dataset.test_size,
+            'sample': dataset.sample,
+            'seed': dataset.seed,
+            'max_features': max_features,
+        },
+    )
+    return engine, report
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('data', nargs='?', default=DATA_PATH, help=f"Training data (default: {DATA_PATH})")
+    parser.add_argument('--text-column', default='text')
+    parser.add_argument('--label-column', default='language')
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--max-features', type=int, default=MAX_FEATURES, help="0 keeps every n-gram")
+    parser.add_argument('--ngram-max', type=int, default=NGRAM_RANGE[1])
+    parser.add_argument('--alpha', type=float, default=ALPHA)
+    parser.add_argument('--test-size', type=float, default=TEST_SIZE)
+    parser.add_argument('--sample', type=float, default=1.0, help="Share of rows used (the notebooks used 0.1)")
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--out', default=ENGINE_PATH)
+    parser.add_argument('--dry-run', action='store_true', help="Train and evaluate without publishing")
+    args = parser.parse_args(argv)
+
+    dataset = Dataset(args.data, text_column=args.text_column, label_column=args.label_column,
+                      chunk_size=args.chunk_size, test_size=args.test_size, sample=args.sample, seed=args.seed)
+
+    def progress(stage, rows, seconds):
+        rows = f", {rows:,} rows" if rows is not None else ''
+        print(f"\r{stage}{rows}, {seconds:.1f}s   ", end='', file=sys.stderr, flush=True)
+
+    engine, report = train(dataset, workers=args.workers, ngram_range=(NGRAM_RANGE[0], args.ngram_max),
+                           max_features=args.max_features, alpha=args.alpha, progress=progress)
+    print(file=sys.stderr)
+    print(f"Trained on {report['train_rows']:,} rows in {report['seconds']}s: {report['features']:,} features "
+          f"out of {report['ngrams_seen']:,} n-grams")
+    if report['accuracy'] is not None:
+        print(f"🏆 Accuracy on {report['test_rows']:,} held-out rows: {report['accuracy']:.2%}")
+        for label, scores in report['classes'].items():
+            print(f"  {label:<12} precision {scores['precision']:.2f}  recall {scores['recall']:.2f}  "
+                  f"f1 {scores['f1']:.2f}  support {scores['support']}")
+
+    if args.dry_run:
+        return 0
+    version = publish(engine, args.out)
+    print(f"✅ Engine written to {args.out} (version {version})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
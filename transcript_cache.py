@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import telemetry
+from disk_lru import LRUDirectory
+
+FORMAT_VERSION = 1
+
+
+class TranscriptCache:
+    """Disk-backed, content-addressed cache of recognition results.
+
+    Entries are keyed on a hash of the enhanced PCM (plus the recognizer and
+    its languages), so a re-sent recording skips the remote recognizer calls
+    whatever its container or file name. Each entry is one JSON file holding
+    the per-language/strategy results; the directory is shared by every
+    worker process and survives restarts. Reads refresh a file's mtime and
+    the least recently used files are evicted beyond ``max_bytes``.
+    """
+
+    SUFFIX = '.json'
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._files = LRUDirectory(directory, self.max_bytes, suffix=self.SUFFIX)
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+        self.calls_saved = 0
+
+    @staticmethod
+    def key(pcm, sample_rate, sample_width, recognizer, languages):
+        digest = hashlib.sha256()
+        header = [FORMAT_VERSION, recognizer, [code for code, _ in languages], sample_rate, sample_width]
+        digest.update(json.dumps(header).encode())
+        digest.update(pcm)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, key):
+        """Cached entry for key, or None; a hit counts as the recognizer work it replaces."""
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)  # LRU order is file mtime
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self.misses += 1
+            telemetry.TRANSCRIPT_CACHE_LOOKUPS.labels('miss').inc()
+            return None
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += entry['audio_bytes']
+            self.calls_saved += entry['recognizer_calls']
+        telemetry.TRANSCRIPT_CACHE_LOOKUPS.labels('hit').inc()
+        telemetry.TRANSCRIPT_CACHE_BYTES_SAVED.inc(entry['audio_bytes'])
+        telemetry.TRANSCRIPT_CACHE_CALLS_SAVED.inc(entry['recognizer_calls'])
+        return entry
+
+    def put(self, key, results, audio_bytes, recognizer_calls, seconds):
+        """Store the results of one recognition run.
+
+        ``audio_bytes`` is the PCM sent to the recognizer across its
+        ``recognizer_calls`` calls, i.e. what a later hit saves.
+        """
+        entry = {
+            'results': results,
+            'audio_bytes': audio_bytes,
+            'recognizer_calls': recognizer_calls,
+            'seconds': round(seconds, 3),
+            'created': time.time(),
+        }
+        path = self._path(key)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        evicted = self._files.added(size)
+        with self._lock:
+            self.stores += 1
+            self.evictions += evicted
+
+    def stats(self):
+        # Counters are per process; /metrics has the totals of every worker
+        entries = self._files.entries()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(entries),
+                'bytes': sum(size for _, _, size in entries),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'audio_bytes_saved': self.bytes_saved,
+                'recognizer_calls_saved': self.calls_saved,
+            }
+
+
+def transcript_cache_from_env():
+    # TRANSCRIPT_CACHE_MAX_BYTES=0 disables the cache
+    max_bytes = int(os.environ.get('TRANSCRIPT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    if max_bytes <= 0:
+        return None
+    return TranscriptCache(os.environ.get('TRANSCRIPT_CACHE_DIR', 'data/transcript_cache'), max_bytes=max_bytes)